@@ -19,8 +19,15 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 django_asgi_app = get_asgi_application()
 
 from channels.routing import ProtocolTypeRouter, URLRouter
+from django.conf import settings
 from exchange.routing import websocket_urlpatterns
 
+if settings.MARKET_WORKER_IN_PROCESS:
+    # Opt-in for one-process setups: with CHANNEL_LAYER=memory a separate
+    # worker's broadcasts could not reach this process's clients.
+    from exchange.services.market_simulator import start_in_process
+    start_in_process()
+
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": URLRouter(websocket_urlpatterns),
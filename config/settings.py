@@ -25,6 +25,14 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key')
 TWELVE_DATA_API_KEY = os.getenv('TWELVE_DATA_API_KEY')
 
+# External price source: yfinance, twelvedata, simulator, replay, or a dotted
+# path to a PriceProvider subclass (see exchange/services/price_providers.py).
+PRICE_PROVIDER = os.getenv('PRICE_PROVIDER', 'yfinance')
+PRICE_SIMULATOR_SEED = int(os.getenv('PRICE_SIMULATOR_SEED', '0'))
+PRICE_REPLAY_FILE = os.getenv('PRICE_REPLAY_FILE')
+# Source of /api/candles/?source=provider; same choices, Twelve Data as before.
+CANDLE_PROVIDER = os.getenv('CANDLE_PROVIDER', 'twelvedata')
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.getenv('DEBUG') == 'True'
 
@@ -56,11 +64,107 @@ INSTALLED_APPS = [
 
 ASGI_APPLICATION = 'config.asgi.application'
 
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-    },
-}
+# WebSocket fan-out. "memory" only reaches clients of the sending process;
+# "redis" uses channels-redis at CHANNEL_REDIS_URL (falls back to REDIS_URL);
+# "local" relays group sends between processes on one host through the broker
+# started with `manage.py run_channel_broker` on CHANNEL_BROKER_PATH.
+CHANNEL_LAYER = os.getenv('CHANNEL_LAYER', 'memory')
+CHANNEL_REDIS_URL = os.getenv('CHANNEL_REDIS_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+CHANNEL_BROKER_PATH = os.getenv('CHANNEL_BROKER_PATH', '/tmp/mini-exchange-channels.sock')
+
+if CHANNEL_LAYER == 'redis':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [CHANNEL_REDIS_URL]},
+        },
+    }
+elif CHANNEL_LAYER == 'local':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'exchange.channel_layers.LocalBrokerChannelLayer',
+            'CONFIG': {'path': CHANNEL_BROKER_PATH},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+
+# Orders and cancels are queued to one sequencer thread per symbol; views wait
+# this many seconds for the result.
+ORDER_SEQUENCER_TIMEOUT = float(os.getenv('ORDER_SEQUENCER_TIMEOUT', '10'))
+
+# Opt-in per-stage wall time and query counts for place/cancel/replace,
+# served at /api/metrics/ (Prometheus text) and logged as JSON lines by the
+# exchange.services.metrics logger.
+ORDER_METRICS = os.getenv('ORDER_METRICS') == 'True'
+if ORDER_METRICS:
+    LOGGING = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'handlers': {'console': {'class': 'logging.StreamHandler'}},
+        'loggers': {
+            'exchange.services.metrics': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        },
+    }
+
+# WebSocket send queues: a client with more than WS_SEND_QUEUE_LIMIT frames
+# queued loses the oldest (delta streams resync from a snapshot), and one whose
+# oldest queued frame is older than WS_MAX_LAG_SECONDS is disconnected.
+WS_SEND_QUEUE_LIMIT = int(os.getenv('WS_SEND_QUEUE_LIMIT', '100'))
+WS_MAX_LAG_SECONDS = float(os.getenv('WS_MAX_LAG_SECONDS', '10'))
+# Seconds between app-level pings on WebSocket connections (0 = off). Clients
+# must answer {"type": "ping", "id": n} with {"action": "pong", "id": n}; one
+# that doesn't within WS_MAX_LAG_SECONDS counts as lagging. Needed to catch
+# clients that stop reading under Daphne, which never pushes back on sends.
+WS_PING_INTERVAL_SECONDS = float(os.getenv('WS_PING_INTERVAL_SECONDS', '0'))
+
+# Broadcast payloads are encoded once by the producer: 'json' (ujson text
+# frames) or 'msgpack' (binary frames) for every WebSocket message.
+WS_FRAME_FORMAT = os.getenv('WS_FRAME_FORMAT', 'json')
+
+# Orderbook/price broadcasts are coalesced and flushed at most once per interval.
+BROADCAST_INTERVAL_MS = int(os.getenv('BROADCAST_INTERVAL_MS', '50'))
+
+# Readers trust the in-process order book for this many seconds before checking
+# Symbol.book_seq for writes made by another process.
+ORDERBOOK_SEQ_CHECK_INTERVAL = float(os.getenv('ORDERBOOK_SEQ_CHECK_INTERVAL', '1'))
+
+# Order price-band checks read reference prices from memory. The background
+# refresher reloads them from the DB every REFERENCE_PRICE_RELOAD_SECONDS and
+# fetches external prices older than REFERENCE_PRICE_MAX_AGE seconds.
+REFERENCE_PRICE_RELOAD_SECONDS = float(os.getenv('REFERENCE_PRICE_RELOAD_SECONDS', '5'))
+REFERENCE_PRICE_MAX_AGE = float(os.getenv('REFERENCE_PRICE_MAX_AGE', '60'))
+# Every symbol's external price is refreshed this often, PRICE_FETCH_WORKERS
+# tickers at a time.
+PRICE_REFRESH_MINUTES = float(os.getenv('PRICE_REFRESH_MINUTES', '60'))
+PRICE_FETCH_WORKERS = int(os.getenv('PRICE_FETCH_WORKERS', '8'))
+
+# Trade prints kept in memory per symbol for candle indicators (seconds).
+ANALYTICS_CACHE_SECONDS = float(os.getenv('ANALYTICS_CACHE_SECONDS', '86400'))
+
+# `manage.py archive_history` moves trades and FILLED/CANCELED orders older
+# than this many days into the archive tables.
+ARCHIVE_AFTER_DAYS = float(os.getenv('ARCHIVE_AFTER_DAYS', '7'))
+
+# Seconds between simulator price ticks (every symbol moves once per tick).
+SIMULATION_TICK_SECONDS = float(os.getenv('SIMULATION_TICK_SECONDS', '1'))
+
+# `manage.py run_market_worker` leader lease; a standby takes over this many
+# seconds after the leader dies.
+MARKET_WORKER_LEASE_SECONDS = float(os.getenv('MARKET_WORKER_LEASE_SECONDS', '15'))
+# Run the simulator and market maker inside the ASGI process instead of a
+# separate worker (single-process setups on CHANNEL_LAYER=memory).
+MARKET_WORKER_IN_PROCESS = os.getenv('MARKET_WORKER_IN_PROCESS') == 'True'
+
+# Market maker: quote size, seconds between cycles, and how far (fraction of
+# price) a quote's target must move before it is replaced.
+MARKET_MAKER_QUOTE_SIZE = int(os.getenv('MARKET_MAKER_QUOTE_SIZE', '20'))
+MARKET_MAKER_INTERVAL = float(os.getenv('MARKET_MAKER_INTERVAL', '5'))
+MARKET_MAKER_REQUOTE_THRESHOLD = float(os.getenv('MARKET_MAKER_REQUOTE_THRESHOLD', '0.001'))
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
@@ -118,6 +222,8 @@ else:
             "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
         }
     }
+    # SQLite ignores the covering columns of order_resting_idx; the index still works.
+    SILENCED_SYSTEM_CHECKS = ['models.W040']
 
 
 # Password validation
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, Trade, Portfolio, Symbol, Holding
+from .models import Order, Trade, Portfolio, Symbol, Holding, Candle, ArchivedOrder, ArchivedTrade
 
 # Register your models here.    
 
@@ -7,4 +7,7 @@ admin.site.register(Order)
 admin.site.register(Trade)
 admin.site.register(Portfolio)
 admin.site.register(Symbol)
-admin.site.register(Holding)
\ No newline at end of file
+admin.site.register(Holding)
+admin.site.register(Candle)
+admin.site.register(ArchivedOrder)
+admin.site.register(ArchivedTrade)
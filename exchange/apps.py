@@ -1,13 +1,11 @@
 from django.apps import AppConfig
-from threading import Thread
 
 class ExchangeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'exchange'
 
     def ready(self):
+        # The price simulator and market maker run in their own process
+        # (`python manage.py run_market_worker`), or with
+        # MARKET_WORKER_IN_PROCESS in the web process (config/asgi.py).
         import exchange.signals
-        from .services.market_simulator import simulation_loop
-        thread = Thread(target=simulation_loop)
-        thread.daemon = True
-        thread.start()
\ No newline at end of file
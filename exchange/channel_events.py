@@ -1,21 +1,106 @@
+"""
+Channel layer broadcasts. Every message carries "frame", the client message
+already encoded (exchange.services.frames), plus the scalars consumers route
+on; the payload itself is not repeated, because the channel layer copies each
+message once per subscriber.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from exchange.services.frames import book_delta_message, book_snapshot_message, encode
+from exchange.services.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+
 def broadcast_orderbook(symbol_name):
+    """Send a full snapshot; clients reset their book to it."""
     try:
         from asgiref.sync import async_to_sync
         from channels.layers import get_channel_layer
-        from .services.orderbook import get_order_book
+        from .services.orderbook import order_book_snapshot
         channel_layer = get_channel_layer()
         if not channel_layer:
             return
-        order_book = get_order_book(symbol_name)
+        order_book = order_book_snapshot(symbol_name)
         group = f"orderbook_{symbol_name}"
-        async_to_sync(channel_layer.group_send)(
-            group, {"type": "orderbook_update", "data": order_book}
-        )
+        async_to_sync(channel_layer.group_send)(group, {
+            "type": "orderbook_update",
+            "symbol": symbol_name,
+            "seq": order_book["seq"],
+            "frame": encode(book_snapshot_message(order_book)),
+        })
+    except Exception:
+        logger.exception("Order book broadcast failed for %s", symbol_name)
+
+
+def broadcast_orderbook_delta(symbol_name, delta):
+    """
+    Send changed price levels only (see LimitOrderBook.commit). Full-book
+    clients load the book after it on demand (consumers.shared_book_snapshot).
+    """
+    try:
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+        channel_layer = get_channel_layer()
+        if not channel_layer:
+            return
+        async_to_sync(channel_layer.group_send)(f"orderbook_{symbol_name}", {
+            "type": "orderbook_delta",
+            "symbol": symbol_name,
+            "prev_seq": delta["prev_seq"],
+            "seq": delta["seq"],
+            "frame": encode(book_delta_message(symbol_name, delta)),
+        })
     except Exception:
-        pass
+        logger.exception("Order book delta broadcast failed for %s", symbol_name)
 
 
-def broadcast_prices():
+def broadcast_candle(candle):
+    """Send the live bar to ws/candles/ clients of its symbol and interval."""
+    try:
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+        channel_layer = get_channel_layer()
+        if not channel_layer:
+            return
+        group = f"candles_{candle['symbol']}_{candle['interval']}"
+        async_to_sync(channel_layer.group_send)(group, {
+            "type": "candle_update",
+            "symbol": candle["symbol"],
+            "interval": candle["interval"],
+            "time": candle["time"],
+            "frame": encode(dict(candle, channel="candles")),
+        })
+    except Exception:
+        logger.exception("Candle broadcast failed for %s", candle.get("symbol"))
+
+
+def broadcast_trades(symbol_name, trades):
+    """Send new trade prints of one symbol, oldest first, to its trades group."""
+    try:
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+        channel_layer = get_channel_layer()
+        if not channel_layer:
+            return
+        async_to_sync(channel_layer.group_send)(f"trades_{symbol_name}", {
+            "type": "trades_update",
+            "symbol": symbol_name,
+            "first_id": trades[0]["id"],
+            "last_id": trades[-1]["id"],
+            "frame": encode({"channel": "trades", "symbol": symbol_name, "trades": trades}),
+        })
+    except Exception:
+        logger.exception("Trades broadcast failed for %s", symbol_name)
+
+
+def broadcast_prices(data=None):
+    """Send [{"symbol", "price"}] to /ws/prices/; read from the DB when data is None."""
     from channels.layers import get_channel_layer
     from asgiref.sync import async_to_sync
     from exchange.models import Symbol
@@ -24,18 +109,146 @@ def broadcast_prices():
     if not channel_layer:
         return
 
-    data = [
-        {
-            "symbol": s.name,
-            "price": str(s.last_price),
-        }
-        for s in Symbol.objects.all()
-    ]
+    if data is None:
+        data = [
+            {
+                "symbol": name,
+                "price": str(last_price),
+            }
+            for name, last_price in Symbol.objects.values_list("name", "last_price")
+        ]
 
     async_to_sync(channel_layer.group_send)(
         "prices_stream",
-        {
-            "type": "prices_update",
-            "data": data,
-        },
+        {"type": "prices_update", "frame": encode(data)},
     )
+
+
+class BroadcastScheduler:
+    """
+    Coalesces broadcast requests. Symbols are marked dirty after the
+    surrounding transaction commits and flushed by one background thread at
+    most once per interval, so a burst of fills produces a single message.
+    Consecutive L2 deltas for a symbol are merged into one, only the latest
+    state of each live candle is sent, and trade prints of a symbol go out as
+    one batch.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._cond = threading.Condition()
+        self._books = set()
+        self._deltas = {}
+        self._prices = False
+        self._candles = {}  # (symbol_name, interval, time) -> bar
+        self._trades = {}  # symbol_name -> [trade, ...]
+        self._thread = None
+
+    def _merge_delta(self, symbol_name, delta):
+        pending = self._deltas.setdefault(symbol_name, [])
+        if pending and pending[-1]["seq"] == delta["prev_seq"]:
+            last = pending[-1]
+            last["seq"] = delta["seq"]
+            last["bids"].update(delta["bids"])
+            last["asks"].update(delta["asks"])
+        else:
+            pending.append({
+                "prev_seq": delta["prev_seq"],
+                "seq": delta["seq"],
+                "bids": dict(delta["bids"]),
+                "asks": dict(delta["asks"]),
+            })
+
+    def mark(self, symbol_name=None, prices=False, delta=None, candles=(), trades=()):
+        with self._cond:
+            if trades:
+                self._trades.setdefault(symbol_name, []).extend(trades)
+            for candle in candles:
+                self._candles[(candle["symbol"], candle["interval"], candle["time"])] = candle
+            if delta is not None:
+                self._merge_delta(symbol_name, delta)
+            elif symbol_name and not trades:
+                self._books.add(symbol_name)
+            self._prices = self._prices or prices
+            if self.interval <= 0:
+                inline = True
+            else:
+                inline = False
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="broadcast-scheduler", daemon=True
+                    )
+                    self._thread.start()
+                self._cond.notify()
+        if inline:
+            self.flush()
+
+    def flush(self):
+        with self._cond:
+            books, self._books = self._books, set()
+            deltas, self._deltas = self._deltas, {}
+            prices, self._prices = self._prices, False
+            candles, self._candles = self._candles, {}
+            trades, self._trades = self._trades, {}
+        for symbol_name, pending in deltas.items():
+            for delta in pending:
+                broadcast_orderbook_delta(symbol_name, {
+                    "prev_seq": delta["prev_seq"],
+                    "seq": delta["seq"],
+                    "bids": [[p, q] for p, q in delta["bids"].items()],
+                    "asks": [[p, q] for p, q in delta["asks"].items()],
+                })
+        for symbol_name in sorted(books):
+            broadcast_orderbook(symbol_name)
+        if prices:
+            broadcast_prices()
+        for candle in candles.values():
+            broadcast_candle(candle)
+        for symbol_name, prints in trades.items():
+            broadcast_trades(symbol_name, prints)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not (self._books or self._deltas or self._prices or self._candles or self._trades):
+                    self._cond.wait()
+            time.sleep(self.interval)
+            close_old_connections()
+            try:
+                with timed("broadcast", "flush"):
+                    self.flush()
+            except Exception:
+                logger.exception("Broadcast flush failed")
+
+
+_scheduler = None
+
+
+def get_broadcast_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        interval = getattr(settings, "BROADCAST_INTERVAL_MS", 50) / 1000
+        _scheduler = BroadcastScheduler(interval)
+    return _scheduler
+
+
+def schedule_orderbook_broadcast(symbol_name):
+    transaction.on_commit(lambda: get_broadcast_scheduler().mark(symbol_name=symbol_name))
+
+
+def schedule_orderbook_delta(symbol_name, delta):
+    transaction.on_commit(lambda: get_broadcast_scheduler().mark(symbol_name=symbol_name, delta=delta))
+
+
+def schedule_prices_broadcast():
+    transaction.on_commit(lambda: get_broadcast_scheduler().mark(prices=True))
+
+
+def schedule_candles_broadcast(candles):
+    if candles:
+        transaction.on_commit(lambda: get_broadcast_scheduler().mark(candles=candles))
+
+
+def schedule_trades_broadcast(symbol_name, trades):
+    if trades:
+        transaction.on_commit(lambda: get_broadcast_scheduler().mark(symbol_name=symbol_name, trades=trades))
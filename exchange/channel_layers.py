@@ -0,0 +1,302 @@
+"""
+Channel layer that fans group sends out to every process on the host.
+
+LocalBrokerChannelLayer keeps channels and group membership in memory like
+InMemoryChannelLayer, and additionally forwards each group_send to a small
+broker listening on a Unix socket (`manage.py run_channel_broker`). The broker
+relays it to every other process that has members in that group, so a price
+tick from the market worker reaches WebSocket clients of every Daphne process.
+
+Wire format: frames of a 4-byte big-endian length followed by a msgpack list
+of operations, ["sub", group], ["unsub", group] or ["msg", group, payload],
+where payload is the msgpack-encoded message. Messages are encoded once by
+the sender and the broker forwards the bytes untouched. Sends queued while a
+frame is being written go out together in the next frame.
+
+Direct sends to a single channel stay in-process; only groups cross processes.
+If the broker is down, local delivery keeps working and the client reconnects
+in the background.
+"""
+import asyncio
+import logging
+import socket
+import struct
+import threading
+import time
+from copy import deepcopy
+from datetime import date, datetime
+from decimal import Decimal
+
+import msgpack
+from channels.layers import InMemoryChannelLayer
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct(">I")
+MAX_FRAME = 64 * 1024 * 1024
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+def pack(value):
+    return msgpack.packb(value, default=_default, use_bin_type=True)
+
+
+def unpack(data):
+    return msgpack.unpackb(data, raw=False)
+
+
+def frame(ops):
+    body = pack(ops)
+    return HEADER.pack(len(body)) + body
+
+
+def _recv_exactly(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("broker closed the connection")
+        buf += chunk
+    return bytes(buf)
+
+
+class BrokerClient:
+    """
+    Background connection to the broker. publish/subscribe only queue
+    operations; one writer thread sends everything queued since its last
+    write as a single frame, and a reader thread hands incoming batches of
+    (group, payload) to on_batch.
+    """
+
+    def __init__(self, path, on_batch, reconnect_delay=1.0):
+        self.path = path
+        self.on_batch = on_batch
+        self.reconnect_delay = reconnect_delay
+        self.groups = set()
+        self._cond = threading.Condition()
+        self._pending = []
+        self._sock = None
+        self._thread = None
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="channel-broker-client", daemon=True
+                )
+                self._thread.start()
+
+    def _queue(self, op, only_connected=False):
+        with self._cond:
+            if only_connected and self._sock is None:
+                return
+            self._pending.append(op)
+            self._cond.notify()
+
+    def subscribe(self, group):
+        self.groups.add(group)
+        self._queue(["sub", group], only_connected=True)
+
+    def unsubscribe(self, group):
+        self.groups.discard(group)
+        self._queue(["unsub", group], only_connected=True)
+
+    def publish(self, group, payload):
+        # Messages sent while disconnected are dropped, not replayed later.
+        self._queue(["msg", group, payload], only_connected=True)
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        with self._cond:
+            self._sock = sock
+            # Subscriptions go first so nothing published after this is missed.
+            self._pending = [["sub", group] for group in sorted(self.groups)] + self._pending
+            self._cond.notify()
+        return sock
+
+    def _disconnect(self, sock):
+        with self._cond:
+            if self._sock is sock:
+                self._sock = None
+                self._pending = []
+                self._cond.notify_all()
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+    def _read(self, sock):
+        try:
+            while True:
+                (size,) = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+                if size > MAX_FRAME:
+                    raise ConnectionError(f"frame of {size} bytes from broker")
+                ops = unpack(_recv_exactly(sock, size))
+                self.on_batch([(op[1], op[2]) for op in ops if op[0] == "msg"])
+        except (OSError, ValueError, ConnectionError):
+            pass
+        finally:
+            self._disconnect(sock)
+
+    def _write(self, sock):
+        while True:
+            with self._cond:
+                while self._sock is sock and not self._pending:
+                    self._cond.wait()
+                if self._sock is not sock:
+                    return
+                ops, self._pending = self._pending, []
+            try:
+                sock.sendall(frame(ops))
+            except OSError:
+                self._disconnect(sock)
+                return
+
+    def _run(self):
+        warned = False
+        while True:
+            try:
+                sock = self._connect()
+            except OSError as e:
+                if not warned:
+                    logger.warning("Channel broker at %s unavailable (%s); retrying.", self.path, e)
+                    warned = True
+                time.sleep(self.reconnect_delay)
+                continue
+            logger.info("Connected to channel broker at %s", self.path)
+            warned = False
+            threading.Thread(
+                target=self._read, args=(sock,), name="channel-broker-reader", daemon=True
+            ).start()
+            self._write(sock)
+            time.sleep(self.reconnect_delay)
+
+
+class LocalBrokerChannelLayer(InMemoryChannelLayer):
+    """
+    InMemoryChannelLayer whose groups span processes through the broker at
+    `path`. Configure with CHANNEL_LAYER=local (see config/settings.py).
+    """
+
+    def __init__(self, path="/tmp/mini-exchange-channels.sock", **kwargs):
+        super().__init__(**kwargs)
+        self.client = BrokerClient(path, self._receive_batch)
+        self._loop = None  # loop the consumers (and their queues) live on
+
+    async def group_add(self, group, channel):
+        self._loop = asyncio.get_running_loop()
+        new_group = group not in self.groups
+        await super().group_add(group, channel)
+        self.client.start()
+        if new_group:
+            self.client.subscribe(group)
+
+    async def group_discard(self, group, channel):
+        await super().group_discard(group, channel)
+        if group not in self.groups and group in self.client.groups:
+            self.client.unsubscribe(group)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+        self.client.start()
+        self.client.publish(group, pack(message))
+        if group in self.groups:
+            self._call_on_loop(self._deliver, [(group, message)])
+
+    async def flush(self):
+        for group in list(self.groups):
+            self.client.unsubscribe(group)
+        await super().flush()
+
+    def _call_on_loop(self, func, *args):
+        """Run func on the consumers' loop; group_send may come from another thread."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            func(*args)
+        else:
+            loop.call_soon_threadsafe(func, *args)
+
+    def _receive_batch(self, batch):
+        messages = []
+        for group, payload in batch:
+            if group in self.groups:
+                messages.append((group, unpack(payload)))
+        if messages:
+            self._call_on_loop(self._deliver, messages)
+
+    def _deliver(self, messages):
+        self._clean_expired()
+        expires = time.time() + self.expiry
+        for group, message in messages:
+            for channel in list(self.groups.get(group, ())):
+                queue = self.channels.setdefault(
+                    channel, asyncio.Queue(maxsize=self.get_capacity(channel))
+                )
+                try:
+                    queue.put_nowait((expires, deepcopy(message)))
+                except asyncio.QueueFull:
+                    pass
+
+
+class Broker:
+    """Relays ["msg", group, payload] from each client to the others subscribed to group."""
+
+    def __init__(self, max_buffer=8 * 1024 * 1024):
+        self.max_buffer = max_buffer
+        self.subscribers = {}  # group -> set of StreamWriter
+
+    def _drop(self, writer):
+        for members in self.subscribers.values():
+            members.discard(writer)
+        writer.close()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                (size,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+                if size > MAX_FRAME:
+                    break
+                outbound = {}
+                for op in unpack(await reader.readexactly(size)):
+                    if op[0] == "sub":
+                        self.subscribers.setdefault(op[1], set()).add(writer)
+                    elif op[0] == "unsub":
+                        members = self.subscribers.get(op[1])
+                        if members is not None:
+                            members.discard(writer)
+                            if not members:
+                                del self.subscribers[op[1]]
+                    elif op[0] == "msg":
+                        for member in self.subscribers.get(op[1], ()):
+                            if member is not writer:
+                                outbound.setdefault(member, []).append(op)
+                for member, ops in outbound.items():
+                    if member.transport.get_write_buffer_size() > self.max_buffer:
+                        logger.warning("Dropping channel broker client that is not reading.")
+                        self._drop(member)
+                    else:
+                        member.write(frame(ops))
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._drop(writer)
+
+    async def serve(self, path):
+        server = await asyncio.start_unix_server(self.handle, path=path)
+        async with server:
+            await server.serve_forever()
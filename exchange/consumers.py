@@ -1,39 +1,451 @@
+import asyncio
 import json
+import time
+import weakref
+from collections import OrderedDict
+from decimal import Decimal
+from urllib.parse import parse_qs
 from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
 
+from .services.frames import book_delta_message, book_snapshot_message, decode, encode
+from .services.metrics import increment
+
+
+def as_frame(message):
+    return message if isinstance(message, (str, bytes)) else encode(message)
+
+
+_book_loads = weakref.WeakKeyDictionary()  # event loop -> {symbol name: task}
+
+
+async def shared_book_snapshot(symbol_name, min_seq=0):
+    """
+    (order_book_snapshot, its encoded frame) at min_seq or later. Full-book
+    streams need the book after every delta; the connections of a process
+    share one load and encode per change, and none happens without them.
+    """
+    from .services.orderbook import order_book_snapshot
+
+    def load():
+        book = order_book_snapshot(symbol_name)
+        return book, encode(book_snapshot_message(book))
+
+    loads = _book_loads.setdefault(asyncio.get_running_loop(), {})
+    for _ in range(2):
+        task = loads.get(symbol_name)
+        if task is None or task.done() and (
+            task.cancelled() or task.exception() is not None or task.result()[0]["seq"] < min_seq
+        ):
+            task = loads[symbol_name] = asyncio.ensure_future(sync_to_async(load)())
+        book, frame = await asyncio.shield(task)
+        if book["seq"] >= min_seq:
+            break  # else it was already loading before min_seq; load once more
+    return book, frame
+
+
+class BufferedConsumer(AsyncWebsocketConsumer):
+    """
+    Sends through a per-connection queue drained by one writer task, so a
+    handler never waits on a slow client and the channel layer's buffer for
+    this connection stays empty. Frames are str (text) or bytes (binary), as
+    made by exchange.services.frames.
+
+    Frames queued with the same key replace each other, so a lagging client
+    only gets the latest snapshot. Past WS_SEND_QUEUE_LIMIT queued frames
+    on_overflow drops the oldest, and a client whose oldest queued frame has
+    waited WS_MAX_LAG_SECONDS is disconnected (close code 4008). Outcomes are
+    counted per group in exchange_ws_messages_total / exchange_ws_disconnects_total.
+
+    The queue only fills when the server pushes back, and Daphne doesn't: its
+    send() returns as soon as the frame is in Twisted's write buffer, so a
+    client that stops reading just grows that buffer. "written" therefore
+    means handed to the server, not delivered. With WS_PING_INTERVAL_SECONDS
+    set the writer also queues {"type": "ping", "id": n} behind the data and
+    expects {"action": "pong", "id": n} back; a ping unanswered for
+    WS_MAX_LAG_SECONDS counts as lag too, which catches non-reading clients
+    on any server. Lag is checked by the writer on a timer as well as on
+    enqueue, so a connection with nothing new to send is still closed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.outbox = OrderedDict()  # key -> (queued_at, frame, group)
+        self.queue_limit = getattr(settings, "WS_SEND_QUEUE_LIMIT", 100)
+        self.max_lag = getattr(settings, "WS_MAX_LAG_SECONDS", 10)
+        self.ping_interval = getattr(settings, "WS_PING_INTERVAL_SECONDS", 0)
+        self._frame_seq = 0
+        self._ping_id = 0
+        self._ping = None  # (id, queued_at) of the unanswered ping
+        self._last_ping = time.monotonic()
+        self._wake = asyncio.Event()
+        self._writer = None
+        self._closing = False
+
+    async def accept(self, *args, **kwargs):
+        await super().accept(*args, **kwargs)
+        self._start_writer()
+
+    def _start_writer(self):
+        if self._writer is None:
+            self._writer = asyncio.ensure_future(self._drain())
+
+    def lag(self, now):
+        """Seconds the client has been behind: oldest queued frame or unanswered ping."""
+        lag = 0
+        if self.outbox:
+            lag = now - next(iter(self.outbox.values()))[0]
+        if self._ping is not None:
+            lag = max(lag, now - self._ping[1])
+        return lag
+
+    def queue_frame(self, frame, group, key=None):
+        """Queue a frame for the client; False if it was not queued because of overflow."""
+        if self._closing:
+            return True
+        now = time.monotonic()
+        if self.lag(now) > self.max_lag:
+            self._disconnect_lagging(group)
+            return True
+        if key is not None and key in self.outbox:
+            queued_at = self.outbox[key][0]
+            self.outbox[key] = (queued_at, frame, group)
+            increment("exchange_ws_messages_total", group=group, outcome="conflated")
+            return True
+        if len(self.outbox) >= self.queue_limit and not self.on_overflow(group):
+            return False
+        if key is None:
+            self._frame_seq += 1
+            key = self._frame_seq
+        self.outbox[key] = (now, frame, group)
+        self._start_writer()
+        self._wake.set()
+        return True
+
+    def on_overflow(self, group):
+        """Make room in a full queue; return whether the new frame is still queued."""
+        _, (_, _, dropped_group) = self.outbox.popitem(last=False)
+        self.count_dropped(dropped_group)
+        return True
+
+    def count_dropped(self, group):
+        if group == "ping":
+            self._ping = None  # never sent, so never answered
+        else:
+            increment("exchange_ws_messages_total", group=group, outcome="dropped")
+
+    def drop_queued(self):
+        for _, _, group in self.outbox.values():
+            self.count_dropped(group)
+        self.outbox.clear()
+
+    def _disconnect_lagging(self, group):
+        self._closing = True
+        self.drop_queued()
+        increment("exchange_ws_disconnects_total", group=group)
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        asyncio.ensure_future(self.close(code=4008))
+
+    def _tick(self, now):
+        """Queue the next ping when due; seconds until the writer should look again."""
+        if not self.ping_interval:
+            return self.max_lag / 2
+        if self._ping is None and now - self._last_ping >= self.ping_interval:
+            self._ping_id += 1
+            self._ping = (self._ping_id, now)
+            self._last_ping = now
+            self._frame_seq += 1
+            self.outbox[self._frame_seq] = (now, encode({"type": "ping", "id": self._ping_id}), "ping")
+        return min(self.ping_interval, self.max_lag / 2)
+
+    async def _drain(self):
+        while not self._closing:
+            now = time.monotonic()
+            if self.lag(now) > self.max_lag:
+                self._disconnect_lagging(next(iter(self.outbox.values()))[2] if self.outbox else "ping")
+                return
+            timeout = self._tick(now)
+            while self.outbox:
+                _, (_, frame, group) = self.outbox.popitem(last=False)
+                if isinstance(frame, bytes):
+                    await self.send(bytes_data=frame)
+                else:
+                    await self.send(text_data=frame)
+                if group != "ping":
+                    increment("exchange_ws_messages_total", group=group, outcome="written")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def pong(self, message):
+        """Handle {"action": "pong", "id": n}; True if message was one."""
+        if not (isinstance(message, dict) and message.get("action") == "pong"):
+            return False
+        if self._ping is not None and message.get("id") == self._ping[0]:
+            self._ping = None
+        return True
+
+    async def websocket_receive(self, message):
+        text = message.get("text")
+        if text and '"pong"' in text:
+            try:
+                if self.pong(json.loads(text)):
+                    return
+            except ValueError:
+                pass
+        await super().websocket_receive(message)
+
+    async def websocket_disconnect(self, message):
+        self._closing = True
+        if self._writer is not None:
+            self._writer.cancel()
+        await super().websocket_disconnect(message)
+
+
+class BookStream:
+    """
+    One client's view of one symbol's book, kept from the snapshot and delta
+    events of its orderbook_ group. snapshot() and delta() return the message
+    to send (see OrderBookConsumer for the formats), already encoded when the
+    producer's frame can be forwarded as is, or None.
+    """
+
+    def __init__(self, symbol, mode="snapshot", depth=None, tick=None):
+        self.symbol = symbol
+        self.mode = mode
+        self.depth = depth
+        self.tick = tick
+        self.seq = None  # last book seq applied
+        self.sent_seq = None  # last seq sent to the client (delta mode)
+        self.bids = {}  # full book replica, Decimal price -> qty
+        self.asks = {}
+        self.view = ({}, {})  # last bids/asks view sent
+
+    @property
+    def forwards_raw_deltas(self):
+        return self.mode == "delta" and not (self.depth or self.tick)
+
+    @property
+    def forwards_snapshots(self):
+        return self.mode == "snapshot" and not (self.depth or self.tick)
+
+    def render(self):
+        from .services.orderbook import aggregate_levels
+
+        return tuple(
+            {
+                str(price): qty
+                for price, qty in aggregate_levels(
+                    sorted(levels.items(), reverse=side == "BUY"), side, self.depth, self.tick
+                )
+            }
+            for levels, side in ((self.bids, "BUY"), (self.asks, "SELL"))
+        )
+
+    def view_snapshot(self):
+        return {
+            "type": "snapshot",
+            "channel": "book",
+            "symbol": self.symbol,
+            "seq": self.seq,
+            "bids": [{"price": p, "total_quantity": q} for p, q in self.view[0].items()],
+            "asks": [{"price": p, "total_quantity": q} for p, q in self.view[1].items()],
+        }
+
+    def snapshot_event(self, event):
+        """Message for an orderbook_update event; its frame is decoded only to build a view."""
+        if self.forwards_raw_deltas or self.forwards_snapshots:
+            self.seq = self.sent_seq = event["seq"]
+            return event["frame"]
+        return self.snapshot(decode(event["frame"]))
+
+    def snapshot(self, book, frame=None):
+        """Message for an order_book_snapshot; frame is its encoded book_snapshot_message."""
+        self.seq = self.sent_seq = book["seq"]
+        self.symbol = book.get("symbol", self.symbol)
+        if self.forwards_raw_deltas or self.forwards_snapshots:
+            return frame or book_snapshot_message(book)
+        self.bids = {Decimal(level["price"]): level["total_quantity"] for level in book["bids"]}
+        self.asks = {Decimal(level["price"]): level["total_quantity"] for level in book["asks"]}
+        self.view = self.render()
+        return self.view_snapshot()
+
+    def delta(self, event):
+        """(message or None, True when a fresh snapshot is needed) for an orderbook_delta event."""
+        if self.seq is not None and event["seq"] <= self.seq:
+            return None, False  # already covered by the snapshot we sent
+        if self.forwards_raw_deltas:
+            self.seq = self.sent_seq = event["seq"]
+            return event["frame"], False
+        if self.forwards_snapshots:
+            # No replica to apply it to: the consumer sends the full book
+            # from shared_book_snapshot instead.
+            return None, True
+        if self.seq is None or event["prev_seq"] > self.seq:
+            return None, True
+        delta = decode(event["frame"])
+        for levels, changes in ((self.bids, delta["bids"]), (self.asks, delta["asks"])):
+            for price, qty in changes:
+                if qty:
+                    levels[Decimal(price)] = qty
+                else:
+                    levels.pop(Decimal(price), None)
+        self.seq = delta["seq"]
+        old_view, self.view = self.view, self.render()
+        if self.mode != "delta":
+            return self.view_snapshot(), False
+        changes = []
+        for old, new in zip(old_view, self.view):
+            changes.append(
+                [[p, q] for p, q in new.items() if old.get(p) != q]
+                + [[p, 0] for p in old if p not in new]
+            )
+        if not (changes[0] or changes[1]):
+            return None, False
+        prev_seq, self.sent_seq = self.sent_seq, self.seq
+        return book_delta_message(self.symbol, {
+            "prev_seq": prev_seq,
+            "seq": self.seq,
+            "bids": changes[0],
+            "asks": changes[1],
+        }), False
+
+
+class OrderBookConsumer(BufferedConsumer):
+    """
+    ws/orderbook/?symbol=AAPL[&mode=delta][&depth=N][&tick=X]
+
+    Default mode pushes the whole book on every change as
+    {"type": "snapshot", "channel": "book", "symbol", "seq", "bids": [...], "asks": [...]}.
+
+    mode=delta sends that snapshot once, then
+    {"type": "delta", "channel": "book", "symbol", "prev_seq", "seq", "bids": [[price, qty]], "asks": [...]}
+    with only the changed levels (qty 0 removes the level). A client whose
+    last seq differs from prev_seq has missed a message and should send
+    {"action": "resync"} to get a fresh snapshot.
+
+    depth limits each side to the best N levels and tick groups prices into
+    buckets of that size; in delta mode the deltas describe that view. Those
+    views are built per connection; without depth/tick the deltas encoded by
+    the producer are forwarded untouched, and the full book is loaded and
+    encoded once per change for all default-mode clients of the process.
+
+    Full-book frames conflate. In delta mode a client whose send queue fills
+    up has its queued deltas dropped and gets a fresh snapshot instead.
+    """
 
-class OrderBookConsumer(AsyncWebsocketConsumer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.symbol = None
+        self.stream = None
         self.room_group_name = None
+        self.resync = False
 
     async def connect(self):
-        query = self.scope.get("query_string", b"").decode()
-        self.symbol = None
-        for part in query.split("&"):
-            if part.startswith("symbol="):
-                self.symbol = part.split("=", 1)[1].strip()
-                break
-        if not self.symbol:
+        from .services.orderbook import parse_depth_options
+
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        symbol = (query.get("symbol") or [""])[0].strip() or None
+        try:
+            depth, tick = parse_depth_options(
+                (query.get("depth") or [None])[0],
+                (query.get("tick") or [None])[0],
+            )
+        except ValueError:
+            symbol = None
+        if not symbol:
             await self.close()
             return
-        self.room_group_name = f"orderbook_{self.symbol}"
+        mode = "delta" if (query.get("mode") or [""])[0] == "delta" else "snapshot"
+        self.stream = BookStream(symbol, mode, depth, tick)
+        self.room_group_name = f"orderbook_{symbol}"
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
         await self.accept()
-        from .services.orderbook import get_order_book
-        book = await sync_to_async(get_order_book)(self.symbol)
-        await self.send(text_data=json.dumps(book, default=str))
+        await self.send_snapshot()
 
     async def disconnect(self, close_code):
         if self.room_group_name:
             await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
 
+    def on_overflow(self, group):
+        if self.stream.mode != "delta":
+            return super().on_overflow(group)
+        self.drop_queued()
+        self.resync = True
+        return False
+
+    async def emit(self, message):
+        key = None if self.stream.mode == "delta" else "book"
+        if not self.queue_frame(as_frame(message), self.room_group_name, key=key) and self.resync:
+            self.resync = False
+            await self.send_snapshot()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            message = json.loads(text_data or "{}")
+        except ValueError:
+            return
+        if isinstance(message, dict) and message.get("action") == "resync":
+            await self.send_snapshot()
+
+    async def send_snapshot(self, book=None, frame=None, min_seq=0):
+        if book is None:
+            book, frame = await shared_book_snapshot(self.stream.symbol, min_seq)
+        await self.emit(self.stream.snapshot(book, frame))
+
     async def orderbook_update(self, event):
-        await self.send(text_data=json.dumps(event["data"], default=str))
+        await self.emit(self.stream.snapshot_event(event))
+
+    async def orderbook_delta(self, event):
+        message, resync = self.stream.delta(event)
+        if resync:
+            await self.send_snapshot(min_seq=event["seq"])
+        elif message is not None:
+            await self.emit(message)
+
+
+class CandleConsumer(BufferedConsumer):
+    """
+    ws/candles/?symbol=AAPL[&interval=1m]
+
+    Sends the current bar on connect, then every update of the live bar as
+    {"channel": "candles", "symbol", "interval", "time", "open", "high", "low",
+    "close", "volume"}.
+    A message with a new time starts the next bar; queued updates of the same
+    bar conflate.
+    """
+
+    async def connect(self):
+        from .services.candles import parse_interval, get_candles
+        from .services.limit_book import resolve_symbol
+
+        self.group_name = None
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        try:
+            interval = parse_interval((query.get("interval") or ["1m"])[0])
+            symbol = await sync_to_async(resolve_symbol)((query.get("symbol") or [""])[0])
+        except Exception:
+            await self.close()
+            return
+        self.group_name = f"candles_{symbol.name}_{interval}"
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        for candle in await sync_to_async(get_candles)(symbol, interval, limit=1):
+            self.queue_frame(encode(dict(candle, channel="candles")), self.group_name, key=candle["time"])
+
+    async def disconnect(self, code):
+        if self.group_name:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def candle_update(self, event):
+        self.queue_frame(event["frame"], self.group_name, key=event["time"])
+
 
-class PricesConsumer(AsyncWebsocketConsumer):
+class PricesConsumer(BufferedConsumer):
+    """ws/prices/: [{"symbol", "price"}] for every symbol; queued updates conflate."""
 
     async def connect(self):
         self.group_name = "prices_stream"
@@ -44,4 +456,323 @@ class PricesConsumer(AsyncWebsocketConsumer):
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
     async def prices_update(self, event):
-        await self.send(text_data=json.dumps(event["data"], default=str))
+        self.queue_frame(event["frame"], self.group_name, key="prices")
+
+
+MARKET_CHANNELS = ("book", "trades", "prices", "candles")
+
+
+def parse_subscription(channel, message):
+    """
+    {SYMBOL: options} from a ws/market/ subscribe/unsubscribe message. Options
+    at the top level apply to every symbol; a symbol given as an object
+    ({"symbol": "AAPL", "depth": 5}) overrides them. Raises ValueError.
+    """
+    from .services.candles import parse_interval
+    from .services.market_stream import MAX_RECENT_TRADES
+    from .services.orderbook import parse_depth_options
+
+    entries = message.get("symbols")
+    if isinstance(entries, str):
+        entries = [entries]
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("symbols must be a non-empty list.")
+    defaults = {k: v for k, v in message.items() if k not in ("action", "channel", "symbols")}
+    requests = {}
+    for entry in entries:
+        options = dict(defaults)
+        if isinstance(entry, dict):
+            options.update(entry)
+            entry = options.pop("symbol", None)
+        if not isinstance(entry, str) or not entry.strip():
+            raise ValueError("Every symbol must be a non-empty string.")
+        if channel == "book":
+            mode = options.get("mode", "snapshot")
+            if mode not in ("snapshot", "delta"):
+                raise ValueError("mode must be snapshot or delta.")
+            depth, tick = parse_depth_options(options.get("depth"), options.get("tick"))
+            options = {"mode": mode, "depth": depth, "tick": tick}
+        elif channel == "candles":
+            options = {"interval": parse_interval(options.get("interval", "1m"))}
+        elif channel == "trades":
+            try:
+                limit = int(options.get("limit", 20))
+            except (TypeError, ValueError):
+                limit = -1
+            if not 0 <= limit <= MAX_RECENT_TRADES:
+                raise ValueError(f"limit must be between 0 and {MAX_RECENT_TRADES}.")
+            options = {"limit": limit}
+        else:
+            options = {}
+        requests[entry.strip().upper()] = options
+    return requests
+
+
+def market_initial_state(channel, symbols, requests):
+    """Initial payloads for newly subscribed Symbol rows, loaded in one batch."""
+    from .services import market_stream
+    from .services.orderbook import order_book_snapshots
+
+    if channel == "book":
+        return order_book_snapshots(symbols)
+    if channel == "prices":
+        return market_stream.price_snapshots(symbols)
+    if channel == "candles":
+        return market_stream.latest_candles(
+            symbols, {s.name: requests[s.name.upper()]["interval"] for s in symbols}
+        )
+    limit = max((requests[s.name.upper()]["limit"] for s in symbols), default=0)
+    trades = market_stream.recent_trades(symbols, limit)
+    return {
+        name: prints[len(prints) - requests[name.upper()]["limit"]:] if requests[name.upper()]["limit"] else []
+        for name, prints in trades.items()
+    }
+
+
+class MarketConsumer(BufferedConsumer):
+    """
+    ws/market/: many symbols and channels over one connection.
+
+    Client messages:
+      {"action": "subscribe", "channel": "book"|"trades"|"prices"|"candles",
+       "symbols": ["AAPL", {"symbol": "MSFT", "depth": 5}], ...options}
+      {"action": "unsubscribe", "channel": ..., "symbols": [...]}
+
+    Options: book takes mode (snapshot|delta), depth and tick as on
+    ws/orderbook/; candles takes interval (default 1m); trades takes limit,
+    the number of recent prints sent on subscribe (default 20). Top-level
+    options apply to every symbol and per-symbol objects override them.
+
+    Replies are {"type": "subscribed"|"unsubscribed", "channel", "symbols"} or
+    {"type": "error", "detail", ...}. Initial state for all symbols of a
+    subscribe is loaded in one batch, then updates follow. Every data message
+    carries "channel": book messages are the ws/orderbook/ ones;
+    trades are {"symbol", "trades": [...]}; prices are {"prices": [...]}
+    limited to the subscribed symbols; candles are the ws/candles/ bars.
+    Apart from depth/tick book views and the filtered prices, updates are the
+    frames encoded by the producer, forwarded untouched.
+
+    When the send queue fills up, queued book frames are dropped first and
+    those books get a fresh snapshot. Only with no book frames queued does
+    the oldest frame go; its channel then gets
+    {"type": "gap", "channel", "symbols"} (channel "market" for lost replies),
+    and the client should resubscribe to reload it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.subscriptions = {}  # (channel, SYMBOL) -> (name, options, group)
+        self.group_refs = {}  # group -> number of subscriptions using it
+        self.books = {}  # name -> BookStream
+        self.trade_ids = {}  # name -> last trade id sent
+        self.price_symbols = set()
+        self.candle_intervals = {}  # name -> interval
+        self.stale_books = set()  # names whose queued book frames were dropped
+        self._resyncing = False
+
+    async def connect(self):
+        await self.accept()
+
+    async def disconnect(self, code):
+        for group in list(self.group_refs):
+            await self.channel_layer.group_discard(group, self.channel_name)
+        self.group_refs.clear()
+
+    def reply(self, **message):
+        self.queue_frame(encode(message), "market")
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            message = json.loads(text_data or "{}")
+        except ValueError:
+            message = None
+        if not isinstance(message, dict):
+            self.reply(type="error", detail="Messages must be JSON objects.")
+            return
+        action = message.get("action")
+        channel = message.get("channel")
+        if action not in ("subscribe", "unsubscribe"):
+            self.reply(type="error", detail="action must be subscribe or unsubscribe.")
+            return
+        if channel not in MARKET_CHANNELS:
+            self.reply(type="error", detail=f"channel must be one of {', '.join(MARKET_CHANNELS)}.")
+            return
+        try:
+            requests = parse_subscription(channel, message)
+        except ValueError as e:
+            self.reply(type="error", channel=channel, detail=str(e))
+            return
+        if action == "subscribe":
+            await self.subscribe(channel, requests)
+        else:
+            names = [await self.remove(channel, key) for key in requests]
+            self.reply(type="unsubscribed", channel=channel, symbols=[n for n in names if n])
+
+    def group_for(self, channel, name, options):
+        if channel == "book":
+            return f"orderbook_{name}"
+        if channel == "trades":
+            return f"trades_{name}"
+        if channel == "candles":
+            return f"candles_{name}_{options['interval']}"
+        return "prices_stream"
+
+    async def subscribe(self, channel, requests):
+        from .services.market_stream import resolve_symbols
+
+        symbols = await sync_to_async(resolve_symbols)(requests.keys())
+        missing = sorted(set(requests) - set(symbols))
+        if missing:
+            self.reply(type="error", channel=channel, detail="Unknown symbols.", symbols=missing)
+        if not symbols:
+            return
+        for key, symbol in symbols.items():
+            await self.remove(channel, key)
+            options = requests[key]
+            group = self.group_for(channel, symbol.name, options)
+            self.subscriptions[(channel, key)] = (symbol.name, options, group)
+            if not self.group_refs.get(group):
+                await self.channel_layer.group_add(group, self.channel_name)
+            self.group_refs[group] = self.group_refs.get(group, 0) + 1
+        # Join first, then load: updates racing the load are queued behind it
+        # and deduplicated by seq / trade id.
+        state = await sync_to_async(market_initial_state)(channel, list(symbols.values()), requests)
+        self.reply(type="subscribed", channel=channel, symbols=[s.name for s in symbols.values()])
+
+        for key, symbol in symbols.items():
+            options = requests[key]
+            name = symbol.name
+            if channel == "book":
+                self.books[name] = BookStream(name, options["mode"], options["depth"], options["tick"])
+                await self.emit_book(self.books[name], self.books[name].snapshot(state[name]))
+            elif channel == "trades":
+                prints = state.get(name, [])
+                self.trade_ids[name] = prints[-1]["id"] if prints else 0
+                if prints:
+                    await self.emit({"channel": "trades", "symbol": name, "trades": prints}, f"trades_{name}")
+            elif channel == "candles":
+                self.candle_intervals[name] = options["interval"]
+                if name in state:
+                    await self.emit(dict(state[name], channel="candles"), self.subscriptions[(channel, key)][2],
+                                    key=("candle", name, state[name]["time"]))
+            else:
+                self.price_symbols.add(name)
+        if channel == "prices":
+            await self.emit({"channel": "prices", "prices": state}, "prices_stream", key="prices")
+
+    async def remove(self, channel, key):
+        """Drop one subscription; returns the symbol name or None."""
+        subscription = self.subscriptions.pop((channel, key), None)
+        if subscription is None:
+            return None
+        name, _, group = subscription
+        self.group_refs[group] -= 1
+        if not self.group_refs[group]:
+            del self.group_refs[group]
+            await self.channel_layer.group_discard(group, self.channel_name)
+        if channel == "book":
+            self.books.pop(name, None)
+        elif channel == "trades":
+            self.trade_ids.pop(name, None)
+        elif channel == "candles":
+            self.candle_intervals.pop(name, None)
+        else:
+            self.price_symbols.discard(name)
+        return name
+
+    def gap_notice(self, group):
+        channel, names = "market", []
+        for (sub_channel, _), (name, _, sub_group) in self.subscriptions.items():
+            if sub_group == group:
+                channel = sub_channel
+                names.append(name)
+        return {"type": "gap", "channel": channel, "symbols": sorted(names)}
+
+    def on_overflow(self, group):
+        books = {f"orderbook_{name}": name for name in self.books}
+        dropped = [key for key, (_, _, g) in self.outbox.items() if g in books]
+        if not dropped or self._resyncing:
+            # Nothing a snapshot can replace (or already resyncing): drop
+            # the oldest frame and tell the client which channel lost it.
+            _, (queued_at, _, dropped_group) = self.outbox.popitem(last=False)
+            self.count_dropped(dropped_group)
+            if dropped_group != "ping":
+                self.outbox[("gap", dropped_group)] = (
+                    queued_at, encode(self.gap_notice(dropped_group)), "market"
+                )
+            return True
+        for key in dropped:
+            _, _, dropped_group = self.outbox.pop(key)
+            self.count_dropped(dropped_group)
+            self.stale_books.add(books[dropped_group])
+        # A book frame for a book about to be resynced is covered by its snapshot.
+        return books.get(group) not in self.stale_books
+
+    async def emit(self, message, group, key=None):
+        self.queue_frame(as_frame(message), group, key=key)
+        if self.stale_books and not self._resyncing:
+            names, self.stale_books = sorted(self.stale_books), set()
+            self._resyncing = True
+            try:
+                await self.resync_books(names)
+            finally:
+                self._resyncing = False
+
+    async def emit_book(self, stream, message):
+        key = None if stream.mode == "delta" else ("book", stream.symbol)
+        await self.emit(message, f"orderbook_{stream.symbol}", key)
+
+    async def resync_books(self, names=None):
+        """Fresh snapshots for the given (default: all) book subscriptions, in one batch."""
+        from .services.market_stream import resolve_symbols
+        from .services.orderbook import order_book_snapshots
+
+        def load():
+            return order_book_snapshots(resolve_symbols(names or self.books).values())
+
+        for name, book in (await sync_to_async(load)()).items():
+            stream = self.books.get(name)
+            if stream is not None:
+                await self.emit_book(stream, stream.snapshot(book))
+
+    async def orderbook_update(self, event):
+        stream = self.books.get(event["symbol"])
+        if stream is not None:
+            await self.emit_book(stream, stream.snapshot_event(event))
+
+    async def orderbook_delta(self, event):
+        stream = self.books.get(event["symbol"])
+        if stream is None:
+            return
+        message, resync = stream.delta(event)
+        if resync:
+            book, frame = await shared_book_snapshot(stream.symbol, event["seq"])
+            await self.emit_book(stream, stream.snapshot(book, frame))
+        elif message is not None:
+            await self.emit_book(stream, message)
+
+    async def trades_update(self, event):
+        name = event["symbol"]
+        last_id = self.trade_ids.get(name)
+        if last_id is None or event["last_id"] <= last_id:
+            return
+        self.trade_ids[name] = event["last_id"]
+        if event["first_id"] > last_id:
+            message = event["frame"]
+        else:
+            fresh = [t for t in decode(event["frame"])["trades"] if t["id"] > last_id]
+            message = {"channel": "trades", "symbol": name, "trades": fresh}
+        await self.emit(message, f"trades_{name}")
+
+    async def prices_update(self, event):
+        prices = [p for p in decode(event["frame"]) if p.get("symbol") in self.price_symbols]
+        if prices:
+            await self.emit({"channel": "prices", "prices": prices}, "prices_stream", key="prices")
+
+    async def candle_update(self, event):
+        if self.candle_intervals.get(event["symbol"]) == event["interval"]:
+            await self.emit(
+                event["frame"],
+                f"candles_{event['symbol']}_{event['interval']}",
+                key=("candle", event["symbol"], event["time"]),
+            )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from exchange.services.archive import archive_cutoff, archive_history
+
+
+class Command(BaseCommand):
+    help = "Move old trades and FILLED/CANCELED orders into the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=float, default=None,
+            help="Archive rows older than this many days (default: ARCHIVE_AFTER_DAYS).",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only report how many rows would move (orders still pinned by trades are not counted).",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options["days"])
+        trades, orders = archive_history(cutoff, options["batch_size"], options["dry_run"])
+        verb = "Would archive" if options["dry_run"] else "Archived"
+        self.stdout.write(
+            f"{verb} {trades} trades and {orders} orders created before {cutoff:%Y-%m-%d %H:%M:%S}."
+        )
@@ -0,0 +1,92 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from exchange.services.benchmark import (
+    ApiDriver,
+    ServiceDriver,
+    generate_flow,
+    run_flow,
+    setup_market,
+    teardown_market,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay synthetic order flow against the configured database and report "
+        "latency percentiles, throughput and queries per order. Runs in BENCH* "
+        "symbols and bench_* users, which are removed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=2000, help="Number of order placements.")
+        parser.add_argument("--symbols", type=int, default=4)
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument(
+            "--rate", type=float, default=0.0,
+            help="Mean arrivals per second (Poisson); 0 sends back to back.",
+        )
+        parser.add_argument(
+            "--spread", type=float, default=0.01,
+            help="Std dev of order prices around last_price, as a fraction.",
+        )
+        parser.add_argument("--buy-ratio", type=float, default=0.5)
+        parser.add_argument("--cancel-ratio", type=float, default=0.2, help="Cancels per placement.")
+        parser.add_argument("--book-ratio", type=float, default=0.1, help="Book reads per placement.")
+        parser.add_argument("--max-quantity", type=int, default=10)
+        parser.add_argument(
+            "--driver", choices=["service", "api"], default="service",
+            help="Call the services directly or go through the DRF views.",
+        )
+        parser.add_argument("--threads", type=int, default=1, help="Client threads.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--json", action="store_true", help="Print the summary as JSON.")
+        parser.add_argument("--keep", action="store_true", help="Leave the BENCH* data in place.")
+
+    def handle(self, *args, **options):
+        symbols, users = setup_market(options["symbols"], options["users"])
+        try:
+            ops = generate_flow(
+                [(symbol.name, symbol.last_price) for symbol in symbols],
+                len(users),
+                options["orders"],
+                rate=options["rate"],
+                spread=options["spread"],
+                buy_ratio=options["buy_ratio"],
+                cancel_ratio=options["cancel_ratio"],
+                book_ratio=options["book_ratio"],
+                max_quantity=options["max_quantity"],
+                seed=options["seed"],
+            )
+            driver = ApiDriver() if options["driver"] == "api" else ServiceDriver()
+            results = run_flow(
+                ops, driver, users, {symbol.name: symbol for symbol in symbols},
+                threads=max(1, options["threads"]),
+            )
+        finally:
+            if not options["keep"]:
+                teardown_market()
+
+        summary = results.summary()
+        summary.update(database=connection.vendor, driver=options["driver"], threads=options["threads"])
+        if options["json"]:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+        self.stdout.write(
+            f"{summary['database']} / {summary['driver']} driver / {summary['threads']} thread(s): "
+            f"{len(ops)} ops in {summary['elapsed_s']:.2f}s"
+        )
+        self.stdout.write(
+            f"  {summary['orders_per_s']} orders/s, {summary['trades_per_s']} trades/s "
+            f"({summary['trades']} trades), {summary['queries_per_order']} queries/order"
+        )
+        self.stdout.write(f"  {'op':<8}{'count':>8}{'rejected':>10}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for kind, stats in summary["ops"].items():
+            if not stats["count"]:
+                continue
+            self.stdout.write(
+                f"  {kind:<8}{stats['count']:>8}{stats['rejected']:>10}{stats['errors']:>8}"
+                f"{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}"
+            )
@@ -0,0 +1,34 @@
+import asyncio
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from exchange.channel_layers import Broker
+
+
+def _exit(signum, frame):
+    raise SystemExit(0)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the Unix-socket broker that relays group sends between processes "
+        "when CHANNEL_LAYER=local."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path", default=None,
+            help="Socket path (default: CHANNEL_BROKER_PATH).",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"] or getattr(settings, "CHANNEL_BROKER_PATH", "/tmp/mini-exchange-channels.sock")
+        signal.signal(signal.SIGTERM, _exit)
+        self.stdout.write(f"Channel broker listening on {path}")
+        self.stdout.flush()
+        try:
+            asyncio.run(Broker().serve(path))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,58 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from exchange.services.leader import Lease, run_while_leader
+from exchange.services.market_simulator import market_maker_loop, simulation_loop
+
+
+def _exit(signum, frame):
+    raise SystemExit(0)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the price simulator and market maker. Start it on as many hosts as "
+        "you like: a lease row elects one leader, the others stand by."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--no-simulator", action="store_true", help="Don't run the price simulator.")
+        parser.add_argument("--no-market-maker", action="store_true", help="Don't run the market maker.")
+        parser.add_argument(
+            "--lease-seconds", type=float, default=None,
+            help="Leader lease length (default: MARKET_WORKER_LEASE_SECONDS).",
+        )
+
+    def handle(self, *args, **options):
+        if getattr(settings, "CHANNEL_LAYER", "memory") == "memory":
+            # The in-memory layer can't carry this process's broadcasts to
+            # the web server's clients.
+            raise CommandError(
+                "CHANNEL_LAYER=memory can't carry a worker's broadcasts to the web server. "
+                "Set CHANNEL_LAYER=redis or local, or MARKET_WORKER_IN_PROCESS=True to run "
+                "the loops in the web process instead."
+            )
+        loops = []
+        if not options["no_simulator"]:
+            loops.append(simulation_loop)
+        if not options["no_market_maker"]:
+            loops.append(market_maker_loop)
+        if not loops:
+            self.stderr.write("Nothing to run.")
+            return
+
+        # docker stop / systemd send SIGTERM; unwind so the lease is released.
+        signal.signal(signal.SIGTERM, _exit)
+
+        ttl = options["lease_seconds"] or getattr(settings, "MARKET_WORKER_LEASE_SECONDS", 15)
+        try:
+            run_while_leader(Lease("market_worker", ttl=ttl), loops, threading.Event(), say=self._say)
+        except KeyboardInterrupt:
+            pass
+
+    def _say(self, message):
+        self.stdout.write(message)
+        self.stdout.flush()
@@ -1,5 +1,6 @@
 # Generated by Django 6.0.2 on 2026-02-16 06:28
 
+from django.contrib.auth.hashers import make_password
 from django.db import migrations
 from decimal import Decimal
 
@@ -12,7 +13,8 @@ def seed_market_maker(apps, schema_editor):
     user, created = User.objects.get_or_create(username="market_maker")
 
     if created:
-        user.set_password("market1234")
+        # Historical models have no set_password().
+        user.password = make_password("market1234")
         user.save()
 
         Portfolio.objects.create(
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0004_seed_market_maker'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='symbol',
+            name='book_seq',
+            field=models.BigIntegerField(
+                default=0,
+                help_text="Bumped by every transaction that changes this symbol's order book.",
+            ),
+        ),
+    ]
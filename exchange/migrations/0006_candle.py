@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0005_symbol_book_seq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Candle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('interval', models.CharField(choices=[('1s', '1 second'), ('1m', '1 minute'), ('5m', '5 minutes'), ('1h', '1 hour')], max_length=3)),
+                ('bucket_start', models.DateTimeField()),
+                ('open', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('high', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('low', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('close', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('volume', models.PositiveBigIntegerField(default=0)),
+                ('symbol', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='candles', to='exchange.symbol')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('symbol', 'interval', 'bucket_start'), name='candle_symbol_interval_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:20
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_remaining_quantity(apps, schema_editor):
+    Order = apps.get_model("exchange", "Order")
+    Order.objects.update(remaining_quantity=F("quantity") - F("filled_quantity"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0006_candle'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='exchange_or_side_89bb2e_idx',
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='remaining_quantity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_remaining_quantity, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['symbol', 'side', 'status', 'price', 'created_at'], name='order_symbol_side_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status__in', ['OPEN', 'PARTIAL'])), fields=['symbol', 'side', 'price', 'created_at'], include=('id', 'user', 'remaining_quantity'), name='order_resting_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0007_order_book_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('side', models.CharField(choices=[('BUY', 'Buy'), ('SELL', 'Sell')], max_length=4)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('quantity', models.PositiveIntegerField()),
+                ('filled_quantity', models.PositiveIntegerField(default=0)),
+                ('remaining_quantity', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(choices=[('OPEN', 'Open'), ('PARTIAL', 'Partial'), ('FILLED', 'Filled'), ('CANCELED', 'Canceled')], max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('symbol', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='exchange.symbol')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'created_at'], name='archived_order_user_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTrade',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('buy_order_id', models.BigIntegerField()),
+                ('sell_order_id', models.BigIntegerField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('quantity', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('buyer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('symbol', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='exchange.symbol')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['buyer', 'created_at'], name='archived_trade_buyer_idx'), models.Index(fields=['seller', 'created_at'], name='archived_trade_seller_idx')],
+            },
+        ),
+    ]
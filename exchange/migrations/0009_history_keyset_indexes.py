@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0008_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='archivedorder',
+            name='archived_order_user_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='archivedtrade',
+            name='archived_trade_buyer_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='archivedtrade',
+            name='archived_trade_seller_idx',
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='archived_order_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtrade',
+            index=models.Index(fields=['buyer', 'created_at', 'id'], name='archived_trade_buyer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtrade',
+            index=models.Index(fields=['seller', 'created_at', 'id'], name='archived_trade_seller_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, OuterRef, Subquery, When
+
+
+def backfill_trades(apps, schema_editor):
+    Order = apps.get_model("exchange", "Order")
+    Trade = apps.get_model("exchange", "Trade")
+
+    def order_field(fk, field):
+        return Subquery(Order.objects.filter(pk=OuterRef(fk)).values(field)[:1])
+
+    # The order placed last is the one that matched against the book.
+    Trade.objects.update(
+        symbol_id=order_field("buy_order_id", "symbol_id"),
+        buyer_id=order_field("buy_order_id", "user_id"),
+        seller_id=order_field("sell_order_id", "user_id"),
+        aggressor_side=Case(
+            When(buy_order_id__gt=models.F("sell_order_id"), then=models.Value("BUY")),
+            default=models.Value("SELL"),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0009_history_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trade',
+            name='aggressor_side',
+            field=models.CharField(choices=[('BUY', 'Buy'), ('SELL', 'Sell')], help_text='Side of the incoming order that took liquidity.', max_length=4, null=True),
+        ),
+        migrations.AddField(
+            model_name='trade',
+            name='buyer',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='buy_trades', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='trade',
+            name='seller',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sell_trades', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='trade',
+            name='symbol',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='trades', to='exchange.symbol'),
+        ),
+        migrations.RunPython(backfill_trades, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0010_trade_denormalize'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='trade',
+            name='aggressor_side',
+            field=models.CharField(choices=[('BUY', 'Buy'), ('SELL', 'Sell')], help_text='Side of the incoming order that took liquidity.', max_length=4),
+        ),
+        migrations.AlterField(
+            model_name='trade',
+            name='buyer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buy_trades', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='trade',
+            name='seller',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sell_trades', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='trade',
+            name='symbol',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trades', to='exchange.symbol'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['buyer', 'created_at', 'id'], name='trade_buyer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['seller', 'created_at', 'id'], name='trade_seller_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['symbol', 'created_at', 'id'], name='trade_symbol_created_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:10
+
+from django.db import migrations, models
+from django.db.models import Case, When
+
+
+def backfill_aggressor_side(apps, schema_editor):
+    ArchivedTrade = apps.get_model("exchange", "ArchivedTrade")
+
+    # As for Trade in 0010: the order placed last is the one that matched.
+    ArchivedTrade.objects.update(
+        aggressor_side=Case(
+            When(buy_order_id__gt=models.F("sell_order_id"), then=models.Value("BUY")),
+            default=models.Value("SELL"),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0012_worker_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedtrade',
+            name='aggressor_side',
+            field=models.CharField(choices=[('BUY', 'Buy'), ('SELL', 'Sell')], max_length=4, null=True),
+        ),
+        migrations.RunPython(backfill_aggressor_side, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0013_archivedtrade_aggressor_side'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedtrade',
+            name='aggressor_side',
+            field=models.CharField(choices=[('BUY', 'Buy'), ('SELL', 'Sell')], max_length=4),
+        ),
+    ]
@@ -2,4 +2,7 @@ from .order import Order
 from .trade import Trade
 from .portfolio import Portfolio
 from .symbol import Symbol
-from .holding import Holding
\ No newline at end of file
+from .holding import Holding
+from .candle import Candle
+from .archive import ArchivedOrder, ArchivedTrade
+from .worker_lease import WorkerLease
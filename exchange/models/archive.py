@@ -0,0 +1,51 @@
+from django.db import models
+from django.contrib.auth.models import User
+from .order import Order
+from .symbol import Symbol
+
+
+class ArchivedOrder(models.Model):
+    """FILLED/CANCELED order moved out of Order by archive_history; keeps its id."""
+
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    symbol = models.ForeignKey(Symbol, on_delete=models.CASCADE, related_name='+')
+    side = models.CharField(max_length=4, choices=Order.Side.choices)
+    price = models.DecimalField(max_digits=12, decimal_places=2)
+    quantity = models.PositiveIntegerField()
+    filled_quantity = models.PositiveIntegerField(default=0)
+    remaining_quantity = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=Order.Status.choices)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='archived_order_user_idx'),
+        ]
+
+
+class ArchivedTrade(models.Model):
+    """
+    Trade moved out of Trade by archive_history; keeps its id. Order ids are
+    plain integers (the orders may be live or archived) and buyer, seller and
+    symbol are copied so history queries need no join.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    buy_order_id = models.BigIntegerField()
+    sell_order_id = models.BigIntegerField()
+    buyer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    symbol = models.ForeignKey(Symbol, on_delete=models.CASCADE, related_name='+')
+    aggressor_side = models.CharField(max_length=4, choices=Order.Side.choices)
+    price = models.DecimalField(max_digits=12, decimal_places=2)
+    quantity = models.PositiveIntegerField()
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['buyer', 'created_at', 'id'], name='archived_trade_buyer_idx'),
+            models.Index(fields=['seller', 'created_at', 'id'], name='archived_trade_seller_idx'),
+        ]
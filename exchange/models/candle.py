@@ -0,0 +1,33 @@
+from django.db import models
+from .symbol import Symbol
+
+
+class Candle(models.Model):
+    """OHLCV bar aggregated from this exchange's own trades."""
+
+    class Interval(models.TextChoices):
+        SECOND = '1s', '1 second'
+        MINUTE = '1m', '1 minute'
+        FIVE_MINUTES = '5m', '5 minutes'
+        HOUR = '1h', '1 hour'
+
+    symbol = models.ForeignKey(Symbol, on_delete=models.CASCADE, related_name='candles')
+    interval = models.CharField(max_length=3, choices=Interval.choices)
+    bucket_start = models.DateTimeField()
+
+    open = models.DecimalField(max_digits=12, decimal_places=2)
+    high = models.DecimalField(max_digits=12, decimal_places=2)
+    low = models.DecimalField(max_digits=12, decimal_places=2)
+    close = models.DecimalField(max_digits=12, decimal_places=2)
+    volume = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['symbol', 'interval', 'bucket_start'],
+                name='candle_symbol_interval_bucket',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.symbol.name} {self.interval} {self.bucket_start:%Y-%m-%d %H:%M:%S}"
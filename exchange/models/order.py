@@ -23,6 +23,8 @@ class Order(models.Model):
 
     quantity = models.PositiveIntegerField()
     filled_quantity = models.PositiveIntegerField(default=0)
+    # quantity - filled_quantity, stored so book queries can read it from an index
+    remaining_quantity = models.PositiveIntegerField(default=0)
 
     status = models.CharField(
         max_length=10,
@@ -33,11 +35,33 @@ class Order(models.Model):
 
     class Meta:
         indexes = [
-            models.Index(fields=['side', 'status', 'price', 'created_at']),
+            models.Index(
+                fields=['symbol', 'side', 'status', 'price', 'created_at'],
+                name='order_symbol_side_status_idx',
+            ),
+            # Resting orders only, so loading a book doesn't scan filled and
+            # canceled history; covering on PostgreSQL (index-only scan).
+            models.Index(
+                fields=['symbol', 'side', 'price', 'created_at'],
+                name='order_resting_idx',
+                include=['id', 'user', 'remaining_quantity'],
+                condition=models.Q(status__in=['OPEN', 'PARTIAL']),
+            ),
+            # Keyset pagination of a user's history (see exchange/pagination.py).
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
         ]
-    @property
-    def remaining_quantity(self):
-        return self.quantity - self.filled_quantity
+
+    def fill(self, quantity):
+        self.filled_quantity += quantity
+        self.remaining_quantity = self.quantity - self.filled_quantity
+
+    def save(self, *args, **kwargs):
+        self.remaining_quantity = self.quantity - self.filled_quantity
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'filled_quantity' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'remaining_quantity'}
+        super().save(*args, **kwargs)
+
     def clean(self):
         if self.filled_quantity > self.quantity:
             raise ValidationError("Filled quantity cannot exceed total quantity.")
@@ -9,6 +9,10 @@ class Symbol(models.Model):
         help_text="Last fetched market price (delayed, for display only).",
     )
     last_price_updated_at = models.DateTimeField(null=True, blank=True)
+    book_seq = models.BigIntegerField(
+        default=0,
+        help_text="Bumped by every transaction that changes this symbol's order book.",
+    )
 
     def __str__(self):
         return self.name
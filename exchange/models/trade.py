@@ -1,5 +1,7 @@
 from django.db import models
+from django.contrib.auth.models import User
 from .order import Order
+from .symbol import Symbol
 
 class Trade(models.Model):
 
@@ -20,4 +22,22 @@ class Trade(models.Model):
         decimal_places=2
     )
     quantity = models.PositiveIntegerField()
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # Copied from the orders at creation so history and candle queries
+    # don't have to join through buy_order/sell_order.
+    symbol = models.ForeignKey(Symbol, on_delete=models.CASCADE, related_name='trades')
+    buyer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='buy_trades')
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sell_trades')
+    aggressor_side = models.CharField(
+        max_length=4,
+        choices=Order.Side.choices,
+        help_text="Side of the incoming order that took liquidity.",
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['buyer', 'created_at', 'id'], name='trade_buyer_created_idx'),
+            models.Index(fields=['seller', 'created_at', 'id'], name='trade_seller_created_idx'),
+            models.Index(fields=['symbol', 'created_at', 'id'], name='trade_symbol_created_idx'),
+        ]
\ No newline at end of file
@@ -0,0 +1,15 @@
+from django.db import models
+
+
+class WorkerLease(models.Model):
+    """
+    Time-limited leadership of a background job (see services/leader.py).
+    Whoever holds an unexpired lease is the only process running the job.
+    """
+
+    name = models.CharField(max_length=100, unique=True)
+    owner = models.CharField(max_length=200)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} held by {self.owner} until {self.expires_at:%Y-%m-%d %H:%M:%S}"
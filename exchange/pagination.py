@@ -0,0 +1,92 @@
+"""
+Keyset pagination and NDJSON export for history endpoints.
+
+Rows are returned newest first ordered by (created_at, id). A cursor encodes
+the (created_at, id) of the last row of a page and the next page continues
+strictly after it, so each page is one index range scan however deep the
+client has paged. Several querysets (live and archived rows, or the buy and
+sell side of trades) are paged together by merging their ordered streams.
+"""
+import base64
+import heapq
+from datetime import datetime
+
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def encode_cursor(row):
+    raw = f"{row.created_at.isoformat()}|{row.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor; raises ValueError if it is malformed."""
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(pk)
+    except (TypeError, UnicodeError, ValueError) as e:
+        raise ValueError("Invalid cursor.") from e
+
+
+def page_params(query_params):
+    """
+    (paginated, limit, cursor position) from ?limit=&cursor=. Requests
+    without either keep the unpaginated list response.
+    """
+    limit = query_params.get("limit")
+    cursor = query_params.get("cursor")
+    paginated = limit is not None or cursor is not None
+    try:
+        limit = int(limit) if limit is not None else DEFAULT_LIMIT
+    except ValueError:
+        raise ValueError("limit must be an integer.")
+    if not 0 < limit <= MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}.")
+    return paginated, limit, decode_cursor(cursor) if cursor else None
+
+
+def keyset(qs, position=None):
+    """qs ordered newest first, starting after position (created_at, id)."""
+    qs = qs.order_by("-created_at", "-id")
+    if position is not None:
+        created_at, pk = position
+        qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    return qs
+
+
+def merge_newest_first(*iterables):
+    """Merge (created_at, id)-descending iterables, dropping repeated ids."""
+    last = None
+    for row in heapq.merge(*iterables, key=lambda r: (r.created_at, r.pk), reverse=True):
+        key = (type(row), row.pk)
+        if key == last:
+            continue
+        last = key
+        yield row
+
+
+def paginate(querysets, limit, position=None):
+    """(rows, next cursor or None) for one page across querysets."""
+    rows = []
+    for row in merge_newest_first(*(list(keyset(qs, position)[:limit + 1]) for qs in querysets)):
+        rows.append(row)
+        if len(rows) > limit:
+            return rows[:limit], encode_cursor(rows[limit - 1])
+    return rows, None
+
+
+def ndjson_response(querysets, to_dict, position=None, chunk_size=2000):
+    """Stream every row as one JSON object per line with flat memory use."""
+    encoder = JSONEncoder()
+
+    def lines():
+        iterators = (keyset(qs, position).iterator(chunk_size=chunk_size) for qs in querysets)
+        for row in merge_newest_first(*iterators):
+            yield encoder.encode(to_dict(row)) + "\n"
+
+    return StreamingHttpResponse(lines(), content_type="application/x-ndjson")
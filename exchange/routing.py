@@ -5,4 +5,6 @@ websocket_urlpatterns = [
     re_path(r"ws/orderbook/$", consumers.OrderBookConsumer.as_asgi()),
     re_path(r"ws/prices/$", consumers.PricesConsumer.as_asgi()),
     re_path(r"ws/prices/$", consumers.PricesConsumer.as_asgi()),
+    re_path(r"ws/candles/$", consumers.CandleConsumer.as_asgi()),
+    re_path(r"ws/market/$", consumers.MarketConsumer.as_asgi()),
 ]
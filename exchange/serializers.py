@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from decimal import Decimal
-from .models import Order, Portfolio, Holding, Trade
+from .models import Order, Portfolio, Holding, Trade, ArchivedOrder
 
 
 class OrderCreateSerializer(serializers.Serializer):
@@ -40,6 +40,11 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class ArchivedOrderSerializer(OrderSerializer):
+    class Meta(OrderSerializer.Meta):
+        model = ArchivedOrder
+
+
 class PortfolioSerializer(serializers.ModelSerializer):
     class Meta:
         model = Portfolio
@@ -0,0 +1,245 @@
+"""
+Vectorized analytics over a symbol's trade prints.
+
+Trades are loaded into NumPy arrays (unix seconds, prices, quantities) and
+every computation below works on whole arrays: resampling uses ufunc.reduceat
+over bucket boundaries and rolling windows use cumulative sums.
+
+The last ANALYTICS_CACHE_SECONDS of prints per symbol stay resident and are
+topped up with the trades inserted since the previous request (trade ids of
+a symbol grow with time because settlement runs under the symbol lock), so a
+request only reads new rows from the DB.
+"""
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from exchange.models import Trade
+
+INDICATORS = ("sma", "ema", "vwap", "volatility")
+
+
+def _query_trades(qs):
+    rows = list(
+        qs.order_by("id").values_list("id", "created_at", Cast("price", FloatField()), "quantity")
+    )
+    n = len(rows)
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=n)
+    ts = np.fromiter((row[1].timestamp() for row in rows), dtype=np.float64, count=n)
+    prices = np.fromiter((row[2] for row in rows), dtype=np.float64, count=n)
+    quantities = np.fromiter((row[3] for row in rows), dtype=np.int64, count=n)
+    return ids, ts, prices, quantities
+
+
+class TradeSeries:
+    """Resident trade prints of one symbol covering the last max_age seconds."""
+
+    def __init__(self, symbol_id, max_age):
+        self.symbol_id = symbol_id
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.since = None  # unix seconds the arrays are complete from
+        self.last_id = 0
+        self.ts = np.empty(0)
+        self.prices = np.empty(0)
+        self.quantities = np.empty(0, dtype=np.int64)
+
+    def refresh(self):
+        now = time.time()
+        qs = Trade.objects.filter(symbol_id=self.symbol_id)
+        if self.since is None:
+            self.since = now - self.max_age
+            qs = qs.filter(created_at__gte=datetime.fromtimestamp(self.since, tz=dt_timezone.utc))
+        else:
+            qs = qs.filter(id__gt=self.last_id)
+        ids, ts, prices, quantities = _query_trades(qs)
+        if len(ids):
+            self.last_id = int(ids[-1])
+            self.ts = np.concatenate((self.ts, ts))
+            self.prices = np.concatenate((self.prices, prices))
+            self.quantities = np.concatenate((self.quantities, quantities))
+        cutoff = np.searchsorted(self.ts, now - self.max_age)
+        if cutoff:
+            self.ts, self.prices, self.quantities = (
+                self.ts[cutoff:], self.prices[cutoff:], self.quantities[cutoff:]
+            )
+        self.since = max(self.since, now - self.max_age)
+
+    def window(self, start=None, end=None):
+        """Arrays for [start, end), or None when start is older than what is kept."""
+        with self.lock:
+            self.refresh()
+            lo_ts = start.timestamp() if start is not None else self.since
+            if lo_ts < self.since:
+                return None
+            lo = np.searchsorted(self.ts, lo_ts)
+            hi = len(self.ts) if end is None else np.searchsorted(self.ts, end.timestamp())
+            return self.ts[lo:hi], self.prices[lo:hi], self.quantities[lo:hi]
+
+
+_series = {}
+_series_lock = threading.Lock()
+
+
+def get_trade_series(symbol_id):
+    series = _series.get(symbol_id)
+    if series is None:
+        with _series_lock:
+            series = _series.setdefault(symbol_id, TradeSeries(
+                symbol_id, getattr(settings, "ANALYTICS_CACHE_SECONDS", 86400)
+            ))
+    return series
+
+
+def load_trades(symbol, start=None, end=None):
+    """(timestamps, prices, quantities) arrays for symbol's trades, oldest first."""
+    arrays = get_trade_series(symbol.pk).window(start, end)
+    if arrays is not None:
+        return arrays
+    qs = Trade.objects.filter(symbol=symbol)
+    if start is not None:
+        qs = qs.filter(created_at__gte=start)
+    if end is not None:
+        qs = qs.filter(created_at__lt=end)
+    return _query_trades(qs)[1:]
+
+
+def resample_ohlcv(ts, prices, quantities, seconds):
+    """
+    Bucket sorted trade prints into bars of `seconds`. Only buckets that
+    contain trades are returned. Returns a dict of equal-length arrays:
+    time (bucket start, unix seconds), open, high, low, close, volume and
+    notional (sum of price * quantity).
+    """
+    if not len(ts):
+        empty = np.empty(0)
+        return {k: empty for k in ("time", "open", "high", "low", "close", "volume", "notional")}
+    buckets = (ts // seconds).astype(np.int64)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+    ends = np.concatenate((starts[1:], [len(ts)])) - 1
+    return {
+        "time": buckets[starts] * seconds,
+        "open": prices[starts],
+        "high": np.maximum.reduceat(prices, starts),
+        "low": np.minimum.reduceat(prices, starts),
+        "close": prices[ends],
+        "volume": np.add.reduceat(quantities, starts),
+        "notional": np.add.reduceat(prices * quantities, starts),
+    }
+
+
+def _rolling_sum(values, window):
+    """Sum of the last `window` values at each position; NaN until the window fills."""
+    out = np.full(len(values), np.nan)
+    if window <= len(values):
+        csum = np.cumsum(np.concatenate(([0.0], values)))
+        out[window - 1:] = csum[window:] - csum[:-window]
+    return out
+
+
+def sma(values, window):
+    return _rolling_sum(values, window) / window
+
+
+def ema(values, window):
+    """Exponential moving average with alpha = 2 / (window + 1), seeded with the first value."""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.empty(len(values))
+    if not len(values):
+        return out
+    alpha = 2.0 / (window + 1)
+    keep = 1.0 - alpha
+    # ema[lo+k] = keep**(k+1) * prev + alpha * keep**k * sum_j keep**-j * v[lo+j];
+    # evaluated in chunks short enough for keep**-k to stay finite.
+    chunk = max(1, int(600 / -np.log(keep))) if keep > 0 else 1
+    prev = values[0]
+    for lo in range(0, len(values), chunk):
+        seg = values[lo:lo + chunk]
+        k = np.arange(len(seg), dtype=np.float64)
+        power = keep ** k
+        out[lo:lo + len(seg)] = keep * power * prev + alpha * power * np.cumsum(seg / np.where(power > 0, power, 1.0))
+        prev = out[lo + len(seg) - 1]
+    return out
+
+
+def rolling_vwap(notional, volume, window):
+    return _rolling_sum(notional, window) / _rolling_sum(volume.astype(np.float64), window)
+
+
+def rolling_volatility(close, window):
+    """Standard deviation of log returns over the last `window` returns."""
+    out = np.full(len(close), np.nan)
+    if len(close) > 1:
+        returns = np.diff(np.log(close))
+        mean = _rolling_sum(returns, window) / window
+        mean_sq = _rolling_sum(returns * returns, window) / window
+        out[1:] = np.sqrt(np.maximum(mean_sq - mean * mean, 0.0))
+    return out
+
+
+def compute_indicators(bars, names, window):
+    """{name: array} for the requested indicator names over resampled bars."""
+    out = {}
+    for name in names:
+        if name == "sma":
+            out[name] = sma(bars["close"], window)
+        elif name == "ema":
+            out[name] = ema(bars["close"], window)
+        elif name == "vwap":
+            out[name] = rolling_vwap(bars["notional"], bars["volume"], window)
+        elif name == "volatility":
+            out[name] = rolling_volatility(bars["close"], window)
+    return out
+
+
+def _nullable(values):
+    return [None if v != v else v for v in values.tolist()]
+
+
+def candles_with_indicators(symbol, interval, names, window=20, start=None, end=None, limit=50):
+    """
+    Bars of `interval` (see candles.INTERVALS) resampled from trades in [start, end) plus the named
+    indicators, oldest first, in the /api/candles/ format. Trades from up to
+    `window` intervals before start are loaded to warm the indicators up;
+    without start the last limit + window intervals are used. Indicator values
+    are None until enough bars exist.
+    """
+    from datetime import timedelta
+    from django.utils import timezone
+    from exchange.services.candles import INTERVALS
+
+    seconds = INTERVALS[interval]
+    if start is None:
+        load_from = (end or timezone.now()) - timedelta(seconds=seconds * (limit + window))
+    else:
+        load_from = start - timedelta(seconds=seconds * window)
+    bars = resample_ohlcv(*load_trades(symbol, load_from, end), seconds)
+    indicators = compute_indicators(bars, names, window)
+
+    keep = slice(None)
+    if start is not None:
+        keep = bars["time"] >= start.timestamp()
+    times = bars["time"][keep][-limit:]
+    if not len(times):
+        return []
+    labels = np.char.replace(
+        np.datetime_as_string(times.astype("datetime64[s]")), "T", " "
+    ).tolist()
+    columns = {
+        "open": bars["open"][keep][-limit:].tolist(),
+        "high": bars["high"][keep][-limit:].tolist(),
+        "low": bars["low"][keep][-limit:].tolist(),
+        "close": bars["close"][keep][-limit:].tolist(),
+        "volume": bars["volume"][keep][-limit:].tolist(),
+    }
+    for name, values in indicators.items():
+        columns[name] = _nullable(values[keep][-limit:])
+    return [
+        dict({"symbol": symbol.name, "interval": interval, "time": label}, **{k: v[i] for k, v in columns.items()})
+        for i, label in enumerate(labels)
+    ]
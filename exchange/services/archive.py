@@ -0,0 +1,111 @@
+"""
+Moves history out of the hot Order/Trade tables.
+
+Trades older than the cutoff go to ArchivedTrade, then FILLED/CANCELED orders
+older than the cutoff that no live trade references any more go to
+ArchivedOrder. Terminal orders and trades never change again, so each batch
+is copied and deleted in its own short transaction without locking rows the
+matching path uses. Run it from `manage.py archive_history`.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from exchange.models import ArchivedOrder, ArchivedTrade, Order, Trade
+
+
+def archive_cutoff(days=None):
+    if days is None:
+        days = getattr(settings, "ARCHIVE_AFTER_DAYS", 7)
+    return timezone.now() - timedelta(days=days)
+
+
+@transaction.atomic
+def _archive_trade_batch(ids):
+    rows = Trade.objects.filter(id__in=ids).values_list(
+        "id", "buy_order_id", "sell_order_id", "buyer_id", "seller_id",
+        "symbol_id", "aggressor_side", "price", "quantity", "created_at",
+    )
+    ArchivedTrade.objects.bulk_create(
+        [
+            ArchivedTrade(
+                id=trade_id, buy_order_id=buy_id, sell_order_id=sell_id,
+                buyer_id=buyer_id, seller_id=seller_id, symbol_id=symbol_id,
+                aggressor_side=aggressor_side, price=price, quantity=quantity,
+                created_at=created_at,
+            )
+            for (
+                trade_id, buy_id, sell_id, buyer_id, seller_id, symbol_id,
+                aggressor_side, price, quantity, created_at,
+            ) in rows
+        ],
+        ignore_conflicts=True,
+    )
+    Trade.objects.filter(id__in=ids).delete()
+
+
+@transaction.atomic
+def _archive_order_batch(ids):
+    orders = Order.objects.filter(id__in=ids)
+    ArchivedOrder.objects.bulk_create(
+        [
+            ArchivedOrder(
+                id=order.id, user_id=order.user_id, symbol_id=order.symbol_id,
+                side=order.side, price=order.price, quantity=order.quantity,
+                filled_quantity=order.filled_quantity,
+                remaining_quantity=order.remaining_quantity,
+                status=order.status, created_at=order.created_at,
+            )
+            for order in orders
+        ],
+        ignore_conflicts=True,
+    )
+    orders.delete()
+
+
+def archive_trades(cutoff, batch_size=5000, dry_run=False):
+    """Archive trades created before cutoff; returns how many."""
+    qs = Trade.objects.filter(created_at__lt=cutoff).order_by("id")
+    if dry_run:
+        return qs.count()
+    total = 0
+    while True:
+        ids = list(qs.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return total
+        _archive_trade_batch(ids)
+        total += len(ids)
+
+
+def archive_orders(cutoff, batch_size=5000, dry_run=False):
+    """
+    Archive FILLED/CANCELED orders created before cutoff that no live trade
+    references; returns how many.
+    """
+    qs = (
+        Order.objects.filter(status__in=["FILLED", "CANCELED"], created_at__lt=cutoff)
+        .exclude(Exists(Trade.objects.filter(buy_order=OuterRef("pk"))))
+        .exclude(Exists(Trade.objects.filter(sell_order=OuterRef("pk"))))
+        .order_by("id")
+    )
+    if dry_run:
+        return qs.count()
+    total = 0
+    while True:
+        ids = list(qs.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return total
+        _archive_order_batch(ids)
+        total += len(ids)
+
+
+def archive_history(cutoff=None, batch_size=5000, dry_run=False):
+    """Archive trades, then the orders they no longer pin. Returns (trades, orders)."""
+    if cutoff is None:
+        cutoff = archive_cutoff()
+    trades = archive_trades(cutoff, batch_size, dry_run)
+    orders = archive_orders(cutoff, batch_size, dry_run)
+    return trades, orders
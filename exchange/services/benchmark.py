@@ -0,0 +1,326 @@
+"""
+Synthetic order flow for `manage.py bench_exchange`.
+
+generate_flow builds a reproducible stream of placements, cancels and book
+reads: Poisson arrivals, prices normally distributed around each symbol's
+last price, a configurable buy/sell mix and many users. run_flow replays it
+through a driver, either the services directly (place_order, cancel_order,
+get_order_book) or the DRF views, and records per-operation latency measured
+from each operation's scheduled arrival, so time spent queued behind a slow
+operation counts (no coordinated omission).
+
+The market lives in BENCH* symbols and bench_* users created by setup_market
+and removed by teardown_market, so a run can target any configured database.
+"""
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+from exchange.models import Holding, Order, Portfolio, Symbol, Trade
+from exchange.services.price_providers import PriceProvider
+
+SYMBOL_PREFIX = "BENCH"
+USER_PREFIX = "bench_"
+KINDS = ("place", "cancel", "book")
+
+
+class Op:
+    __slots__ = ("at", "kind", "user", "symbol", "side", "price", "quantity", "ref")
+
+    def __init__(self, at, kind, user, symbol, side=None, price=None, quantity=None, ref=None):
+        self.at = at  # seconds after the start of the run
+        self.kind = kind
+        self.user = user  # index into the user list
+        self.symbol = symbol
+        self.side = side
+        self.price = price
+        self.quantity = quantity
+        self.ref = ref  # index of the placement a cancel targets
+
+
+def generate_flow(symbols, n_users, n_orders, rate=0.0, spread=0.01, buy_ratio=0.5,
+                  cancel_ratio=0.1, book_ratio=0.0, max_quantity=10, seed=0):
+    """
+    Ops in arrival order: n_orders placements, plus on average cancel_ratio
+    cancels and book_ratio book reads per placement. symbols is a list of
+    (name, last_price). rate is the mean arrival rate per second; 0 sends
+    everything back to back. Prices are last_price * (1 + N(0, spread)),
+    kept inside the +-10% price band.
+    """
+    rng = random.Random(seed)
+    total = 1.0 + cancel_ratio + book_ratio
+    ops = []
+    placements = []
+    at = 0.0
+    while len(placements) < n_orders:
+        if rate > 0:
+            at += rng.expovariate(rate)
+        pick = rng.random() * total
+        if pick < cancel_ratio and placements:
+            ref = rng.choice(placements)
+            ops.append(Op(at, "cancel", ops[ref].user, ops[ref].symbol, ref=ref))
+        elif 1.0 + cancel_ratio <= pick:
+            ops.append(Op(at, "book", rng.randrange(n_users), rng.choice(symbols)[0]))
+        else:
+            name, last_price = rng.choice(symbols)
+            move = min(max(rng.gauss(0.0, spread), -0.09), 0.09)
+            price = (Decimal(last_price) * Decimal(str(1.0 + move))).quantize(Decimal("0.01"))
+            side = "BUY" if rng.random() < buy_ratio else "SELL"
+            placements.append(len(ops))
+            ops.append(Op(at, "place", rng.randrange(n_users), name, side, price,
+                          rng.randint(1, max_quantity)))
+    return ops
+
+
+class _NoQuotes(PriceProvider):
+    """Keeps the reference-price refresher off the network during a run."""
+
+    async def get_quotes(self, symbols):
+        return {}
+
+
+def teardown_market():
+    """Delete every BENCH* symbol and bench_* user with their orders and trades."""
+    symbols = Symbol.objects.filter(name__startswith=SYMBOL_PREFIX)
+    Trade.objects.filter(symbol__in=symbols).delete()
+    Order.objects.filter(symbol__in=symbols).delete()
+    User.objects.filter(username__startswith=USER_PREFIX).delete()
+    symbols.delete()
+
+
+def setup_market(n_symbols, n_users, price=Decimal("100.00"), cash=Decimal("1000000000"),
+                 shares=10 ** 9):
+    """Fresh BENCH* symbols and funded bench_* users; returns (symbols, users)."""
+    teardown_market()
+    now = timezone.now()
+    Symbol.objects.bulk_create([
+        Symbol(name=f"{SYMBOL_PREFIX}{i}", last_price=price, last_price_updated_at=now)
+        for i in range(n_symbols)
+    ])
+    # bulk_create skips the post_save signal, so portfolios are created here.
+    User.objects.bulk_create([User(username=f"{USER_PREFIX}{i}") for i in range(n_users)])
+    symbols = list(Symbol.objects.filter(name__startswith=SYMBOL_PREFIX).order_by("id"))
+    users = list(User.objects.filter(username__startswith=USER_PREFIX).order_by("id"))
+    Portfolio.objects.bulk_create(
+        [Portfolio(user=user, available_balance=cash) for user in users], batch_size=1000
+    )
+    Holding.objects.bulk_create(
+        [Holding(user=user, symbol=symbol, available_quantity=shares)
+         for user in users for symbol in symbols],
+        batch_size=1000,
+    )
+    return symbols, users
+
+
+class QueryCounter:
+    """Counts queries on every thread's connection while installed."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def _attach(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        connection_created.connect(self._attach, weak=False)
+        for connection in connections.all():
+            self._attach(connection=connection)
+        return self
+
+    def __exit__(self, *exc):
+        connection_created.disconnect(self._attach)
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+
+class ServiceDriver:
+    """Calls the services on the caller's thread, bypassing the sequencer."""
+
+    def place(self, user, op):
+        from exchange.services.exchange_service import place_order
+
+        return place_order(user, op.symbol, op.side, op.price, op.quantity).id
+
+    def cancel(self, user, order_id):
+        from exchange.services.exchange_service import cancel_order
+
+        cancel_order(user, order_id)
+
+    def book(self, symbol):
+        from exchange.services.orderbook import get_order_book
+
+        get_order_book(symbol)
+
+
+class ApiDriver:
+    """Goes through the DRF views (and so the per-symbol sequencer)."""
+
+    def __init__(self):
+        from rest_framework.test import APIRequestFactory
+        from exchange.views import CancelOrderView, OrderBookView, OrderListCreateView
+
+        self.factory = APIRequestFactory()
+        self.orders_view = OrderListCreateView.as_view()
+        self.cancel_view = CancelOrderView.as_view()
+        self.book_view = OrderBookView.as_view()
+
+    def _call(self, view, request, user, **kwargs):
+        from rest_framework.test import force_authenticate
+
+        force_authenticate(request, user=user)
+        response = view(request, **kwargs)
+        if response.status_code >= 500:
+            raise RuntimeError(f"HTTP {response.status_code}")
+        if response.status_code >= 400:
+            raise ValueError(response.data.get("detail", response.status_code))
+        return response
+
+    def place(self, user, op):
+        request = self.factory.post("/api/orders/", {
+            "symbol": op.symbol, "side": op.side,
+            "price": str(op.price), "quantity": op.quantity,
+        }, format="json")
+        return self._call(self.orders_view, request, user).data["id"]
+
+    def cancel(self, user, order_id):
+        request = self.factory.post(f"/api/orders/{order_id}/cancel/")
+        self._call(self.cancel_view, request, user, order_id=order_id)
+
+    def book(self, symbol):
+        request = self.factory.get("/api/orderbook/", {"symbol": symbol.name})
+        self._call(self.book_view, request, None)
+
+
+class Results:
+    def __init__(self):
+        self.latencies = {kind: [] for kind in KINDS}
+        self.rejected = dict.fromkeys(KINDS, 0)
+        self.errors = dict.fromkeys(KINDS, 0)
+        self.elapsed = 0.0
+        self.trades = 0
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def record(self, kind, latency, outcome=None):
+        with self._lock:
+            self.latencies[kind].append(latency)
+            if outcome is not None:
+                outcome[kind] += 1
+
+    @staticmethod
+    def percentile(values, q):
+        if not values:
+            return None
+        values = sorted(values)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def summary(self):
+        placed = len(self.latencies["place"]) - self.rejected["place"] - self.errors["place"]
+        orders = len(self.latencies["place"]) + len(self.latencies["cancel"])
+        elapsed = self.elapsed or float("nan")
+        return {
+            "elapsed_s": round(self.elapsed, 3),
+            "orders_per_s": round(placed / elapsed, 1),
+            "trades_per_s": round(self.trades / elapsed, 1),
+            "trades": self.trades,
+            "queries_per_order": round(self.queries / orders, 2) if orders else None,
+            "ops": {
+                kind: {
+                    "count": len(values),
+                    "rejected": self.rejected[kind],
+                    "errors": self.errors[kind],
+                    "p50_ms": _ms(self.percentile(values, 0.50)),
+                    "p99_ms": _ms(self.percentile(values, 0.99)),
+                    "max_ms": _ms(max(values) if values else None),
+                }
+                for kind, values in self.latencies.items()
+            },
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def _replay(lane, driver, users, symbols, results, start, open_loop):
+    order_ids = {}  # op index -> order id; a cancel's placement is in the same lane
+    try:
+        for index, op in lane:
+            scheduled = start + op.at
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif not open_loop:
+                scheduled = time.perf_counter()
+            user = users[op.user]
+            outcome = None
+            try:
+                if op.kind == "place":
+                    order_ids[index] = driver.place(user, op)
+                elif op.kind == "cancel":
+                    if op.ref not in order_ids:
+                        raise ValueError("The order was rejected.")
+                    driver.cancel(user, order_ids[op.ref])
+                else:
+                    driver.book(symbols[op.symbol])
+            except ValueError:
+                outcome = results.rejected
+            except Exception:
+                outcome = results.errors
+            results.record(op.kind, time.perf_counter() - scheduled, outcome)
+    finally:
+        connection.close()
+
+
+def run_flow(ops, driver, users, symbols, threads=1):
+    """
+    Replay ops with `threads` client threads. Ops are split by user, so each
+    user's operations stay in order. symbols maps name -> Symbol. Flow
+    generated with rate=0 runs closed loop: latency is then measured from
+    when each op starts instead of from its arrival.
+    """
+    from exchange.services.price_providers import set_price_provider
+
+    results = Results()
+    open_loop = any(op.at for op in ops)
+    lanes = [[] for _ in range(threads)]
+    for index, op in enumerate(ops):
+        lanes[op.user % threads].append((index, op))
+
+    symbol_ids = [symbol.pk for symbol in symbols.values()]
+    trades_before = Trade.objects.filter(symbol_id__in=symbol_ids).count()
+    set_price_provider(_NoQuotes())
+    try:
+        with QueryCounter() as counter:
+            start = time.perf_counter()
+            workers = [
+                threading.Thread(
+                    target=_replay, name=f"bench-client-{i}",
+                    args=(lane, driver, users, symbols, results, start, open_loop),
+                )
+                for i, lane in enumerate(lanes) if lane
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            results.elapsed = time.perf_counter() - start
+        results.queries = counter.count
+    finally:
+        set_price_provider(None)
+    results.trades = Trade.objects.filter(symbol_id__in=symbol_ids).count() - trades_before
+    return results
@@ -0,0 +1,96 @@
+"""
+OHLCV candles aggregated from this exchange's own trades.
+
+settle_trades rolls every batch of fills into 1s/1m/5m/1h bars in the same
+transaction (the symbol row is already locked by book_transaction, so bars
+of one symbol are never written concurrently) and publishes the updated bars
+to ws/candles/ after commit.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from exchange.models import Candle
+
+INTERVALS = {"1s": 1, "1m": 60, "5m": 300, "1h": 3600}
+
+# Interval names used by the external price providers.
+INTERVAL_ALIASES = {"1sec": "1s", "1min": "1m", "5min": "5m", "60min": "1h"}
+
+
+def parse_interval(interval):
+    """Normalise an interval name; raises ValueError for unsupported ones."""
+    interval = INTERVAL_ALIASES.get(interval, interval)
+    if interval not in INTERVALS:
+        raise ValueError(f"interval must be one of {', '.join(INTERVALS)}.")
+    return interval
+
+
+def bucket_start(at, seconds):
+    ts = int(at.timestamp()) // seconds * seconds
+    return datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+
+
+def candle_payload(candle):
+    return {
+        "symbol": candle.symbol.name,
+        "interval": candle.interval,
+        "time": candle.bucket_start.strftime("%Y-%m-%d %H:%M:%S"),
+        "open": float(candle.open),
+        "high": float(candle.high),
+        "low": float(candle.low),
+        "close": float(candle.close),
+        "volume": candle.volume,
+    }
+
+
+def record_trades(symbol, trades):
+    """
+    Merge saved trades (created_at set, oldest first) into the symbol's bars.
+    Returns the touched Candle rows.
+    """
+    bars = {}
+    for trade in trades:
+        for interval, seconds in INTERVALS.items():
+            key = (interval, bucket_start(trade.created_at, seconds))
+            bar = bars.get(key)
+            if bar is None:
+                bars[key] = Candle(
+                    symbol=symbol, interval=interval, bucket_start=key[1],
+                    open=trade.price, high=trade.price, low=trade.price,
+                    close=trade.price, volume=trade.quantity,
+                )
+            else:
+                bar.high = max(bar.high, trade.price)
+                bar.low = min(bar.low, trade.price)
+                bar.close = trade.price
+                bar.volume += trade.quantity
+    if not bars:
+        return []
+
+    existing = [
+        row for row in Candle.objects.filter(
+            symbol=symbol, bucket_start__in={start for _, start in bars}
+        )
+        if (row.interval, row.bucket_start) in bars
+    ]
+    for row in existing:
+        row.symbol = symbol
+        bar = bars.pop((row.interval, row.bucket_start))
+        row.high = max(row.high, bar.high)
+        row.low = min(row.low, bar.low)
+        row.close = bar.close
+        row.volume += bar.volume
+
+    Candle.objects.bulk_update(existing, ["high", "low", "close", "volume"])
+    created = Candle.objects.bulk_create(list(bars.values()))
+    return existing + created
+
+
+def get_candles(symbol, interval="1m", start=None, end=None, limit=50):
+    """The last limit bars with start <= bucket_start < end, oldest first."""
+    qs = Candle.objects.filter(symbol=symbol, interval=interval)
+    if start is not None:
+        qs = qs.filter(bucket_start__gte=start)
+    if end is not None:
+        qs = qs.filter(bucket_start__lt=end)
+    rows = list(qs.select_related("symbol").order_by("-bucket_start")[:limit])
+    return [candle_payload(row) for row in reversed(rows)]
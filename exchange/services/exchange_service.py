@@ -1,35 +1,66 @@
+from contextlib import contextmanager
 from decimal import Decimal
 from django.db import transaction
 from exchange.models import Order, Portfolio, Trade, Symbol, Holding
-from exchange.services.matching_engine import match_order
-from exchange.services.price_fetch import fetch_symbol_price
-from django.utils import timezone
+from exchange.services.limit_book import get_book
+from exchange.services.matching_engine import counterparty_user_ids, match_order
+from exchange.services.metrics import stage, trace
+from exchange.services.reference_prices import reference_price
 import logging
-from exchange.services.settlement import settle_trade
+from exchange.services.settlement import settle_trades
+from exchange.channel_events import schedule_orderbook_broadcast, schedule_orderbook_delta
 
+logger = logging.getLogger(__name__)
 
-@transaction.atomic
-def place_order(user, symbol_name, side, price, quantity):
-
-    portfolio = Portfolio.objects.select_for_update().get(user=user)
 
+def place_order(user, symbol_name, side, price, quantity):
+    with trace("place_order", symbol=symbol_name, side=side) as fields:
+        with stage("validate"):
+            symbol, price, quantity = _checked_order(user, symbol_name, price, quantity)
+
+        book = get_book(symbol)
+        with book_transaction(book, symbol.name):
+            order = _place_order(user, symbol, side, price, quantity, book)
+        fields["order_id"] = order.id
+        return order
+
+
+def replace_order(user, order_id, symbol_name, side, price, quantity):
+    """
+    Cancel order_id if it is still resting and place the new order in the
+    same book transaction, so a quote is never doubled or briefly missing.
+    order_id may be None. Returns the new order.
+    """
+    with trace("replace_order", symbol=symbol_name, side=side) as fields:
+        with stage("validate"):
+            symbol, price, quantity = _checked_order(user, symbol_name, price, quantity)
+
+        book = get_book(symbol)
+        with book_transaction(book, symbol.name):
+            resting = book.get(order_id) if order_id is not None else None
+            with stage("portfolio_lock"):
+                # Lock before the cancel touches any portfolio. Walking past
+                # the resting order's quantity too covers the makers the new
+                # order reaches once it is gone.
+                extra = resting.remaining if resting is not None else 0
+                user_ids = counterparty_user_ids(book, side, price, quantity + extra)
+                if resting is not None:
+                    user_ids.add(resting.user_id)
+                portfolio = _lock_portfolios(user, user_ids)
+            if resting is not None:
+                with stage("cancel"):
+                    _cancel_order(user, order_id)
+                    book.cancel(order_id)
+            order = _place_order(user, symbol, side, price, quantity, book, portfolio)
+        fields["order_id"] = order.id
+        return order
+
+
+def _checked_order(user, symbol_name, price, quantity):
     symbol = Symbol.get_by_name(symbol_name)
     if symbol is None:
         raise ValueError(f"Symbol not found: {symbol_name!r}")
 
-    # Ensure we have a reasonably fresh market price for validation
-    # If symbol price is missing or older than 60 seconds, attempt a targeted fetch.
-    fetched = False
-    if not symbol.last_price or not symbol.last_price_updated_at or (timezone.now() - symbol.last_price_updated_at).total_seconds() > 60:
-        try:
-            fetched_val = fetch_symbol_price(symbol.name)
-            if fetched_val is not None:
-                fetched = True
-                # refresh symbol instance
-                symbol = Symbol.objects.get(pk=symbol.pk)
-        except Exception:
-            pass
-
     price = Decimal(str(price))
     quantity = int(quantity)
 
@@ -38,119 +69,204 @@ def place_order(user, symbol_name, side, price, quantity):
     if price <= 0:
         raise ValueError("Price must be positive.")
 
-    # ===== PRICE BAND VALIDATION (±10%) =====
-    if symbol.last_price is not None:
-        market_price = Decimal(symbol.last_price)
+    validate_price_band(user, symbol, price)
+    return symbol, price, quantity
+
+
+def validate_price_band(user, symbol, price):
+    """
+    Reject prices more than 10% away from the reference price. Reads the
+    in-memory reference price, so no lock is held and no fetch is awaited.
+    """
+    ref = reference_price(symbol)
+    if ref.price is None:
+        return
 
-        lower_limit = market_price * Decimal("0.90")
-        upper_limit = market_price * Decimal("1.10")
+    market_price = Decimal(ref.price)
 
-        # Log the market price and whether we fetched it just now
-        logger = logging.getLogger(__name__)
+    lower_limit = market_price * Decimal("0.90")
+    upper_limit = market_price * Decimal("1.10")
+
+    logger.info(
+        "Price validation for user=%s symbol=%s price=%s market_price=%s last_update=%s",
+        getattr(user, 'username', str(user)),
+        symbol.name,
+        price,
+        market_price,
+        ref.updated_at,
+    )
+
+    if price < lower_limit or price > upper_limit:
+        raise ValueError(
+            f"Order price ${price:.2f} is outside valid range. "
+            f"Market price: ${market_price:.2f}. "
+            f"Valid range: ${lower_limit:.2f} - ${upper_limit:.2f}"
+        )
+
+
+@contextmanager
+def book_transaction(book, symbol_name):
+    """
+    Run a book-changing transaction for one symbol.
+
+    Locks the Symbol row (serializing writers across processes), brings the
+    resident book up to Symbol.book_seq, and if the body changed the book bumps
+    book_seq and publishes the L2 delta after commit. On rollback a touched
+    book is dropped and clients are sent a fresh snapshot.
+    """
+    with stage("book_lock"):
+        book.lock.acquire()
+    try:
+        version = None
         try:
-            logger.info(
-                "Price validation for user=%s symbol=%s price=%s market_price=%s fetched=%s last_update=%s",
-                getattr(user, 'username', str(user)),
-                symbol.name,
-                str(price),
-                str(market_price),
-                str(fetched),
-                getattr(symbol, 'last_price_updated_at', None),
-            )
+            with transaction.atomic():
+                with stage("book_sync"):
+                    seq = Symbol.objects.select_for_update().values_list(
+                        "book_seq", flat=True
+                    ).get(pk=book.symbol_id)
+                    book.sync(seq)
+                version = book.version
+                yield book
+                if book.version != version:
+                    with stage("publish"):
+                        Symbol.objects.filter(pk=book.symbol_id).update(book_seq=seq + 1)
+                        schedule_orderbook_delta(symbol_name, book.commit(seq + 1))
         except Exception:
-            pass
-
-        if price < lower_limit or price > upper_limit:
-            raise ValueError(
-                f"Order price ${price:.2f} is outside valid range. "
-                f"Market price: ${market_price:.2f}. "
-                f"Valid range: ${lower_limit:.2f} - ${upper_limit:.2f}"
-            )
-    # =========================================
+            if version is not None and book.version != version:
+                book.invalidate()
+                schedule_orderbook_broadcast(symbol_name)
+            raise
+    finally:
+        book.lock.release()
+
+
+def _lock_portfolios(user, user_ids):
+    """
+    Lock the portfolios of user and user_ids in user_id order, the order
+    settle_trades uses, so orders with taker and maker roles swapped can't
+    deadlock. Returns user's portfolio.
+    """
+    portfolios = {
+        p.user_id: p
+        for p in Portfolio.objects.select_for_update()
+        .filter(user_id__in={user.id} | set(user_ids))
+        .order_by("user_id")
+    }
+    if user.id not in portfolios:
+        raise Portfolio.DoesNotExist("Portfolio matching query does not exist.")
+    return portfolios[user.id]
+
+
+def _place_order(user, symbol, side, price, quantity, book, portfolio=None):
+    """portfolio: user's, when the caller already locked every affected portfolio."""
+    if portfolio is None:
+        with stage("portfolio_lock"):
+            # The resident book is current under the symbol lock, so the
+            # makers this order will settle against are exact.
+            portfolio = _lock_portfolios(user, counterparty_user_ids(book, side, price, quantity))
 
     # ===== RESERVATION =====
-    if side == "BUY":
-        total_cost = price * quantity
+    with stage("reserve"):
+        if side == "BUY":
+            total_cost = price * quantity
 
-        if portfolio.available_balance < total_cost:
-            raise ValueError("Insufficient balance.")
+            if portfolio.available_balance < total_cost:
+                raise ValueError("Insufficient balance.")
 
-        portfolio.available_balance -= total_cost
-        portfolio.reserved_balance += total_cost
-        portfolio.save()
+            portfolio.available_balance -= total_cost
+            portfolio.reserved_balance += total_cost
+            portfolio.save()
 
-    elif side == "SELL":
-        holding, _ = Holding.objects.select_for_update().get_or_create(
-            user=user,
-            symbol=symbol
-        )
+        elif side == "SELL":
+            holding, _ = Holding.objects.select_for_update().get_or_create(
+                user=user,
+                symbol=symbol
+            )
 
-        if holding.available_quantity < quantity:
-            raise ValueError("Insufficient shares.")
+            if holding.available_quantity < quantity:
+                raise ValueError("Insufficient shares.")
 
-        holding.available_quantity -= quantity
-        holding.reserved_quantity += quantity
-        holding.save()
+            holding.available_quantity -= quantity
+            holding.reserved_quantity += quantity
+            holding.save()
 
-    else:
-        raise ValueError("Invalid order side.")
+        else:
+            raise ValueError("Invalid order side.")
 
     # ===== CREATE ORDER =====
-    new_order = Order.objects.create(
-        user=user,
-        symbol=symbol,
-        side=side,
-        price=price,
-        quantity=quantity
-    )
-
-    # ===== FILTER BY SYMBOL =====
-    buy_orders = Order.objects.filter(
-        symbol=symbol,
-        side="BUY",
-        status__in=["OPEN", "PARTIAL"]
-    ).order_by("-price", "created_at")
-
-    sell_orders = Order.objects.filter(
-        symbol=symbol,
-        side="SELL",
-        status__in=["OPEN", "PARTIAL"]
-    ).order_by("price", "created_at")
-
-    trades_data = match_order(new_order, buy_orders, sell_orders)
-
-    affected_orders = {new_order}
-
-    for trade_data in trades_data:
-        trade = Trade.objects.create(
-            buy_order=trade_data["buy_order"],
-            sell_order=trade_data["sell_order"],
-            price=trade_data["price"],
-            quantity=trade_data["quantity"]
+    with stage("order_insert"):
+        new_order = Order.objects.create(
+            user=user,
+            symbol=symbol,
+            side=side,
+            price=price,
+            quantity=quantity
         )
 
-        settle_trade(trade)
-
-        affected_orders.add(trade_data["buy_order"])
-        affected_orders.add(trade_data["sell_order"])
-
-    for order in affected_orders:
-        update_order_status(order)
+    # ===== MATCH AGAINST RESIDENT BOOK =====
+    with stage("match"):
+        trades_data = match_order(new_order, book)
+
+        if new_order.remaining_quantity > 0:
+            book.add(new_order.id, user.id, side, price, new_order.remaining_quantity)
+
+    with stage("settle"):
+        # Only the resting orders that actually traded are loaded from the DB.
+        makers = Order.objects.select_for_update().select_related(
+            "user", "symbol"
+        ).in_bulk([t["maker_order_id"] for t in trades_data])
+
+        affected_orders = {new_order}
+        trades = []
+
+        for trade_data in trades_data:
+            maker = makers[trade_data["maker_order_id"]]
+            maker.fill(trade_data["quantity"])
+            trades.append(Trade(
+                buy_order=new_order if side == "BUY" else maker,
+                sell_order=maker if side == "BUY" else new_order,
+                symbol=symbol,
+                buyer_id=user.id if side == "BUY" else maker.user_id,
+                seller_id=maker.user_id if side == "BUY" else user.id,
+                aggressor_side=side,
+                price=trade_data["price"],
+                quantity=trade_data["quantity"]
+            ))
+            affected_orders.add(maker)
+
+        settle_trades(trades)
+
+    with stage("status_update"):
+        for order in affected_orders:
+            set_order_status(order)
+        Order.objects.bulk_update(affected_orders, ["filled_quantity", "remaining_quantity", "status"])
 
     return new_order
 
-def update_order_status(order):
+def set_order_status(order):
     if order.filled_quantity >= order.quantity:
         order.status = 'FILLED'
     elif order.filled_quantity > 0:
         order.status = 'PARTIAL'
     else:
         order.status = 'OPEN'
-    order.save(update_fields=["status"])
 
 
-@transaction.atomic
 def cancel_order(user, order_id):
+    symbol_id, symbol_name = Order.objects.values_list(
+        "symbol_id", "symbol__name"
+    ).get(id=order_id)
+
+    with trace("cancel_order", symbol=symbol_name, order_id=order_id):
+        book = get_book(symbol_id)
+        with book_transaction(book, symbol_name):
+            with stage("cancel"):
+                order = _cancel_order(user, order_id)
+                book.cancel(order.id)
+        return order
+
+
+def _cancel_order(user, order_id):
 
     order = Order.objects.select_for_update().get(id=order_id)
 
@@ -0,0 +1,51 @@
+"""
+WebSocket frames encoded once per broadcast.
+
+The producers in exchange.channel_events send the encoded frame as the
+channel layer message, with only the few scalars consumers route on (symbol,
+seq, ids) beside it, so the layer's per-subscriber copy stays cheap.
+Consumers that send a payload unchanged forward the frame; the others
+decode() it, once per process for all of their connections.
+WS_FRAME_FORMAT picks ujson text frames ("json", the default) or msgpack
+binary frames ("msgpack"); everything a consumer encodes itself goes through
+encode() too, so one connection never mixes the two.
+
+Payloads must already be JSON types: prices are strings (ujson would turn a
+Decimal into a float).
+"""
+from functools import lru_cache
+
+import msgpack
+import ujson
+from django.conf import settings
+
+
+def binary():
+    return getattr(settings, "WS_FRAME_FORMAT", "json") == "msgpack"
+
+
+def encode(payload):
+    """str (json) or bytes (msgpack) ready for the WebSocket."""
+    if binary():
+        return msgpack.packb(payload, use_bin_type=True)
+    return ujson.dumps(payload, ensure_ascii=False)
+
+
+@lru_cache(maxsize=256)
+def decode(frame):
+    """
+    Payload of an encoded frame. Cached, so the connections receiving one
+    broadcast share a single decode: never mutate the result.
+    """
+    if isinstance(frame, bytes):
+        return msgpack.unpackb(frame, raw=False)
+    return ujson.loads(frame)
+
+
+def book_snapshot_message(book):
+    """Full-book message for an order_book_snapshot: ws/orderbook/ and ws/market/ send it as is."""
+    return dict(book, type="snapshot", channel="book")
+
+
+def book_delta_message(symbol_name, delta):
+    return dict(delta, type="delta", channel="book", symbol=symbol_name)
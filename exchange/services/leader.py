@@ -0,0 +1,107 @@
+"""
+Leader election through a lease row.
+
+Every candidate process calls Lease.acquire() periodically. It takes over the
+WorkerLease row when the row is free, expired or already its own, with a
+single conditional UPDATE, so at most one owner holds an unexpired lease at a
+time. The holder must renew well within `ttl` seconds; if it dies, another
+candidate takes over once the lease expires. Expiry is computed from the
+database clock (Now()), so candidates on hosts with skewed clocks agree on
+it. Works on any database backend.
+
+run_while_leader() runs a set of loops in threads for as long as the lease
+is held; run_market_worker and the in-process market worker use it.
+"""
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import close_old_connections
+from django.db.models import Q
+from django.db.models.functions import Now
+
+from exchange.models import WorkerLease
+
+logger = logging.getLogger(__name__)
+
+# expires_at of a freshly created row: already expired by any clock.
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def default_owner():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class Lease:
+    def __init__(self, name, ttl=30, owner=None):
+        self.name = name
+        self.ttl = ttl
+        self.owner = owner or default_owner()
+
+    def acquire(self):
+        """Take or renew the lease; True while this process is the leader."""
+        expires_at = Now() + timedelta(seconds=self.ttl)
+        claimable = WorkerLease.objects.filter(
+            Q(owner=self.owner) | Q(expires_at__lte=Now()), name=self.name
+        )
+        if claimable.update(owner=self.owner, expires_at=expires_at):
+            return True
+        # First run: make sure the row exists, then compete for it.
+        WorkerLease.objects.bulk_create(
+            [WorkerLease(name=self.name, owner="", expires_at=EPOCH)],
+            ignore_conflicts=True,
+        )
+        return claimable.update(owner=self.owner, expires_at=expires_at) == 1
+
+    def release(self):
+        """Give the lease up so a standby can take over immediately."""
+        WorkerLease.objects.filter(name=self.name, owner=self.owner).update(
+            expires_at=Now()
+        )
+
+
+def run_while_leader(lease, loops, done, say=logger.info):
+    """
+    Run each loop(stop) in a daemon thread while `lease` is held, renewing it
+    every ttl/3 seconds, until the `done` Event is set; the loops are stopped
+    and joined when leadership is lost and on exit, and the lease released.
+    """
+    stop = None
+    threads = []
+    say(f"{lease.name} {lease.owner} started; waiting for leadership.")
+    try:
+        while not done.is_set():
+            close_old_connections()
+            try:
+                leader = lease.acquire()
+            except Exception:
+                logger.exception("Lease renewal failed")
+                leader = False
+            if leader and stop is None:
+                say("Acquired leadership; starting loops.")
+                stop = threading.Event()
+                threads = [
+                    threading.Thread(target=loop, args=(stop,), name=loop.__name__, daemon=True)
+                    for loop in loops
+                ]
+                for thread in threads:
+                    thread.start()
+            elif not leader and stop is not None:
+                say("Lost leadership; stopping loops.")
+                _stop(stop, threads)
+                stop = None
+            done.wait(lease.ttl / 3)
+    finally:
+        if stop is not None:
+            _stop(stop, threads)
+            lease.release()
+
+
+def _stop(stop, threads):
+    stop.set()
+    for thread in threads:
+        thread.join()
+
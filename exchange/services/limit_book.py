@@ -0,0 +1,272 @@
+"""
+Resident limit order book, one per symbol.
+
+Each side keeps a sorted list of prices (bisect) mapped to FIFO queues of
+resting orders, so the best bid/ask is O(1) and finding a level is a binary
+search. A book is loaded from the Order table the first time its symbol is
+touched in this process and is then kept in sync by place_order/cancel_order.
+
+Symbol.book_seq is bumped by every transaction that changes a book. The
+resident copy remembers the seq it reflects and reloads when the DB has moved
+on (a write from another process); it is also the sequence number of the L2
+deltas published to WebSocket clients.
+"""
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+TICK = Decimal("0.01")
+
+
+class BookEntry:
+    __slots__ = ("order_id", "user_id", "side", "price", "remaining")
+
+    def __init__(self, order_id, user_id, side, price, remaining):
+        self.order_id = order_id
+        self.user_id = user_id
+        self.side = side
+        self.price = price
+        self.remaining = remaining
+
+
+class PriceLevel:
+    __slots__ = ("price", "orders", "total_quantity")
+
+    def __init__(self, price):
+        self.price = price
+        self.orders = OrderedDict()  # order_id -> BookEntry, FIFO
+        self.total_quantity = 0
+
+    def first(self):
+        return next(iter(self.orders.values()))
+
+
+class BookSide:
+    def __init__(self, side):
+        self.side = side
+        self._prices = []  # ascending
+        self._levels = {}
+
+    def __len__(self):
+        return len(self._prices)
+
+    def best(self):
+        if not self._prices:
+            return None
+        price = self._prices[-1] if self.side == "BUY" else self._prices[0]
+        return self._levels[price]
+
+    def levels(self):
+        """Price levels, best first."""
+        return list(self.iter_levels())
+
+    def iter_levels(self):
+        """Lazily yield price levels best first; hold the book lock while iterating."""
+        prices = reversed(self._prices) if self.side == "BUY" else self._prices
+        for price in prices:
+            yield self._levels[price]
+
+    def level(self, price):
+        return self._levels.get(price)
+
+    def add(self, entry):
+        level = self._levels.get(entry.price)
+        if level is None:
+            level = PriceLevel(entry.price)
+            self._levels[entry.price] = level
+            bisect.insort(self._prices, entry.price)
+        level.orders[entry.order_id] = entry
+        level.total_quantity += entry.remaining
+
+    def reduce(self, entry, quantity):
+        level = self._levels[entry.price]
+        entry.remaining -= quantity
+        level.total_quantity -= quantity
+        if entry.remaining <= 0:
+            del level.orders[entry.order_id]
+            if not level.orders:
+                self._drop_level(entry.price)
+
+    def remove(self, entry):
+        level = self._levels[entry.price]
+        del level.orders[entry.order_id]
+        level.total_quantity -= entry.remaining
+        if not level.orders:
+            self._drop_level(entry.price)
+
+    def _drop_level(self, price):
+        del self._levels[price]
+        del self._prices[bisect.bisect_left(self._prices, price)]
+
+
+class LimitOrderBook:
+    def __init__(self, symbol_id):
+        self.symbol_id = symbol_id
+        self.lock = threading.RLock()
+        self.version = 0  # local mutation counter
+        self.seq = 0  # Symbol.book_seq this state corresponds to
+        self._loaded = False
+        self._checked_at = 0.0
+        self._reset()
+
+    def _reset(self):
+        self.bids = BookSide("BUY")
+        self.asks = BookSide("SELL")
+        self._entries = {}
+        self._changes = {"BUY": {}, "SELL": {}}
+        self._cache = {}
+
+    def _touch(self, side, price):
+        level = self.side(side).level(price)
+        self._changes[side][price] = level.total_quantity if level else 0
+        self._cache.clear()
+
+    def cached(self, key, build):
+        """Memoize build(book) until the next mutation of the book."""
+        with self.lock:
+            try:
+                return self._cache[key]
+            except KeyError:
+                value = self._cache[key] = build(self)
+                return value
+
+    def side(self, side):
+        return self.bids if side == "BUY" else self.asks
+
+    def opposite(self, side):
+        return self.asks if side == "BUY" else self.bids
+
+    def get(self, order_id):
+        return self._entries.get(order_id)
+
+    def add(self, order_id, user_id, side, price, remaining):
+        entry = BookEntry(order_id, user_id, side, Decimal(price).quantize(TICK), remaining)
+        self.side(side).add(entry)
+        self._entries[order_id] = entry
+        self._touch(side, entry.price)
+        self.version += 1
+        return entry
+
+    def fill(self, entry, quantity):
+        self.side(entry.side).reduce(entry, quantity)
+        if entry.remaining <= 0:
+            del self._entries[entry.order_id]
+        self._touch(entry.side, entry.price)
+        self.version += 1
+
+    def cancel(self, order_id):
+        entry = self._entries.pop(order_id, None)
+        if entry is None:
+            return False
+        self.side(entry.side).remove(entry)
+        self._touch(entry.side, entry.price)
+        self.version += 1
+        return True
+
+    def commit(self, seq):
+        """
+        Mark the mutations since the last commit as persisted at book_seq=seq
+        and return them as an L2 delta: changed levels with their new total
+        quantity, 0 meaning the level is gone.
+        """
+        delta = {
+            "prev_seq": self.seq,
+            "seq": seq,
+            "bids": [[str(p), q] for p, q in self._changes["BUY"].items()],
+            "asks": [[str(p), q] for p, q in self._changes["SELL"].items()],
+        }
+        self._changes = {"BUY": {}, "SELL": {}}
+        self._cache.clear()
+        self.seq = seq
+        self._checked_at = time.monotonic()
+        return delta
+
+    def sync(self, seq=None, max_age=None):
+        """
+        Make sure the resident book reflects Symbol.book_seq (read from the DB
+        when seq is not given), rebuilding it from OPEN/PARTIAL orders if not.
+        With max_age, a book verified less than max_age seconds ago is trusted
+        without a query.
+        """
+        with self.lock:
+            from exchange.models import Order, Symbol
+
+            if seq is None:
+                if (
+                    self._loaded
+                    and max_age is not None
+                    and time.monotonic() - self._checked_at < max_age
+                ):
+                    return
+                seq = Symbol.objects.values_list("book_seq", flat=True).get(pk=self.symbol_id)
+            self._checked_at = time.monotonic()
+            # A seq read before our last commit is older, not different.
+            if self._loaded and self.seq >= seq:
+                return
+
+            self._reset()
+            rows = (
+                Order.objects.filter(
+                    symbol_id=self.symbol_id,
+                    status__in=["OPEN", "PARTIAL"],
+                    remaining_quantity__gt=0,
+                )
+                .order_by("created_at", "id")
+                .values_list("id", "user_id", "side", "price", "remaining_quantity")
+            )
+            for order_id, user_id, side, price, remaining in rows:
+                self.add(order_id, user_id, side, price, remaining)
+            self._changes = {"BUY": {}, "SELL": {}}
+            self.seq = seq
+            self._loaded = True
+            self.version += 1
+
+    def invalidate(self):
+        """Drop resident state; the next sync() rebuilds from the DB."""
+        with self.lock:
+            self._loaded = False
+            self._reset()
+            self.version += 1
+
+
+_books = {}
+_books_lock = threading.Lock()
+
+# Symbol names don't change once seeded; resolving them from memory lets a
+# conditional orderbook poll be answered without a query.
+_symbols_by_name = {}
+
+
+def get_book(symbol):
+    """Resident book for a Symbol instance or symbol id (not loaded yet)."""
+    symbol_id = getattr(symbol, "pk", symbol)
+    book = _books.get(symbol_id)
+    if book is None:
+        with _books_lock:
+            book = _books.setdefault(symbol_id, LimitOrderBook(symbol_id))
+    return book
+
+
+def resolve_symbol(symbol):
+    """Symbol instance or name (case-insensitive) -> Symbol; raises DoesNotExist."""
+    from exchange.models import Symbol
+
+    if isinstance(symbol, Symbol):
+        return symbol
+    key = str(symbol).strip().upper()
+    resolved = _symbols_by_name.get(key)
+    if resolved is None:
+        resolved = Symbol.get_by_name(symbol)
+        if resolved is None:
+            raise Symbol.DoesNotExist()
+        _symbols_by_name[key] = resolved
+    return resolved
+
+
+def reset_books():
+    """Forget every resident book (tests, benchmarks, after bulk DB edits)."""
+    with _books_lock:
+        _books.clear()
+        _symbols_by_name.clear()
@@ -1,7 +1,7 @@
-import requests
-from django.conf import settings
+from asgiref.sync import async_to_sync
 from django.core.cache import cache
-BASE_URL = "https://api.twelvedata.com/time_series"
+from exchange.services.price_providers import get_candle_provider
+
 
 def fetch_candles(symbol, interval="1min", outputsize=50):
     cache_key = f"candles_{symbol}_{interval}"
@@ -10,29 +10,7 @@ def fetch_candles(symbol, interval="1min", outputsize=50):
     if cached:
         return cached
 
-    params = {
-        "symbol": symbol,
-        "interval": interval,
-        "outputsize": outputsize,
-        "apikey": settings.TWELVE_DATA_API_KEY,
-    }
-
-    response = requests.get(BASE_URL, params=params, timeout=5)
-    data = response.json()
-
-    if "values" not in data:
-        return []
-
-    candles = [
-        {
-            "time": row["datetime"],
-            "open": float(row["open"]),
-            "high": float(row["high"]),
-            "low": float(row["low"]),
-            "close": float(row["close"]),
-        }
-        for row in reversed(data["values"])
-    ]
+    candles = async_to_sync(get_candle_provider().get_candles)(symbol, interval, outputsize)
 
     cache.set(cache_key, candles, 60)  # cache for 60 sec
     return candles
@@ -0,0 +1,137 @@
+"""
+Market-maker quoting engine.
+
+Keeps exactly one resting BUY and one resting SELL quote per symbol for the
+market_maker user. Each cycle computes target prices around the last price
+(skewed by inventory) and only touches a quote when its target has moved by
+more than MARKET_MAKER_REQUOTE_THRESHOLD, or when it was filled: the old
+quote is canceled and the new one placed in a single book transaction
+(replace_order). The book stays bounded at two orders per symbol and a quiet
+market costs no writes.
+"""
+import logging
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+
+from exchange.models import Holding, Order, Symbol
+from exchange.services.limit_book import TICK, get_book
+from exchange.services.sequencer import submit_cancel, submit_replace, sequencer_timeout
+
+logger = logging.getLogger(__name__)
+
+
+class Quote:
+    __slots__ = ("order_id", "price")
+
+    def __init__(self, order_id, price):
+        self.order_id = order_id
+        self.price = price
+
+
+class QuoteEngine:
+    def __init__(self, user, size=20, spread=Decimal("0.005"), threshold=Decimal("0.001"),
+                 target_inventory=5000):
+        self.user = user
+        self.size = size
+        self.spread = spread
+        self.threshold = threshold
+        self.target_inventory = Decimal(target_inventory)
+        self.quotes = {}  # (symbol_name, side) -> Quote
+
+    @classmethod
+    def from_settings(cls, username="market_maker"):
+        return cls(
+            User.objects.get(username=username),
+            size=getattr(settings, "MARKET_MAKER_QUOTE_SIZE", 20),
+            threshold=Decimal(str(getattr(settings, "MARKET_MAKER_REQUOTE_THRESHOLD", 0.001))),
+        )
+
+    def target_prices(self, last_price, inventory):
+        """(bid, ask) around last_price, skewed to work inventory back to target."""
+        inventory_ratio = Decimal(inventory) / self.target_inventory
+        if inventory_ratio > Decimal("1.2"):
+            bias = Decimal("-0.002")
+        elif inventory_ratio < Decimal("0.8"):
+            bias = Decimal("0.002")
+        else:
+            bias = Decimal("0")
+        bid = last_price * (Decimal("1") - self.spread + bias)
+        ask = last_price * (Decimal("1") + self.spread + bias)
+        return bid.quantize(TICK), ask.quantize(TICK)
+
+    def load_quotes(self):
+        """
+        Adopt the newest resting order per (symbol, side) as the live quote
+        and cancel the rest (left over from earlier runs).
+        """
+        self.quotes = {}
+        rows = (
+            Order.objects.filter(user=self.user, status__in=["OPEN", "PARTIAL"])
+            .order_by("-created_at", "-id")
+            .values_list("id", "symbol__name", "side", "price")
+        )
+        for order_id, symbol_name, side, price in rows:
+            key = (symbol_name, side)
+            if key not in self.quotes:
+                self.quotes[key] = Quote(order_id, price)
+                continue
+            try:
+                submit_cancel(self.user, order_id).result(timeout=sequencer_timeout())
+            except Exception:
+                logger.exception("Could not cancel stale quote %s", order_id)
+
+    def _needs_requote(self, quote, book, target):
+        if quote is None:
+            return True
+        entry = book.get(quote.order_id)
+        if entry is None or entry.remaining < self.size:
+            return True  # filled (fully or partly)
+        return abs(target - quote.price) > quote.price * self.threshold
+
+    def requote(self, symbol, inventory):
+        """Bring both quotes of symbol in line; returns how many were replaced."""
+        if not symbol.last_price:
+            return 0
+        book = get_book(symbol)
+        book.sync(max_age=getattr(settings, "ORDERBOOK_SEQ_CHECK_INTERVAL", 1.0))
+        bid, ask = self.target_prices(symbol.last_price, inventory)
+        # Move the side that is getting out of the way first, so the new
+        # quote never crosses our own old quote on the other side.
+        sides = [("BUY", bid), ("SELL", ask)]
+        old_bid = self.quotes.get((symbol.name, "BUY"))
+        if old_bid is not None and bid > old_bid.price:
+            sides.reverse()
+        replaced = 0
+        for side, target in sides:
+            key = (symbol.name, side)
+            quote = self.quotes.get(key)
+            if not self._needs_requote(quote, book, target):
+                continue
+            try:
+                order = submit_replace(
+                    self.user, quote.order_id if quote else None,
+                    symbol, side, target, self.size,
+                ).result(timeout=sequencer_timeout())
+            except Exception:
+                logger.exception("Requote failed for %s %s", symbol.name, side)
+                continue
+            if order.remaining_quantity > 0:
+                self.quotes[key] = Quote(order.id, order.price)
+            else:
+                self.quotes.pop(key, None)
+            replaced += 1
+        return replaced
+
+    def run_cycle(self):
+        """One pass over every symbol: two queries plus one write per moved quote."""
+        inventory = {
+            symbol_id: available + reserved
+            for symbol_id, available, reserved in Holding.objects.filter(user=self.user)
+            .values_list("symbol_id", "available_quantity", "reserved_quantity")
+        }
+        replaced = 0
+        for symbol in Symbol.objects.only("id", "name", "last_price"):
+            replaced += self.requote(symbol, inventory.get(symbol.pk, 0))
+        return replaced
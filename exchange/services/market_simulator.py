@@ -1,76 +1,114 @@
-import random
+import logging
+import threading
 import time
 from decimal import Decimal
-from threading import Thread
-from django.db import transaction
-from exchange.models import Symbol
-from exchange.channel_events import broadcast_prices
-from exchange.services.exchange_service import place_order
-from django.contrib.auth.models import User
-from exchange.models import Portfolio, Holding
-
-
-
-SIMULATION_INTERVAL = 1  # seconds
-
-
-def simulate_price(symbol):
-    last_price = symbol.last_price or Decimal("100.00")
-
-    # ±0.3% random move
-    change_pct = Decimal(random.uniform(-0.003, 0.003))
-    new_price = last_price * (Decimal("1.0") + change_pct)
-
-    # Clamp to avoid crash
-    if new_price <= 1:
-        new_price = Decimal("1.00")
-
-    symbol.last_price = new_price.quantize(Decimal("0.01"))
-    symbol.save(update_fields=["last_price"])
-
-
-def simulation_loop():
-    while True:
-        symbols = list(Symbol.objects.all())
-        for symbol in symbols:
-            simulate_price(symbol)
-        broadcast_prices()
-        time.sleep(SIMULATION_INTERVAL)
 
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
 
-def market_maker_loop():
-    while True:
-        symbols = Symbol.objects.all()
-        mm = User.objects.get(username="market_maker")
-        portfolio = Portfolio.objects.get(user=mm)
-
-        for symbol in symbols:
-            if not symbol.last_price:
-                continue
-
-            holding = Holding.objects.get(user=mm, symbol=symbol)
-
-            last_price = symbol.last_price
-            base_spread = last_price * Decimal("0.005")
-
-            inventory_ratio = holding.available_quantity / Decimal("5000")
-
-            if inventory_ratio > Decimal("1.2"):
-                bias = Decimal("-0.002")
-            elif inventory_ratio < Decimal("0.8"):
-                bias = Decimal("0.002")
-            else:
-                bias = Decimal("0")
-
-            buy_price = last_price * (Decimal("1") - Decimal("0.005") + bias)
-            sell_price = last_price * (Decimal("1") + Decimal("0.005") + bias)
-
-            # place small size quotes
-            try:
-                place_order(mm, symbol.name, "BUY", buy_price, 20)
-                place_order(mm, symbol.name, "SELL", sell_price, 20)
-            except:
-                pass
-
-        time.sleep(5)
-
+from exchange.models import Symbol
+from exchange.channel_events import broadcast_prices
+from exchange.services.reference_prices import publish_reference_price
+
+logger = logging.getLogger(__name__)
+
+
+def simulate_prices(prices, rng, max_move=0.003):
+    """
+    One random-walk step for every price at once: a uniform ±max_move move
+    per symbol, floored at 1.00 and rounded to cents. prices: float array.
+    """
+    moves = rng.uniform(-max_move, max_move, len(prices))
+    return np.round(np.maximum(prices * (1.0 + moves), 1.0), 2)
+
+
+def simulation_tick(rng):
+    """
+    Move every symbol's last_price one step, persist them (stamped now, so
+    they count as fresh reference prices) with one bulk_update and broadcast
+    the computed list without re-reading it.
+    """
+    rows = list(Symbol.objects.values_list("id", "name", "last_price"))
+    if not rows:
+        return []
+    ids, names, last_prices = zip(*rows)
+    prices = np.array([float(p) if p is not None else 100.0 for p in last_prices])
+    new_prices = [Decimal(f"{p:.2f}") for p in simulate_prices(prices, rng)]
+
+    now = timezone.now()
+    Symbol.objects.bulk_update(
+        [Symbol(pk=pk, last_price=price, last_price_updated_at=now) for pk, price in zip(ids, new_prices)],
+        ["last_price", "last_price_updated_at"],
+        batch_size=1000,
+    )
+    for name, price in zip(names, new_prices):
+        publish_reference_price(name, price, now)
+
+    data = [{"symbol": name, "price": str(price)} for name, price in zip(names, new_prices)]
+    broadcast_prices(data)
+    return data
+
+
+def simulation_loop(stop=None):
+    """
+    Tick every SIMULATION_TICK_SECONDS (e.g. 0.05 for a 20 Hz load test)
+    until the stop event is set.
+    """
+    stop = stop or threading.Event()
+    rng = np.random.default_rng()
+    interval = getattr(settings, "SIMULATION_TICK_SECONDS", 1.0)
+    while not stop.is_set():
+        started = time.monotonic()
+        close_old_connections()
+        try:
+            simulation_tick(rng)
+        except Exception:
+            logger.exception("Simulation tick failed")
+        stop.wait(max(0.0, interval - (time.monotonic() - started)))
+
+
+def market_maker_loop(stop=None):
+    """
+    Keep one quote per side per symbol (see exchange/services/market_maker.py)
+    until the stop event is set.
+    """
+    from exchange.services.market_maker import QuoteEngine
+
+    from django.contrib.auth.models import User
+
+    stop = stop or threading.Event()
+    close_old_connections()
+    try:
+        engine = QuoteEngine.from_settings()
+    except User.DoesNotExist:
+        logger.error("No market_maker user; the market maker is not running.")
+        return
+    engine.load_quotes()
+    while not stop.is_set():
+        close_old_connections()
+        try:
+            engine.run_cycle()
+        except Exception:
+            logger.exception("Market maker cycle failed")
+        stop.wait(getattr(settings, "MARKET_MAKER_INTERVAL", 5))
+
+
+def start_in_process():
+    """
+    Run both loops in a daemon thread of this (web) process, under the same
+    lease as run_market_worker. Started by config/asgi.py when
+    MARKET_WORKER_IN_PROCESS is set.
+    """
+    from exchange.services.leader import Lease, run_while_leader
+
+    lease = Lease("market_worker", ttl=getattr(settings, "MARKET_WORKER_LEASE_SECONDS", 15))
+    thread = threading.Thread(
+        target=run_while_leader,
+        args=(lease, [simulation_loop, market_maker_loop], threading.Event()),
+        name="market_worker",
+        daemon=True,
+    )
+    thread.start()
+    return thread
@@ -0,0 +1,84 @@
+"""
+Batched initial state for ws/market/ subscriptions.
+
+One subscribe message can name many symbols. The symbols are resolved with a
+single query that also returns book_seq and last_price, and every other kind
+of initial state (books, candles, recent trades) is then loaded for all of
+them at once instead of once per symbol.
+"""
+from django.db.models import F, OuterRef, Subquery, Window
+from django.db.models.functions import RowNumber, Upper
+
+from exchange.models import Candle, Symbol, Trade
+from exchange.services.candles import candle_payload
+
+MAX_RECENT_TRADES = 100
+
+
+def trade_payload(trade, symbol_name):
+    return {
+        "id": trade.id,
+        "symbol": symbol_name,
+        "side": trade.aggressor_side,
+        "price": str(trade.price),
+        "quantity": trade.quantity,
+        "created_at": trade.created_at.isoformat(),
+    }
+
+
+def resolve_symbols(names):
+    """{NAME: Symbol} for the names that exist (case-insensitive), in one query."""
+    names = {str(name).strip().upper() for name in names}
+    return {
+        symbol.name.upper(): symbol
+        for symbol in Symbol.objects.annotate(upper_name=Upper("name"))
+        .filter(upper_name__in=names)
+        .only("id", "name", "book_seq", "last_price")
+    }
+
+
+def price_snapshots(symbols):
+    return [{"symbol": symbol.name, "price": str(symbol.last_price)} for symbol in symbols]
+
+
+def latest_candles(symbols, intervals):
+    """
+    {name: latest bar payload} where intervals maps symbol name -> interval.
+    One query per distinct interval.
+    """
+    by_interval = {}
+    for symbol in symbols:
+        by_interval.setdefault(intervals[symbol.name], []).append(symbol)
+    out = {}
+    for interval, group in by_interval.items():
+        latest = (
+            Candle.objects.filter(symbol=OuterRef("symbol"), interval=interval)
+            .order_by("-bucket_start")
+            .values("bucket_start")[:1]
+        )
+        rows = Candle.objects.filter(
+            symbol__in=group, interval=interval, bucket_start=Subquery(latest)
+        ).select_related("symbol")
+        for candle in rows:
+            out[candle.symbol.name] = candle_payload(candle)
+    return out
+
+
+def recent_trades(symbols, limit):
+    """{name: last `limit` trades, oldest first} in one windowed query."""
+    limit = max(0, min(int(limit), MAX_RECENT_TRADES))
+    out = {symbol.name: [] for symbol in symbols}
+    if not limit or not symbols:
+        return out
+    names = {symbol.pk: symbol.name for symbol in symbols}
+    rows = (
+        Trade.objects.filter(symbol_id__in=names)
+        .annotate(row=Window(RowNumber(), partition_by=F("symbol_id"), order_by=F("id").desc()))
+        .filter(row__lte=limit)
+        .only("id", "symbol_id", "aggressor_side", "price", "quantity", "created_at")
+        .order_by("id")
+    )
+    for trade in rows:
+        name = names[trade.symbol_id]
+        out[name].append(trade_payload(trade, name))
+    return out
@@ -1,40 +1,54 @@
-def match_order(new_order, buy_orders, sell_orders):
+def match_order(new_order, book):
     """
-    Pure matching logic.
+    Pure matching logic against the resident LimitOrderBook.
     Does NOT write to DB.
     Does NOT modify portfolios.
-    Only updates filled_quantity in memory.
-    Returns list of trade dictionaries.
+    Updates new_order.filled_quantity/remaining_quantity and the book's resting quantities in memory.
+    Returns list of fill dictionaries keyed by the resting (maker) order id.
     """
     trades = []
-    if new_order.side == "BUY":
-        opposite_orders = sell_orders
-    else:
-        opposite_orders = buy_orders
-    for opposite in opposite_orders:
-        if new_order.remaining_quantity <= 0:
+    opposite_side = book.opposite(new_order.side)
+    while new_order.remaining_quantity > 0:
+        level = opposite_side.best()
+        if level is None:
             break
-        if opposite.remaining_quantity <= 0:
-            continue
-        price_match = False
-        if new_order.side == "BUY" and new_order.price >= opposite.price:
-            price_match = True
-        elif new_order.side == "SELL" and new_order.price <= opposite.price:
-            price_match = True
-        if not price_match:
+        if new_order.side == "BUY" and new_order.price < level.price:
             break
+        if new_order.side == "SELL" and new_order.price > level.price:
+            break
+        opposite = level.first()
         trade_quantity = min(
-            new_order.remaining_quantity, 
-            opposite.remaining_quantity
+            new_order.remaining_quantity,
+            opposite.remaining
         )
-        new_order.filled_quantity += trade_quantity
-        opposite.filled_quantity += trade_quantity
+        new_order.fill(trade_quantity)
+        book.fill(opposite, trade_quantity)
 
         trades.append({
-            'buy_order': new_order if new_order.side == "BUY" else opposite,
-            'sell_order': new_order if new_order.side == "SELL" else opposite,
-            'price': opposite.price,  # Trade executes at opposite order's price
+            'maker_order_id': opposite.order_id,
+            'price': level.price,  # Trade executes at resting order's price
             'quantity': trade_quantity
         })
 
-    return trades
\ No newline at end of file
+    return trades
+
+
+def counterparty_user_ids(book, side, price, quantity):
+    """
+    User ids of the resting orders an incoming order would trade with, in
+    the order match_order would fill them. Reads the book only.
+    """
+    user_ids = set()
+    for level in book.opposite(side).iter_levels():
+        if quantity <= 0:
+            break
+        if side == "BUY" and price < level.price:
+            break
+        if side == "SELL" and price > level.price:
+            break
+        for entry in level.orders.values():
+            user_ids.add(entry.user_id)
+            quantity -= entry.remaining
+            if quantity <= 0:
+                break
+    return user_ids
@@ -0,0 +1,219 @@
+"""
+Order-path timing and query counts (opt-in, ORDER_METRICS) and fan-out counters.
+
+trace(op) wraps one operation such as place_order; stage(name) inside it
+records the wall time and DB queries of one step. When the trace ends every
+stage and the total go into in-process histograms and one JSON line is logged
+to this module's logger. timed(op, stage) records steps that run outside a
+trace, such as broadcast flushes. increment() bumps always-on counters (e.g.
+WebSocket frames per group). render() returns all of it in Prometheus text
+format for /api/metrics/.
+
+Query counts come from an execute wrapper on the current thread's
+connection, so they only cover queries made on that thread.
+"""
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = {
+    "exchange_ws_messages_total": "WebSocket frames per group and outcome (written, conflated, dropped).",
+    "exchange_ws_disconnects_total": "WebSocket clients disconnected for lagging, per group.",
+}
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+
+
+def enabled():
+    return getattr(settings, "ORDER_METRICS", False)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum:.6f}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seconds = {}  # (op, stage) -> Histogram
+        self._queries = {}
+        self._counters = {}  # (name, sorted label items) -> int
+
+    def observe(self, op, stage, seconds, queries=None):
+        key = (op, stage)
+        with self._lock:
+            histogram = self._seconds.get(key)
+            if histogram is None:
+                histogram = self._seconds[key] = Histogram(SECONDS_BUCKETS)
+            histogram.observe(seconds)
+            if queries is not None:
+                histogram = self._queries.get(key)
+                if histogram is None:
+                    histogram = self._queries[key] = Histogram(QUERY_BUCKETS)
+                histogram.observe(queries)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def render(self):
+        out = []
+        for name, help_text, histograms in (
+            ("exchange_stage_seconds", "Wall time per order-path stage.", self._seconds),
+            ("exchange_stage_queries", "DB queries per order-path stage.", self._queries),
+        ):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} histogram")
+            with self._lock:
+                for (op, stage), histogram in sorted(histograms.items()):
+                    out.extend(histogram.lines(name, f'op="{op}",stage="{stage}"'))
+        with self._lock:
+            counters = sorted(self._counters.items())
+        for name, help_text in COUNTERS.items():
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} counter")
+            for (counter, labels), value in counters:
+                if counter == name:
+                    label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                    out.append(f"{name}{{{label_text}}} {value}")
+        return "\n".join(out) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._seconds.clear()
+            self._queries.clear()
+            self._counters.clear()
+
+
+registry = Registry()
+_local = threading.local()
+
+
+class _QueryCounter:
+    __slots__ = ("count",)
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def trace(op, **fields):
+    """
+    Record op and its stages; yields a dict of extra fields for the log line
+    (e.g. order_id). A no-op when ORDER_METRICS is off or a trace is already
+    running on this thread.
+    """
+    if not enabled() or getattr(_local, "trace", None) is not None:
+        yield fields
+        return
+    stages = {}  # name -> [seconds, queries]
+    _local.trace = stages
+    counter = _QueryCounter()
+    error = None
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(counter):
+            yield fields
+    except BaseException as exc:
+        error = type(exc).__name__
+        raise
+    finally:
+        total = time.perf_counter() - start
+        _local.trace = None
+        registry.observe(op, "total", total, counter.count)
+        for name, (seconds, queries) in stages.items():
+            registry.observe(op, name, seconds, queries)
+        line = {
+            "event": op,
+            "ms": round(total * 1000, 3),
+            "queries": counter.count,
+            "stages": {
+                name: {"ms": round(seconds * 1000, 3), "queries": queries}
+                for name, (seconds, queries) in stages.items()
+            },
+            # Time outside every stage: lock waits, commit, on_commit hooks.
+            "other_ms": round((total - sum(s for s, _ in stages.values())) * 1000, 3),
+        }
+        line.update(fields)
+        if error:
+            line["error"] = error
+        logger.info(json.dumps(line, default=str))
+
+
+@contextmanager
+def stage(name):
+    """Time one step of the running trace; repeated stages add up."""
+    stages = getattr(_local, "trace", None)
+    if stages is None:
+        yield
+        return
+    counter = _QueryCounter()
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(counter):
+            yield
+    finally:
+        seconds = time.perf_counter() - start
+        entry = stages.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += counter.count
+
+
+@contextmanager
+def timed(op, stage_name):
+    """Record a step outside any trace straight into the histograms."""
+    if not enabled():
+        yield
+        return
+    counter = _QueryCounter()
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(counter):
+            yield
+    finally:
+        registry.observe(op, stage_name, time.perf_counter() - start, counter.count)
+
+
+def observe(op, stage_name, seconds):
+    if enabled():
+        registry.observe(op, stage_name, seconds)
+
+
+def increment(name, amount=1, **labels):
+    registry.increment(name, amount, **labels)
+
+
+def render():
+    return registry.render()
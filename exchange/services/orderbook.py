@@ -1,48 +1,134 @@
-from django.db.models import F, Sum
-from exchange.models.symbol import Symbol
-from exchange.models import Order
+from decimal import Decimal, InvalidOperation, ROUND_CEILING, ROUND_FLOOR
+from django.conf import settings
+from exchange.services.limit_book import TICK, get_book, resolve_symbol
 
+# Largest accepted tick; bigger buckets are meaningless and overflow the
+# Decimal context when prices are rounded to them.
+MAX_TICK = Decimal("1000000")
 
-def get_order_book(symbol):
-    """symbol: Symbol instance or symbol name (str). Resolves by name if str."""
-    if not isinstance(symbol, Symbol):
-        resolved = Symbol.get_by_name(symbol)
-        if resolved is None:
-            raise Symbol.DoesNotExist()
-        symbol = resolved
-    buy_book = (
-        Order.objects.filter(
-            side = 'BUY',
-            status__in = ['OPEN', 'PARTIAL'],
-            symbol = symbol
-            
-        )
-        .annotate(
-            remaining = F('quantity') - F('filled_quantity')
-        )
-        .values('price')
-        .annotate(
-            total_quantity = Sum('remaining')
-        )
-        .order_by('-price')
-    )
-    sell_book = (
-        Order.objects.filter(
-            side = 'SELL',
-            status__in = ['OPEN', 'PARTIAL'],
-            symbol = symbol
-        )
-        .annotate(
-            remaining = F('quantity') - F('filled_quantity')
-        )
-        .values('price')
-        .annotate(
-            total_quantity = Sum('remaining')
-        )
-        .order_by('price')
+
+def parse_depth_options(depth=None, tick=None):
+    """
+    Validate the depth/tick query options.
+    Returns (depth or None, tick Decimal or None); raises ValueError.
+    """
+    if depth in (None, ""):
+        depth = None
+    else:
+        try:
+            depth = int(depth)
+        except (TypeError, ValueError):
+            depth = 0
+        if depth <= 0:
+            raise ValueError("depth must be a positive integer.")
+    if tick in (None, ""):
+        tick = None
+    else:
+        try:
+            tick = Decimal(str(tick))
+            if not tick.is_finite() or not TICK <= tick <= MAX_TICK or tick % TICK:
+                tick = None
+        except InvalidOperation:
+            tick = None
+        if tick is None:
+            raise ValueError(f"tick must be a positive multiple of 0.01 up to {MAX_TICK}.")
+    return depth, tick
+
+
+def aggregate_levels(levels, side, depth=None, tick=None):
+    """
+    levels: (price, quantity) pairs, best first.
+    Groups prices into tick-sized buckets (bids round down, asks round up so
+    the spread never looks tighter than it is) and stops after depth buckets.
+    Returns [price, total_quantity] pairs, best first.
+    """
+    rounding = ROUND_FLOOR if side == "BUY" else ROUND_CEILING
+    out = []
+    for price, quantity in levels:
+        if tick:
+            price = ((price / tick).to_integral_value(rounding) * tick).quantize(TICK)
+        if out and out[-1][0] == price:
+            out[-1][1] += quantity
+            continue
+        if depth and len(out) == depth:
+            break
+        out.append([price, quantity])
+    return out
+
+
+def _side_levels(book_side, depth, tick):
+    return aggregate_levels(
+        ((l.price, l.total_quantity) for l in book_side.iter_levels()),
+        book_side.side, depth, tick,
     )
-    return {
-        'bids' : list(buy_book),
-        'asks' : list(sell_book),
-    }
 
+
+def _synced_book(symbol):
+    book = get_book(symbol)
+    book.sync(max_age=getattr(settings, "ORDERBOOK_SEQ_CHECK_INTERVAL", 1.0))
+    return book
+
+
+def versioned_order_book(symbol, depth=None, tick=None):
+    """(book_seq, {'bids', 'asks'}) from the resident book, cached per version."""
+    def build(book):
+        return {
+            'bids': [
+                {'price': price, 'total_quantity': qty}
+                for price, qty in _side_levels(book.bids, depth, tick)
+            ],
+            'asks': [
+                {'price': price, 'total_quantity': qty}
+                for price, qty in _side_levels(book.asks, depth, tick)
+            ],
+        }
+
+    book = _synced_book(resolve_symbol(symbol))
+    with book.lock:
+        return book.seq, book.cached(("order_book", depth, tick), build)
+
+
+def order_book_version(symbol):
+    return _synced_book(resolve_symbol(symbol)).seq
+
+
+def get_order_book(symbol, depth=None, tick=None):
+    """symbol: Symbol instance or symbol name (str). Resolves by name if str."""
+    return versioned_order_book(symbol, depth, tick)[1]
+
+
+def _snapshot(symbol, book, depth=None, tick=None):
+    def build(book):
+        return {
+            "symbol": symbol.name,
+            "seq": book.seq,
+            "bids": [
+                {"price": str(price), "total_quantity": qty}
+                for price, qty in _side_levels(book.bids, depth, tick)
+            ],
+            "asks": [
+                {"price": str(price), "total_quantity": qty}
+                for price, qty in _side_levels(book.asks, depth, tick)
+            ],
+        }
+
+    return book.cached(("snapshot", depth, tick), build)
+
+
+def order_book_snapshot(symbol, depth=None, tick=None):
+    """L2 snapshot (string prices) with the book_seq it reflects. Do not mutate."""
+    symbol = resolve_symbol(symbol)
+    return _snapshot(symbol, _synced_book(symbol), depth, tick)
+
+
+def order_book_snapshots(symbols):
+    """
+    {name: order_book_snapshot} for Symbol rows loaded with book_seq, without
+    a query per symbol (books that are not resident yet are still loaded).
+    """
+    out = {}
+    for symbol in symbols:
+        book = get_book(symbol)
+        book.sync(symbol.book_seq)
+        out[symbol.name] = _snapshot(symbol, book)
+    return out
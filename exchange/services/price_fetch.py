@@ -1,42 +1,114 @@
 """
-Fetch delayed stock prices from a free source and cache in DB.
-Uses yfinance (Yahoo Finance) – no API key; data is delayed to stay within free use.
+Fetch delayed stock prices and cache them in the DB.
+Quotes come from the configured PriceProvider (yfinance by default – no API
+key; data is delayed to stay within free use).
 """
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
+from asgiref.sync import async_to_sync
+from django.conf import settings
 from django.utils import timezone
 
+logger = logging.getLogger(__name__)
 
-def update_symbol_prices(cache_minutes=60):
-    """
-    Update last_price for all Symbol records if cache is older than cache_minutes.
-    Returns number of symbols updated.
-    """
+
+def yfinance_price(symbol_name):
+    """Latest price for one ticker via yfinance, or None."""
     try:
         import yfinance as yf
     except ImportError:
-        return 0
+        return None
+
+    ticker = yf.Ticker(symbol_name)
+
+    price = None
+
+    # 1) fast_info (preferred when available)
+    try:
+        fi = getattr(ticker, "fast_info", None)
+        if fi and isinstance(fi, dict):
+            price = fi.get("lastPrice") or fi.get("last_price")
+    except Exception:
+        pass
+
+    # 2) ticker.history fallback
+    if price is None:
+        try:
+            hist = ticker.history(period="1d", interval="1m")
+            if hasattr(hist, "empty") and not hist.empty:
+                # Use the last close value
+                price = hist["Close"].iloc[-1]
+        except Exception:
+            pass
+
+    # 3) ticker.info fallback (older yfinance versions)
+    if price is None:
+        try:
+            info = getattr(ticker, "info", None) or {}
+            price = info.get("regularMarketPrice") or info.get("previousClose") or info.get("open")
+        except Exception:
+            price = None
+
+    return price
+
+
+def _safe_fetch(fetch_price, name):
+    try:
+        return fetch_price(name)
+    except Exception:
+        logger.exception("Price fetch failed for %s", name)
+        return None
+
 
+def update_symbol_prices(cache_minutes=60, names=None, fetch_price=None, max_workers=None):
+    """
+    Update last_price for Symbol records whose cache is older than cache_minutes.
+
+    Stale tickers are fetched as one batch from the configured PriceProvider
+    (or, with fetch_price(name) -> price or None, concurrently on a bounded
+    thread pool) and written back with one bulk_update. names limits the
+    refresh to those symbols. Returns number of symbols updated.
+    """
     from exchange.models import Symbol
     from datetime import timedelta
 
+    if max_workers is None:
+        max_workers = getattr(settings, "PRICE_FETCH_WORKERS", 8)
+
     threshold = timezone.now() - timedelta(minutes=cache_minutes)
-    symbols = list(Symbol.objects.all())
-    updated = 0
-    for sym in symbols:
-        if sym.last_price_updated_at and sym.last_price_updated_at >= threshold:
-            continue
+    qs = Symbol.objects.all()
+    if names is not None:
+        qs = qs.filter(name__in=list(names))
+    stale = [
+        sym for sym in qs
+        if not sym.last_price_updated_at or sym.last_price_updated_at < threshold
+    ]
+    if not stale:
+        return 0
+
+    if fetch_price is None:
+        from exchange.services.price_providers import get_price_provider
         try:
-            ticker = yf.Ticker(sym.name)
-            info = ticker.info
-            price = info.get("regularMarketPrice") or info.get("previousClose") or info.get("open")
-            if price is not None:
-                sym.last_price = Decimal(str(round(float(price), 2)))
-                sym.last_price_updated_at = timezone.now()
-                sym.save(update_fields=["last_price", "last_price_updated_at"])
-                updated += 1
+            quotes = async_to_sync(get_price_provider().get_quotes)([sym.name for sym in stale])
         except Exception:
+            logger.exception("Price provider batch quote failed")
+            quotes = {}
+        prices = [quotes.get(sym.name) for sym in stale]
+    else:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(stale)))) as pool:
+            prices = list(pool.map(lambda sym: _safe_fetch(fetch_price, sym.name), stale))
+
+    now = timezone.now()
+    updated = []
+    for sym, price in zip(stale, prices):
+        if price is None:
             continue
-    return updated
+        sym.last_price = Decimal(str(round(float(price), 2)))
+        sym.last_price_updated_at = now
+        updated.append(sym)
+    Symbol.objects.bulk_update(updated, ["last_price", "last_price_updated_at"])
+    return len(updated)
 
 
 def fetch_symbol_price(symbol_name):
@@ -44,53 +116,16 @@ def fetch_symbol_price(symbol_name):
 
     Returns Decimal price or None.
     """
-    try:
-        import yfinance as yf
-    except ImportError:
-        return None
-
     from exchange.models import Symbol
-    import logging
-    logger = logging.getLogger(__name__)
     try:
         sym = Symbol.objects.filter(name__iexact=str(symbol_name).strip()).first()
         if not sym:
             return None
 
-        ticker = yf.Ticker(sym.name)
-
-        price = None
-
-        # 1) fast_info (preferred when available)
-        try:
-            fi = getattr(ticker, "fast_info", None)
-            if fi and isinstance(fi, dict):
-                price = fi.get("lastPrice") or fi.get("last_price")
-        except Exception:
-            pass
-
-        # 2) ticker.history fallback
-        if price is None:
-            try:
-                hist = ticker.history(period="1d", interval="1m")
-                if hasattr(hist, "empty") and not hist.empty:
-                    # Use the last close value
-                    price = hist["Close"].iloc[-1]
-            except Exception:
-                pass
-
-        # 3) ticker.info fallback (older yfinance versions)
-        if price is None:
-            try:
-                info = getattr(ticker, "info", None) or {}
-                price = info.get("regularMarketPrice") or info.get("previousClose") or info.get("open")
-            except Exception:
-                price = None
+        from exchange.services.price_providers import get_price_provider
+        price = async_to_sync(get_price_provider().get_quotes)([sym.name]).get(sym.name)
 
         if price is not None:
-            from decimal import Decimal
-            from django.utils import timezone
-
             sym.last_price = Decimal(str(round(float(price), 2)))
             sym.last_price_updated_at = timezone.now()
             sym.save(update_fields=["last_price", "last_price_updated_at"])
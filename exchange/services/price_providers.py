@@ -0,0 +1,320 @@
+"""
+Pluggable sources of external prices.
+
+A PriceProvider answers two async questions: the latest quote for a batch of
+symbols and recent OHLC candles for one symbol. PRICE_PROVIDER in settings
+picks the implementation for quotes and CANDLE_PROVIDER the one behind
+/api/candles/?source=provider (Twelve Data by default):
+
+- "yfinance"   Yahoo Finance via yfinance (default, no API key)
+- "twelvedata" Twelve Data REST API (TWELVE_DATA_API_KEY)
+- "simulator"  seeded random walk, no network, zero latency
+- "replay"     ticks replayed from the CSV file in PRICE_REPLAY_FILE
+
+A dotted path to a PriceProvider subclass is accepted as well.
+"""
+import asyncio
+import csv
+from abc import ABC, abstractmethod
+import random
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+INTERVAL_SECONDS = {
+    "1min": 60,
+    "5min": 300,
+    "15min": 900,
+    "30min": 1800,
+    "1h": 3600,
+    "1day": 86400,
+}
+
+
+def _to_price(value):
+    if value is None:
+        return None
+    return Decimal(str(round(float(value), 2)))
+
+
+class PriceProvider(ABC):
+    """Base class; subclasses implement get_quotes and usually get_candles."""
+
+    @abstractmethod
+    async def get_quotes(self, symbols):
+        """{symbol: Decimal price} for the symbols that have a quote."""
+
+    async def get_candles(self, symbol, interval="1min", outputsize=50):
+        """Oldest-first [{"time", "open", "high", "low", "close"}]."""
+        return []
+
+
+class YFinanceProvider(PriceProvider):
+    YF_INTERVALS = {"1min": "1m", "5min": "5m", "15min": "15m", "30min": "30m", "1h": "60m", "1day": "1d"}
+
+    def __init__(self, max_workers=None):
+        if max_workers is None:
+            max_workers = getattr(settings, "PRICE_FETCH_WORKERS", 8)
+        self.max_workers = max(1, max_workers)
+
+    async def get_quotes(self, symbols):
+        from exchange.services.price_fetch import yfinance_price
+
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def one(symbol):
+            async with semaphore:
+                try:
+                    return symbol, _to_price(await asyncio.to_thread(yfinance_price, symbol))
+                except Exception:
+                    return symbol, None
+
+        results = await asyncio.gather(*(one(s) for s in symbols))
+        return {symbol: price for symbol, price in results if price is not None}
+
+    async def get_candles(self, symbol, interval="1min", outputsize=50):
+        def fetch():
+            try:
+                import yfinance as yf
+            except ImportError:
+                return []
+            yf_interval = self.YF_INTERVALS.get(interval, "1m")
+            period = "1mo" if yf_interval == "1d" else "5d"
+            hist = yf.Ticker(symbol).history(period=period, interval=yf_interval)
+            if getattr(hist, "empty", True):
+                return []
+            hist = hist.tail(outputsize)
+            return [
+                {
+                    "time": index.strftime("%Y-%m-%d %H:%M:%S"),
+                    "open": float(row["Open"]),
+                    "high": float(row["High"]),
+                    "low": float(row["Low"]),
+                    "close": float(row["Close"]),
+                }
+                for index, row in hist.iterrows()
+            ]
+
+        return await asyncio.to_thread(fetch)
+
+
+class TwelveDataProvider(PriceProvider):
+    BASE_URL = "https://api.twelvedata.com"
+
+    def __init__(self, api_key=None, timeout=5):
+        self.api_key = api_key or settings.TWELVE_DATA_API_KEY
+        self.timeout = timeout
+
+    def _get(self, path, params):
+        import requests
+
+        response = requests.get(
+            f"{self.BASE_URL}/{path}",
+            params=dict(params, apikey=self.api_key),
+            timeout=self.timeout,
+        )
+        return response.json()
+
+    async def get_quotes(self, symbols):
+        symbols = list(symbols)
+        if not symbols:
+            return {}
+        data = await asyncio.to_thread(self._get, "price", {"symbol": ",".join(symbols)})
+        if len(symbols) == 1:
+            data = {symbols[0]: data}
+        quotes = {}
+        for symbol in symbols:
+            row = data.get(symbol) or {}
+            if "price" in row:
+                quotes[symbol] = _to_price(row["price"])
+        return quotes
+
+    async def get_candles(self, symbol, interval="1min", outputsize=50):
+        data = await asyncio.to_thread(
+            self._get, "time_series",
+            {"symbol": symbol, "interval": interval, "outputsize": outputsize},
+        )
+        if "values" not in data:
+            return []
+        return [
+            {
+                "time": row["datetime"],
+                "open": float(row["open"]),
+                "high": float(row["high"]),
+                "low": float(row["low"]),
+                "close": float(row["close"]),
+            }
+            for row in reversed(data["values"])
+        ]
+
+
+def _last_prices(symbols):
+    from exchange.models import Symbol
+
+    return dict(
+        Symbol.objects.filter(name__in=list(symbols), last_price__isnull=False)
+        .values_list("name", "last_price")
+    )
+
+
+class SimulatorProvider(PriceProvider):
+    """
+    Seeded ±0.3% random walk per symbol, starting from the symbol's
+    last_price (or start_price); identical runs for the same seed.
+    """
+
+    def __init__(self, seed=0, start_price="100.00", max_move=0.003):
+        self.seed = seed
+        self.start_price = Decimal(start_price)
+        self.max_move = max_move
+        self._prices = {}
+        self._rngs = {}
+        self._lock = threading.Lock()
+
+    def _rng(self, symbol):
+        rng = self._rngs.get(symbol)
+        if rng is None:
+            rng = self._rngs[symbol] = random.Random(f"{self.seed}:{symbol}")
+        return rng
+
+    def _step(self, price, rng):
+        new_price = price * (Decimal("1.0") + Decimal(rng.uniform(-self.max_move, self.max_move)))
+        return max(new_price, Decimal("1.00")).quantize(Decimal("0.01"))
+
+    async def get_quotes(self, symbols):
+        missing = [s for s in symbols if s not in self._prices]
+        start = await sync_to_async(_last_prices)(missing) if missing else {}
+        with self._lock:
+            for symbol in symbols:
+                price = self._prices.get(symbol) or start.get(symbol) or self.start_price
+                self._prices[symbol] = self._step(price, self._rng(symbol))
+            return {symbol: self._prices[symbol] for symbol in symbols}
+
+    async def get_candles(self, symbol, interval="1min", outputsize=50):
+        rng = random.Random(f"{self.seed}:{symbol}:{interval}")
+        step = timedelta(seconds=INTERVAL_SECONDS.get(interval, 60))
+        start = timezone.now().replace(second=0, microsecond=0) - step * outputsize
+        price = self._prices.get(symbol, self.start_price)
+        candles = []
+        for i in range(outputsize):
+            open_ = price
+            ticks = [open_]
+            for _ in range(4):
+                ticks.append(self._step(ticks[-1], rng))
+            price = ticks[-1]
+            candles.append({
+                "time": (start + step * i).strftime("%Y-%m-%d %H:%M:%S"),
+                "open": float(open_),
+                "high": float(max(ticks)),
+                "low": float(min(ticks)),
+                "close": float(price),
+            })
+        return candles
+
+
+class FileReplayProvider(PriceProvider):
+    """
+    Replays ticks from a CSV file with a header row of time,symbol,price
+    (time in ISO 8601). Every get_quotes call advances each requested symbol
+    by one tick and holds the last tick once the file is exhausted.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or getattr(settings, "PRICE_REPLAY_FILE", None)
+        self._ticks = {}
+        self._cursor = {}
+        self._lock = threading.Lock()
+        if self.path:
+            with open(self.path, newline="") as f:
+                for row in csv.DictReader(f):
+                    self._ticks.setdefault(row["symbol"], []).append(
+                        (datetime.fromisoformat(row["time"]), _to_price(row["price"]))
+                    )
+
+    async def get_quotes(self, symbols):
+        quotes = {}
+        with self._lock:
+            for symbol in symbols:
+                ticks = self._ticks.get(symbol)
+                if not ticks:
+                    continue
+                i = self._cursor.get(symbol, 0)
+                quotes[symbol] = ticks[min(i, len(ticks) - 1)][1]
+                self._cursor[symbol] = i + 1
+        return quotes
+
+    async def get_candles(self, symbol, interval="1min", outputsize=50):
+        seconds = INTERVAL_SECONDS.get(interval, 60)
+        buckets = {}
+        for at, price in self._ticks.get(symbol, []):
+            start = int(at.timestamp()) // seconds * seconds
+            bar = buckets.get(start)
+            if bar is None:
+                buckets[start] = {"open": price, "high": price, "low": price, "close": price}
+            else:
+                bar["high"] = max(bar["high"], price)
+                bar["low"] = min(bar["low"], price)
+                bar["close"] = price
+        return [
+            {
+                "time": datetime.fromtimestamp(start, tz=dt_timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                "open": float(bar["open"]),
+                "high": float(bar["high"]),
+                "low": float(bar["low"]),
+                "close": float(bar["close"]),
+            }
+            for start, bar in sorted(buckets.items())[-outputsize:]
+        ]
+
+
+PROVIDERS = {
+    "yfinance": YFinanceProvider,
+    "twelvedata": TwelveDataProvider,
+    "simulator": SimulatorProvider,
+    "replay": FileReplayProvider,
+}
+
+_provider = None
+_candle_provider = None
+_provider_lock = threading.Lock()
+
+
+def build_price_provider(name):
+    cls = PROVIDERS.get(name)
+    if cls is None:
+        cls = import_string(name)
+    if cls is SimulatorProvider:
+        return cls(seed=getattr(settings, "PRICE_SIMULATOR_SEED", 0))
+    return cls()
+
+
+def get_price_provider():
+    """The process-wide provider selected by settings.PRICE_PROVIDER."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = build_price_provider(getattr(settings, "PRICE_PROVIDER", "yfinance"))
+    return _provider
+
+
+def get_candle_provider():
+    """The process-wide provider selected by settings.CANDLE_PROVIDER."""
+    global _candle_provider
+    if _candle_provider is None:
+        with _provider_lock:
+            if _candle_provider is None:
+                _candle_provider = build_price_provider(getattr(settings, "CANDLE_PROVIDER", "twelvedata"))
+    return _candle_provider
+
+
+def set_price_provider(provider):
+    """Swap the process-wide provider (tests, benchmarks); None re-reads settings."""
+    global _provider
+    with _provider_lock:
+        _provider = provider
@@ -0,0 +1,149 @@
+"""
+In-memory reference prices used for order validation.
+
+Reads never block: place_order gets whatever price is resident. A background
+thread reloads Symbol.last_price from the DB every REFERENCE_PRICE_RELOAD_SECONDS,
+fetches external prices for symbols requested as stale (older than
+REFERENCE_PRICE_MAX_AGE seconds) and bulk-refreshes every symbol every
+PRICE_REFRESH_MINUTES, so no request waits on an HTTP call or holds DB locks
+across one.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class ReferencePrice:
+    __slots__ = ("price", "updated_at")
+
+    def __init__(self, price, updated_at):
+        self.price = price
+        self.updated_at = updated_at  # last external fetch, simulator tick or trade
+
+
+class ReferencePriceService:
+    def __init__(self, reload_interval, max_age, refresh_minutes):
+        self.reload_interval = reload_interval
+        self.max_age = max_age
+        self.refresh_minutes = refresh_minutes
+        self._next_refresh = 0.0
+        self._prices = {}
+        self._stale = set()
+        self._requested = {}  # symbol_name -> monotonic time of last fetch request
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="reference-prices", daemon=True
+                )
+                self._thread.start()
+
+    def get(self, symbol_name):
+        """ReferencePrice or None; never touches the DB or the network."""
+        return self._prices.get(symbol_name)
+
+    def publish(self, symbol_name, price, updated_at=None):
+        """Record a new price (trade, simulator tick, fetch) for symbol_name."""
+        current = self._prices.get(symbol_name)
+        if updated_at is None and current is not None:
+            updated_at = current.updated_at
+        self._prices[symbol_name] = ReferencePrice(price, updated_at)
+
+    def request_refresh(self, symbol_name):
+        """Ask the background thread to fetch symbol_name soon (at most once per max_age)."""
+        now = time.monotonic()
+        with self._lock:
+            last = self._requested.get(symbol_name)
+            if last is not None and now - last < self.max_age:
+                return
+            self._requested[symbol_name] = now
+            self._stale.add(symbol_name)
+        self._wake.set()
+
+    def reload(self):
+        from exchange.models import Symbol
+
+        rows = Symbol.objects.values_list("name", "last_price", "last_price_updated_at")
+        for name, price, updated_at in rows:
+            if price is not None:
+                self._prices[name] = ReferencePrice(price, updated_at)
+
+    def fetch_stale(self):
+        from exchange.services.price_fetch import update_symbol_prices
+
+        with self._lock:
+            stale, self._stale = self._stale, set()
+        if stale:
+            update_symbol_prices(cache_minutes=self.max_age / 60, names=stale)
+
+    def refresh_all(self):
+        from exchange.services.price_fetch import update_symbol_prices
+
+        if time.monotonic() < self._next_refresh:
+            return
+        self._next_refresh = time.monotonic() + self.refresh_minutes * 60
+        update_symbol_prices(cache_minutes=self.refresh_minutes)
+
+    def _run(self):
+        while True:
+            close_old_connections()
+            try:
+                self.refresh_all()
+                self.fetch_stale()
+                self.reload()
+            except Exception:
+                logger.exception("Reference price refresh failed")
+            self._wake.wait(self.reload_interval)
+            self._wake.clear()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_reference_price_service():
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = ReferencePriceService(
+                    reload_interval=getattr(settings, "REFERENCE_PRICE_RELOAD_SECONDS", 5),
+                    max_age=getattr(settings, "REFERENCE_PRICE_MAX_AGE", 60),
+                    refresh_minutes=getattr(settings, "PRICE_REFRESH_MINUTES", 60),
+                )
+    return _service
+
+
+def reference_price(symbol):
+    """
+    Market price to validate an order for symbol against. Falls back to the
+    row's last_price until the service has loaded, and schedules a background
+    fetch when the price is missing or older than REFERENCE_PRICE_MAX_AGE.
+    """
+    from django.utils import timezone
+
+    service = get_reference_price_service()
+    service.start()
+    ref = service.get(symbol.name)
+    if ref is None:
+        ref = ReferencePrice(symbol.last_price, symbol.last_price_updated_at)
+    if (
+        ref.price is None
+        or ref.updated_at is None
+        or (timezone.now() - ref.updated_at).total_seconds() > service.max_age
+    ):
+        service.request_refresh(symbol.name)
+    return ref
+
+
+def publish_reference_price(symbol_name, price, updated_at=None):
+    get_reference_price_service().publish(symbol_name, price, updated_at)
@@ -0,0 +1,107 @@
+"""
+Single-writer order intake, one sequencer thread per symbol.
+
+Every order, cancel and replace for a symbol is queued to that symbol's thread and
+executed there one at a time, so the resident book has exactly one writer and
+requests for different symbols never wait on each other's matching.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from exchange.services.metrics import observe
+
+
+class SymbolSequencer:
+    def __init__(self, key):
+        self.key = key
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name=f"sequencer-{key}", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self._queue.put((future, fn, args, kwargs, time.perf_counter()))
+        return future
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            future, fn, args, kwargs, queued_at = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            observe("sequencer", "queue_wait", time.perf_counter() - queued_at)
+            close_old_connections()
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+            finally:
+                close_old_connections()
+
+
+_sequencers = {}
+_sequencers_lock = threading.Lock()
+
+
+def get_sequencer(symbol_id):
+    """
+    The sequencer of an existing Symbol (by pk). Threads are never stopped, so
+    callers resolve the symbol first: a made-up name must not start one.
+    """
+    sequencer = _sequencers.get(symbol_id)
+    if sequencer is None:
+        with _sequencers_lock:
+            sequencer = _sequencers.get(symbol_id)
+            if sequencer is None:
+                sequencer = _sequencers[symbol_id] = SymbolSequencer(symbol_id)
+    return sequencer
+
+
+def submit_order(user, symbol, side, price, quantity):
+    """Queue place_order on the Symbol's sequencer; returns a Future."""
+    from exchange.services.exchange_service import place_order
+
+    return get_sequencer(symbol.pk).submit(
+        place_order,
+        user=user,
+        symbol_name=symbol.name,
+        side=side,
+        price=price,
+        quantity=quantity,
+    )
+
+
+def submit_replace(user, order_id, symbol, side, price, quantity):
+    """Queue replace_order on the Symbol's sequencer; returns a Future."""
+    from exchange.services.exchange_service import replace_order
+
+    return get_sequencer(symbol.pk).submit(
+        replace_order, user, order_id, symbol.name, side, price, quantity
+    )
+
+
+def submit_cancel(user, order_id):
+    """
+    Queue cancel_order on the order's symbol sequencer; returns a Future.
+    Raises Order.DoesNotExist for an unknown order_id.
+    """
+    from exchange.models import Order
+    from exchange.services.exchange_service import cancel_order
+
+    symbol_id = Order.objects.values_list("symbol_id", flat=True).get(id=order_id)
+    return get_sequencer(symbol_id).submit(cancel_order, user, order_id)
+
+
+def sequencer_timeout():
+    return getattr(settings, "ORDER_SEQUENCER_TIMEOUT", 10)
@@ -1,58 +1,96 @@
+from collections import defaultdict
+from decimal import Decimal
 from django.db import transaction
-from exchange.models import Portfolio, Holding
-from exchange.channel_events import broadcast_orderbook, broadcast_prices
+from exchange.models import Portfolio, Holding, Trade
+from exchange.channel_events import (
+    schedule_candles_broadcast,
+    schedule_prices_broadcast,
+    schedule_trades_broadcast,
+)
+from exchange.services.candles import record_trades, candle_payload
+from exchange.services.market_stream import trade_payload
+from exchange.services.reference_prices import publish_reference_price
 from django.utils import timezone
 
+
 @transaction.atomic
-def settle_trade(trade):
+def settle_trades(trades):
+    """
+    Settle every trade produced by one match_order call.
 
-    buyer = trade.buy_order.user
-    seller = trade.sell_order.user
-    symbol = trade.buy_order.symbol
+    trades: unsaved Trade instances with buy_order/sell_order, buyer/seller
+    and symbol set, all for the same symbol. Balance and share movements are netted per user and per
+    (user, symbol), each row is locked once in user-id order and written back
+    with bulk_update; the trades themselves are inserted with one bulk_create
+    and rolled into the symbol's candles.
+    """
+    if not trades:
+        return []
 
-    trade_quantity = trade.quantity
-    trade_price = trade.price
-    buyer_order_price = trade.buy_order.price
+    symbol = trades[0].symbol
 
-    buyer_portfolio = Portfolio.objects.select_for_update().get(user=buyer)
-    seller_portfolio = Portfolio.objects.select_for_update().get(user=seller)
+    balance = defaultdict(lambda: [Decimal("0"), Decimal("0")])  # user_id -> [available, reserved]
+    shares = defaultdict(lambda: [0, 0])  # user_id -> [available, reserved]
 
-    reserved_amount = buyer_order_price * trade_quantity
-    actual_cost = trade_price * trade_quantity
-    refund = reserved_amount - actual_cost
+    for trade in trades:
+        buyer_id = trade.buyer_id
+        seller_id = trade.seller_id
 
-    # Buyer money
-    buyer_portfolio.reserved_balance -= reserved_amount
-    buyer_portfolio.available_balance += refund
+        reserved_amount = trade.buy_order.price * trade.quantity
+        actual_cost = trade.price * trade.quantity
 
-    # Buyer shares
-    buyer_holding, _ = Holding.objects.select_for_update().get_or_create(
-        user=buyer,
-        symbol=symbol
-    )
-    buyer_holding.available_quantity += trade_quantity
+        # Buyer money: release the reservation, refund price improvement
+        balance[buyer_id][1] -= reserved_amount
+        balance[buyer_id][0] += reserved_amount - actual_cost
+        # Seller money
+        balance[seller_id][0] += actual_cost
+
+        # Shares
+        shares[buyer_id][0] += trade.quantity
+        shares[seller_id][1] -= trade.quantity
 
-    # Seller shares
-    seller_holding = Holding.objects.select_for_update().get(
-        user=seller,
-        symbol=symbol
+    portfolios = list(
+        Portfolio.objects.select_for_update()
+        .filter(user_id__in=balance.keys())
+        .order_by("user_id")
     )
-    seller_holding.reserved_quantity -= trade_quantity
+    for portfolio in portfolios:
+        available, reserved = balance[portfolio.user_id]
+        portfolio.available_balance += available
+        portfolio.reserved_balance += reserved
 
-    # Seller money
-    seller_portfolio.available_balance += actual_cost
+    Holding.objects.bulk_create(
+        [Holding(user_id=user_id, symbol=symbol) for user_id in shares],
+        ignore_conflicts=True,
+    )
+    holdings = list(
+        Holding.objects.select_for_update()
+        .filter(symbol=symbol, user_id__in=shares.keys())
+        .order_by("user_id")
+    )
+    for holding in holdings:
+        available, reserved = shares[holding.user_id]
+        holding.available_quantity += available
+        holding.reserved_quantity += reserved
 
     # Save financial state first
-    buyer_portfolio.save()
-    seller_portfolio.save()
-    buyer_holding.save()
-    seller_holding.save()
+    Portfolio.objects.bulk_update(portfolios, ["available_balance", "reserved_balance"])
+    Holding.objects.bulk_update(holdings, ["available_quantity", "reserved_quantity"])
+    created = Trade.objects.bulk_create(trades)
+    candles = record_trades(symbol, created)
 
     # Update market price last
-    symbol.last_price = trade_price
+    symbol.last_price = trades[-1].price
     symbol.last_price_updated_at = timezone.now()
     symbol.save(update_fields=["last_price", "last_price_updated_at"])
+    transaction.on_commit(lambda: publish_reference_price(
+        symbol.name, symbol.last_price, symbol.last_price_updated_at
+    ))
+
+    # Broadcast once the transaction has committed; book changes go out as
+    # L2 deltas from place_order.
+    schedule_prices_broadcast()
+    schedule_candles_broadcast([candle_payload(c) for c in candles])
+    schedule_trades_broadcast(symbol.name, [trade_payload(t, symbol.name) for t in created])
 
-    # Broadcast after everything committed
-    broadcast_orderbook(symbol.name)
-    broadcast_prices()
+    return created
@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from exchange.models import ArchivedOrder, ArchivedTrade, Order, Trade
+from exchange.services.archive import archive_history
+from exchange.services.exchange_service import place_order
+
+from .utils import MarketMixin
+
+
+class ArchiveTests(MarketMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = self.make_user("seller", shares=100)
+        self.buyer = self.make_user("buyer")
+        self.sell = place_order(self.seller, "TST", "SELL", "100", 5)
+        self.buy = place_order(self.buyer, "TST", "BUY", "100", 5)
+        self.resting = place_order(self.seller, "TST", "SELL", "105", 1)
+        old = timezone.now() - timedelta(days=30)
+        Order.objects.update(created_at=old)
+        Trade.objects.update(created_at=old)
+
+    def test_moves_trades_then_their_orders(self):
+        trade = Trade.objects.get()
+        self.assertEqual(archive_history(), (1, 2))
+
+        self.assertFalse(Trade.objects.exists())
+        archived = ArchivedTrade.objects.get(id=trade.id)
+        self.assertEqual(
+            (archived.buy_order_id, archived.sell_order_id, archived.buyer_id, archived.seller_id,
+             archived.aggressor_side, archived.quantity),
+            (self.buy.id, self.sell.id, self.buyer.id, self.seller.id, "BUY", 5),
+        )
+        self.assertEqual(set(ArchivedOrder.objects.values_list("id", flat=True)), {self.buy.id, self.sell.id})
+        # Resting orders stay live.
+        self.assertEqual(list(Order.objects.values_list("id", flat=True)), [self.resting.id])
+
+    def test_recent_history_stays(self):
+        Trade.objects.update(created_at=timezone.now())
+        self.assertEqual(archive_history(), (0, 0))
+
+    def test_dry_run_counts_only(self):
+        self.assertEqual(archive_history(dry_run=True), (1, 0))
+        self.assertTrue(Trade.objects.exists())
@@ -0,0 +1,85 @@
+"""
+Small, fast runs of the bench_exchange flow. They fail when the order path
+starts erroring, needs noticeably more queries per order, or its p50/p99
+latencies (as bench_exchange reports them) blow well past their budgets;
+run `manage.py bench_exchange` for real latency and throughput numbers.
+"""
+from django.test import TransactionTestCase
+
+from exchange.services.benchmark import (
+    ApiDriver,
+    ServiceDriver,
+    generate_flow,
+    run_flow,
+    setup_market,
+    teardown_market,
+)
+from exchange.services.limit_book import reset_books
+
+from .utils import isolate_background_work
+
+# Currently about 13.5 with the default mix; leaves room for noise, not for
+# an extra query per fill.
+QUERIES_PER_ORDER_BUDGET = 16
+
+# (p50, p99) milliseconds per operation on the service path. Currently about
+# (12, 45) for place, (4, 11) for cancel and (0.6, 2.5) for book on SQLite;
+# the budgets catch an order-of-magnitude regression, not noise.
+LATENCY_BUDGET_MS = {
+    "place": (50, 250),
+    "cancel": (25, 100),
+    "book": (10, 50),
+}
+
+
+class GenerateFlowTests(TransactionTestCase):
+    def test_reproducible_mix(self):
+        symbols = [("BENCH0", "100.00"), ("BENCH1", "50.00")]
+        ops = generate_flow(symbols, 10, 500, rate=1000, cancel_ratio=0.2, book_ratio=0.1, seed=7)
+        again = generate_flow(symbols, 10, 500, rate=1000, cancel_ratio=0.2, book_ratio=0.1, seed=7)
+        self.assertEqual([(o.at, o.kind, o.price) for o in ops], [(o.at, o.kind, o.price) for o in again])
+
+        kinds = [op.kind for op in ops]
+        self.assertEqual(kinds.count("place"), 500)
+        self.assertTrue(50 < kinds.count("cancel") < 150)
+        self.assertEqual([op.at for op in ops], sorted(op.at for op in ops))
+        for op in ops:
+            if op.kind == "cancel":
+                self.assertEqual(ops[op.ref].kind, "place")
+            if op.kind == "place":
+                last_price = dict(symbols)[op.symbol]
+                self.assertLessEqual(abs(float(op.price) / float(last_price) - 1), 0.1)
+
+
+class OrderPathBenchmarkTests(TransactionTestCase):
+    def setUp(self):
+        reset_books()
+        isolate_background_work(self)
+        self.symbols, self.users = setup_market(2, 10)
+        self.addCleanup(teardown_market)
+        self.ops = generate_flow(
+            [(s.name, s.last_price) for s in self.symbols], len(self.users), 200,
+            cancel_ratio=0.2, book_ratio=0.1, seed=1,
+        )
+
+    def run_driver(self, driver):
+        results = run_flow(self.ops, driver, self.users, {s.name: s for s in self.symbols})
+        summary = results.summary()
+        for kind, stats in summary["ops"].items():
+            self.assertEqual(stats["errors"], 0, kind)
+        self.assertEqual(summary["ops"]["place"]["rejected"], 0)
+        self.assertGreater(summary["trades"], 0)
+        return summary
+
+    def test_service_path(self):
+        summary = self.run_driver(ServiceDriver())
+        self.assertLessEqual(summary["queries_per_order"], QUERIES_PER_ORDER_BUDGET)
+        for kind, (p50, p99) in LATENCY_BUDGET_MS.items():
+            stats = summary["ops"][kind]
+            self.assertLessEqual(stats["p50_ms"], p50, kind)
+            self.assertLessEqual(stats["p99_ms"], p99, kind)
+
+    def test_api_path(self):
+        # Cancels of already filled orders are rejected and logged by the view.
+        with self.assertLogs("exchange.views", "WARNING"):
+            self.run_driver(ApiDriver())
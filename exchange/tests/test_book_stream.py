@@ -0,0 +1,88 @@
+import asyncio
+from decimal import Decimal
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from exchange.consumers import BookStream, shared_book_snapshot
+from exchange.services.frames import book_delta_message, encode
+
+
+def level(price, quantity):
+    return {"price": price, "total_quantity": quantity}
+
+
+def delta_event(prev_seq, seq, bids=(), asks=()):
+    """An orderbook_delta event as channel_events.broadcast_orderbook_delta sends it."""
+    delta = {"prev_seq": prev_seq, "seq": seq, "bids": list(bids), "asks": list(asks)}
+    return {"prev_seq": prev_seq, "seq": seq, "frame": encode(book_delta_message("TST", delta))}
+
+
+BOOK = {
+    "symbol": "TST",
+    "seq": 3,
+    "bids": [level("99.90", 1), level("99.40", 2), level("98.80", 4)],
+    "asks": [level("100.10", 5), level("100.60", 6)],
+}
+
+
+class BookStreamTests(SimpleTestCase):
+    def test_depth_view(self):
+        stream = BookStream("TST", depth=1)
+        message = stream.snapshot(BOOK)
+        self.assertEqual(message["bids"], [level("99.90", 1)])
+        self.assertEqual(message["asks"], [level("100.10", 5)])
+        self.assertEqual(message["seq"], 3)
+
+    def test_tick_view_rounds_away_from_the_spread(self):
+        stream = BookStream("TST", tick=Decimal("1"))
+        message = stream.snapshot(BOOK)
+        self.assertEqual(message["bids"], [level("99.00", 3), level("98.00", 4)])
+        self.assertEqual(message["asks"], [level("101.00", 11)])
+
+    def test_delta_mode_view_sends_only_visible_changes(self):
+        stream = BookStream("TST", mode="delta", depth=1)
+        stream.snapshot(BOOK)
+        # A change below the visible level: nothing to send.
+        message, resync = stream.delta(delta_event(3, 4, bids=[["98.80", 9]]))
+        self.assertEqual((message, resync), (None, False))
+        # A better bid replaces the top level.
+        message, resync = stream.delta(delta_event(4, 5, bids=[["100.00", 7]]))
+        self.assertFalse(resync)
+        self.assertEqual((message["prev_seq"], message["seq"]), (3, 5))
+        self.assertEqual(message["bids"], [["100.00", 7], ["99.90", 0]])
+
+    def test_gap_needs_snapshot(self):
+        stream = BookStream("TST", mode="delta", depth=5)
+        stream.snapshot(BOOK)
+        self.assertEqual(
+            stream.delta(delta_event(7, 8)), (None, True)
+        )
+
+    def test_stale_delta_is_skipped(self):
+        stream = BookStream("TST", mode="delta")
+        stream.snapshot(BOOK, frame="snapshot-frame")
+        self.assertEqual(stream.delta(delta_event(2, 3)), (None, False))
+        event = delta_event(3, 4)
+        self.assertEqual(stream.delta(event), (event["frame"], False))
+
+    def test_plain_mode_asks_for_the_full_book(self):
+        stream = BookStream("TST")
+        self.assertEqual(stream.snapshot(BOOK, frame="snapshot-frame"), "snapshot-frame")
+        self.assertEqual(stream.delta(delta_event(3, 4)), (None, True))
+        self.assertEqual(stream.snapshot(dict(BOOK, seq=4), frame="book-frame"), "book-frame")
+
+
+class SharedBookSnapshotTests(SimpleTestCase):
+    async def test_connections_share_one_load_per_change(self):
+        seqs = iter([4, 5])
+        with mock.patch(
+            "exchange.services.orderbook.order_book_snapshot", side_effect=lambda name: dict(BOOK, seq=next(seqs))
+        ) as load:
+            first = await asyncio.gather(*(shared_book_snapshot("TST", 4) for _ in range(3)))
+            self.assertEqual(load.call_count, 1)
+            self.assertEqual({book["seq"] for book, _ in first}, {4})
+            book, _ = await shared_book_snapshot("TST", 4)  # still current
+            self.assertEqual((book["seq"], load.call_count), (4, 1))
+            book, _ = await shared_book_snapshot("TST", 5)
+            self.assertEqual((book["seq"], load.call_count), (5, 2))
@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from exchange import channel_events
+from exchange.channel_events import BroadcastScheduler
+from exchange.services.frames import decode
+
+
+class BroadcastSchedulerTests(SimpleTestCase):
+    def setUp(self):
+        # Flushed by hand instead of by the background thread.
+        patcher = mock.patch("exchange.channel_events.threading.Thread")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.scheduler = BroadcastScheduler(interval=1)
+
+    def flush(self):
+        with mock.patch("exchange.channel_events.broadcast_orderbook_delta") as send, \
+             mock.patch("exchange.channel_events.broadcast_orderbook") as send_book:
+            self.scheduler.flush()
+        return [call.args[1] for call in send.call_args_list], send_book
+
+    def test_consecutive_deltas_merge(self):
+        self.scheduler.mark("TST", delta={"prev_seq": 0, "seq": 1, "bids": [["99.00", 5]], "asks": [["101.00", 3]]})
+        self.scheduler.mark("TST", delta={"prev_seq": 1, "seq": 2, "bids": [["99.00", 0], ["98.00", 1]], "asks": []})
+        deltas, _ = self.flush()
+        self.assertEqual(deltas, [{
+            "prev_seq": 0,
+            "seq": 2,
+            "bids": [["99.00", 0], ["98.00", 1]],
+            "asks": [["101.00", 3]],
+        }])
+
+    def test_gap_keeps_deltas_apart(self):
+        self.scheduler.mark("TST", delta={"prev_seq": 0, "seq": 1, "bids": [], "asks": [["101.00", 3]]})
+        self.scheduler.mark("TST", delta={"prev_seq": 5, "seq": 6, "bids": [], "asks": [["101.00", 1]]})
+        deltas, _ = self.flush()
+        self.assertEqual([(d["prev_seq"], d["seq"]) for d in deltas], [(0, 1), (5, 6)])
+
+    def test_flush_empties_pending(self):
+        self.scheduler.mark("TST")
+        _, send_book = self.flush()
+        send_book.assert_called_once_with("TST")
+        deltas, send_book = self.flush()
+        self.assertEqual(deltas, [])
+        send_book.assert_not_called()
+
+
+class BroadcastMessageTests(SimpleTestCase):
+    """Messages carry the encoded frame and routing scalars, not the payload again."""
+
+    def sent(self, broadcast, *args):
+        layer = mock.Mock(group_send=mock.AsyncMock())
+        with mock.patch("channels.layers.get_channel_layer", return_value=layer):
+            broadcast(*args)
+        group, message = layer.group_send.call_args.args
+        return group, message
+
+    def test_trades(self):
+        trades = [{"id": 7, "symbol": "TST"}, {"id": 9, "symbol": "TST"}]
+        group, message = self.sent(channel_events.broadcast_trades, "TST", trades)
+        self.assertEqual(group, "trades_TST")
+        self.assertEqual(
+            {k: v for k, v in message.items() if k != "frame"},
+            {"type": "trades_update", "symbol": "TST", "first_id": 7, "last_id": 9},
+        )
+        self.assertEqual(decode(message["frame"])["trades"], trades)
+
+    def test_delta(self):
+        delta = {"prev_seq": 3, "seq": 4, "bids": [["99.00", 1]], "asks": []}
+        _, message = self.sent(channel_events.broadcast_orderbook_delta, "TST", delta)
+        self.assertEqual(set(message), {"type", "symbol", "prev_seq", "seq", "frame"})
+        self.assertEqual(decode(message["frame"])["bids"], [["99.00", 1]])
+
+    def test_prices(self):
+        _, message = self.sent(channel_events.broadcast_prices, [{"symbol": "TST", "price": "1.00"}])
+        self.assertEqual(set(message), {"type", "frame"})
@@ -0,0 +1,81 @@
+import json
+from unittest import mock
+
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, override_settings
+
+from exchange.consumers import BookStream, BufferedConsumer, MarketConsumer
+
+
+class FeedConsumer(BufferedConsumer):
+    async def connect(self):
+        await self.accept()
+        self.queue_frame(json.dumps({"hello": 1}), "feed")
+
+
+@override_settings(WS_PING_INTERVAL_SECONDS=0.05, WS_MAX_LAG_SECONDS=0.3)
+class BufferedConsumerPingTests(SimpleTestCase):
+    async def connect(self):
+        communicator = WebsocketCommunicator(FeedConsumer.as_asgi(), "/ws/feed/")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_client_that_stops_reading_is_closed(self):
+        # The communicator buffers every frame like Daphne does, so the send
+        # queue never backs up; only the unanswered ping gives the client away.
+        communicator = await self.connect()
+        messages = []
+        while True:
+            message = await communicator.receive_output(timeout=2)
+            if message["type"] == "websocket.close":
+                break
+            messages.append(json.loads(message["text"]))
+        self.assertEqual(message["code"], 4008)
+        self.assertEqual(messages[0], {"hello": 1})
+        self.assertEqual(messages[1:], [{"type": "ping", "id": 1}])
+        await communicator.wait()
+
+    async def test_client_that_answers_pings_stays_connected(self):
+        communicator = await self.connect()
+        pings = 0
+        while pings < 10:
+            message = await communicator.receive_json_from(timeout=2)
+            if message.get("type") == "ping":
+                pings += 1
+                await communicator.send_json_to({"action": "pong", "id": message["id"]})
+        await communicator.disconnect()
+
+
+@override_settings(WS_SEND_QUEUE_LIMIT=3)
+class MarketOverflowTests(SimpleTestCase):
+    def consumer(self):
+        consumer = MarketConsumer()
+        consumer._writer = mock.Mock()  # keep frames queued
+        consumer.books["TST"] = BookStream("TST", mode="delta")
+        consumer.subscriptions[("book", "TST")] = ("TST", {}, "orderbook_TST")
+        consumer.subscriptions[("trades", "TST")] = ("TST", {}, "trades_TST")
+        consumer.resync_books = mock.AsyncMock()
+        return consumer
+
+    def queued(self, consumer):
+        return [(group, frame) for _, frame, group in consumer.outbox.values()]
+
+    async def test_book_frames_go_first(self):
+        consumer = self.consumer()
+        await consumer.emit("delta-1", "orderbook_TST")
+        await consumer.emit("trades-1", "trades_TST")
+        await consumer.emit("delta-2", "orderbook_TST")
+        await consumer.emit("trades-2", "trades_TST")
+        self.assertEqual(self.queued(consumer), [("trades_TST", "trades-1"), ("trades_TST", "trades-2")])
+        consumer.resync_books.assert_awaited_once_with(["TST"])
+
+    async def test_lost_trades_get_a_gap_notice(self):
+        consumer = self.consumer()
+        for i in range(4):
+            await consumer.emit(f"trades-{i}", "trades_TST")
+        queued = self.queued(consumer)
+        self.assertEqual([frame for _, frame in queued[:2]], ["trades-1", "trades-2"])
+        self.assertEqual(json.loads(queued[2][1]), {"type": "gap", "channel": "trades", "symbols": ["TST"]})
+        self.assertEqual(queued[3][1], "trades-3")
+        consumer.resync_books.assert_not_awaited()
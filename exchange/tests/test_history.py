@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from exchange.models import ArchivedOrder, Order
+
+from .utils import MarketMixin
+
+
+class KeysetPaginationTests(MarketMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user("trader")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        now = timezone.now()
+        orders = [
+            Order.objects.create(user=self.user, symbol=self.symbol, side="BUY", price="99", quantity=1)
+            for _ in range(5)
+        ]
+        # Two pairs share a created_at, so the id breaks the tie.
+        for order, created_at in zip(orders, [now, now, now + timedelta(seconds=1), now + timedelta(seconds=1), now + timedelta(seconds=2)]):
+            Order.objects.filter(pk=order.pk).update(created_at=created_at)
+        ArchivedOrder.objects.create(
+            id=10_000, user=self.user, symbol=self.symbol, side="SELL", price="101", quantity=1,
+            status="FILLED", created_at=now - timedelta(days=30),
+        )
+        self.expected = [orders[4].id, orders[3].id, orders[2].id, orders[1].id, orders[0].id]
+
+    def pages(self, params):
+        ids, cursor = [], None
+        while True:
+            query = dict(params, **({"cursor": cursor} if cursor else {}))
+            response = self.client.get("/api/orders/", query)
+            self.assertEqual(response.status_code, 200)
+            ids += [row["id"] for row in response.data["results"]]
+            cursor = response.data["next_cursor"]
+            if cursor is None:
+                return ids
+
+    def test_pages_are_newest_first_without_gaps(self):
+        self.assertEqual(self.pages({"limit": 2}), self.expected)
+
+    def test_archived_rows_follow_live_ones(self):
+        self.assertEqual(self.pages({"limit": 4, "include_archived": "true"}), self.expected + [10_000])
+
+    def test_bad_cursor(self):
+        response = self.client.get("/api/orders/", {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from exchange.models import WorkerLease
+from exchange.services.leader import Lease
+
+
+class LeaseTests(TestCase):
+    def test_single_leader(self):
+        a = Lease("job", ttl=30, owner="a")
+        b = Lease("job", ttl=30, owner="b")
+        self.assertTrue(a.acquire())
+        self.assertFalse(b.acquire())
+        self.assertTrue(a.acquire())  # renewal
+        self.assertEqual(WorkerLease.objects.get(name="job").owner, "a")
+
+    def test_release_hands_over(self):
+        a = Lease("job", owner="a")
+        b = Lease("job", owner="b")
+        a.acquire()
+        a.release()
+        self.assertTrue(b.acquire())
+        self.assertFalse(a.acquire())
+
+    def test_expired_lease_is_taken(self):
+        a = Lease("job", owner="a")
+        a.acquire()
+        WorkerLease.objects.filter(name="job").update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(Lease("job", owner="b").acquire())
+
+    def test_leases_are_independent(self):
+        self.assertTrue(Lease("one", owner="a").acquire())
+        self.assertTrue(Lease("two", owner="b").acquire())
+
+    def test_lease_expiry_uses_database_time(self):
+        Lease("job", ttl=30, owner="a").acquire()
+        expires_at = WorkerLease.objects.get(name="job").expires_at
+        self.assertAlmostEqual((expires_at - timezone.now()).total_seconds(), 30, delta=5)
+
+
+class MarketWorkerCommandTests(TestCase):
+    @override_settings(CHANNEL_LAYER="memory")
+    def test_refuses_in_memory_layer(self):
+        # Its broadcasts could not reach the web process's clients.
+        with self.assertRaises(CommandError):
+            call_command("run_market_worker")
@@ -0,0 +1,31 @@
+from datetime import timedelta
+from unittest import mock
+
+import numpy as np
+from django.test import TestCase
+from django.utils import timezone
+
+from exchange.models import Symbol
+from exchange.services.market_simulator import simulation_tick
+from exchange.services.reference_prices import get_reference_price_service, reference_price
+
+from .utils import MarketMixin
+
+
+class SimulationTickTests(MarketMixin, TestCase):
+    def test_tick_prices_are_fresh_reference_prices(self):
+        Symbol.objects.filter(pk=self.symbol.pk).update(
+            last_price_updated_at=timezone.now() - timedelta(days=1)
+        )
+        with mock.patch("exchange.services.market_simulator.broadcast_prices"):
+            data = simulation_tick(np.random.default_rng(1))
+        (tick,) = [row for row in data if row["symbol"] == "TST"]
+
+        symbol = Symbol.objects.get(pk=self.symbol.pk)
+        self.assertEqual(str(symbol.last_price), tick["price"])
+        self.assertLess(timezone.now() - symbol.last_price_updated_at, timedelta(minutes=1))
+        with mock.patch.object(get_reference_price_service(), "request_refresh") as refresh:
+            ref = reference_price(symbol)
+        self.assertEqual(str(ref.price), tick["price"])
+        self.assertEqual(ref.updated_at, symbol.last_price_updated_at)
+        refresh.assert_not_called()
@@ -0,0 +1,16 @@
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from exchange.models import Symbol
+from exchange.services.market_stream import resolve_symbols
+
+
+class ResolveSymbolsTests(TestCase):
+    def test_names_match_case_insensitively(self):
+        upper = Symbol.objects.create(name="TST", last_price=Decimal("100.00"), last_price_updated_at=timezone.now())
+        mixed = Symbol.objects.create(name="brk.b", last_price=Decimal("400.00"), last_price_updated_at=timezone.now())
+        with self.assertNumQueries(1):
+            symbols = resolve_symbols(["tst", " BRK.B ", "missing"])
+        self.assertEqual(symbols, {"TST": upper, "BRK.B": mixed})
@@ -0,0 +1,98 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from exchange.models import Order, Trade
+from exchange.services.exchange_service import cancel_order, place_order, replace_order
+from exchange.services.limit_book import get_book
+from exchange.services.orderbook import order_book_snapshot
+
+from .utils import MarketMixin
+
+
+class MatchingTests(MarketMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.maker1 = self.make_user("maker1", shares=100)
+        self.maker2 = self.make_user("maker2", shares=100)
+        self.taker = self.make_user("taker")
+
+    def test_price_time_priority(self):
+        far = place_order(self.maker1, "TST", "SELL", "101", 10)
+        first = place_order(self.maker1, "TST", "SELL", "100", 5)
+        second = place_order(self.maker2, "TST", "SELL", "100", 5)
+
+        order = place_order(self.taker, "TST", "BUY", "101", 12)
+
+        trades = list(Trade.objects.order_by("id"))
+        self.assertEqual(
+            [(t.sell_order_id, t.price, t.quantity) for t in trades],
+            [(first.id, Decimal("100.00"), 5), (second.id, Decimal("100.00"), 5), (far.id, Decimal("101.00"), 2)],
+        )
+        self.assertTrue(all(t.aggressor_side == "BUY" for t in trades))
+        order.refresh_from_db()
+        self.assertEqual(order.status, "FILLED")
+        far.refresh_from_db()
+        self.assertEqual((far.status, far.remaining_quantity), ("PARTIAL", 8))
+        book = order_book_snapshot("TST")
+        self.assertEqual(book["asks"], [{"price": "101.00", "total_quantity": 8}])
+        self.assertEqual(book["bids"], [])
+
+    def test_no_cross_rests(self):
+        place_order(self.maker1, "TST", "SELL", "101", 10)
+        order = place_order(self.taker, "TST", "BUY", "100", 3)
+        self.assertEqual(order.status, "OPEN")
+        self.assertFalse(Trade.objects.exists())
+        self.assertEqual(get_book(self.symbol).bids.best().total_quantity, 3)
+
+    def test_cancel_removes_from_book(self):
+        order = place_order(self.maker1, "TST", "SELL", "101", 10)
+        cancel_order(self.maker1, order.id)
+        self.assertEqual(Order.objects.get(id=order.id).status, "CANCELED")
+        self.assertIsNone(get_book(self.symbol).asks.best())
+        with self.assertRaises(ValueError):
+            cancel_order(self.maker1, order.id)
+
+    def test_rejects_unknown_symbol_and_bad_quantity(self):
+        with self.assertRaises(ValueError):
+            place_order(self.taker, "NOPE", "BUY", "100", 1)
+        with self.assertRaises(ValueError):
+            place_order(self.taker, "TST", "BUY", "100", 0)
+
+
+class CounterpartyTests(MarketMixin, TestCase):
+    def test_makers_an_order_would_hit(self):
+        from exchange.services.matching_engine import counterparty_user_ids
+
+        maker1 = self.make_user("maker1", shares=100)
+        maker2 = self.make_user("maker2", shares=100)
+        maker3 = self.make_user("maker3", shares=100)
+        place_order(maker1, "TST", "SELL", "100", 5)
+        place_order(maker2, "TST", "SELL", "100", 5)
+        place_order(maker3, "TST", "SELL", "102", 5)
+        book = get_book(self.symbol)
+
+        self.assertEqual(counterparty_user_ids(book, "BUY", Decimal("100"), 5), {maker1.id})
+        self.assertEqual(counterparty_user_ids(book, "BUY", Decimal("101"), 20), {maker1.id, maker2.id})
+        self.assertEqual(counterparty_user_ids(book, "BUY", Decimal("102"), 11), {maker1.id, maker2.id, maker3.id})
+        self.assertEqual(counterparty_user_ids(book, "BUY", Decimal("99"), 5), set())
+        self.assertEqual(counterparty_user_ids(book, "SELL", Decimal("90"), 5), set())
+
+
+class ReplaceOrderLockTests(MarketMixin, TestCase):
+    def test_all_portfolios_locked_before_the_cancel(self):
+        quoter = self.make_user("quoter", shares=100)
+        maker = self.make_user("maker", shares=100)
+        quote = place_order(quoter, "TST", "SELL", "100", 5)
+        place_order(maker, "TST", "SELL", "101", 5)
+
+        # Once its own quote is gone the new BUY reaches the maker, whose
+        # portfolio must be in the first, user_id-ordered lock.
+        with CaptureQueriesContext(connection) as queries:
+            replace_order(quoter, quote.id, "TST", "BUY", "101", 5)
+        portfolio_queries = [q["sql"] for q in queries if 'FROM "exchange_portfolio"' in q["sql"]]
+        locked = portfolio_queries[0].split(" IN (")[1].split(")")[0]
+        self.assertEqual({int(i) for i in locked.split(",")}, {quoter.id, maker.id})
+        self.assertEqual(Trade.objects.filter(buyer=quoter, seller=maker).count(), 1)
@@ -0,0 +1,30 @@
+from django.test import SimpleTestCase, override_settings
+
+from exchange.services import price_providers
+from exchange.services.price_providers import (
+    PriceProvider,
+    SimulatorProvider,
+    TwelveDataProvider,
+    get_candle_provider,
+)
+
+
+class PriceProviderTests(SimpleTestCase):
+    def test_get_quotes_is_abstract(self):
+        class CandlesOnly(PriceProvider):
+            async def get_candles(self, symbol, interval="1min", outputsize=50):
+                return []
+
+        with self.assertRaises(TypeError):
+            CandlesOnly()
+
+    def test_candles_default_to_twelve_data(self):
+        self.addCleanup(setattr, price_providers, "_candle_provider", None)
+        price_providers._candle_provider = None
+        self.assertIsInstance(get_candle_provider(), TwelveDataProvider)
+
+    @override_settings(CANDLE_PROVIDER="simulator")
+    def test_candle_provider_setting(self):
+        self.addCleanup(setattr, price_providers, "_candle_provider", None)
+        price_providers._candle_provider = None
+        self.assertIsInstance(get_candle_provider(), SimulatorProvider)
@@ -0,0 +1,48 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from exchange.models import Holding, Portfolio
+from exchange.services.exchange_service import place_order
+
+from .utils import MarketMixin
+
+
+class SettlementTests(MarketMixin, TestCase):
+    def balances(self, user):
+        portfolio = Portfolio.objects.get(user=user)
+        return portfolio.available_balance, portfolio.reserved_balance
+
+    def shares(self, user):
+        holding = Holding.objects.get(user=user, symbol=self.symbol)
+        return holding.available_quantity, holding.reserved_quantity
+
+    def test_fills_are_netted_per_user(self):
+        maker = self.make_user("maker", shares=100)
+        taker = self.make_user("taker")
+        place_order(maker, "TST", "SELL", "99", 4)
+        place_order(maker, "TST", "SELL", "100", 6)
+
+        # Reserves 10 * 105, pays 4 * 99 + 6 * 100 and gets the rest back.
+        place_order(taker, "TST", "BUY", "105", 10)
+
+        self.assertEqual(self.balances(taker), (Decimal("100000") - Decimal("996"), Decimal("0")))
+        self.assertEqual(self.balances(maker), (Decimal("100000") + Decimal("996"), Decimal("0")))
+        self.assertEqual(self.shares(taker), (10, 0))
+        self.assertEqual(self.shares(maker), (90, 0))
+        self.symbol.refresh_from_db()
+        self.assertEqual(self.symbol.last_price, Decimal("100.00"))
+
+    def test_partial_fill_keeps_reservation(self):
+        maker = self.make_user("maker", shares=100)
+        taker = self.make_user("taker")
+        place_order(maker, "TST", "SELL", "100", 3)
+        place_order(taker, "TST", "BUY", "100", 5)
+        self.assertEqual(self.balances(taker), (Decimal("99500"), Decimal("200")))
+        self.assertEqual(self.shares(taker), (3, 0))
+
+    def test_insufficient_funds(self):
+        taker = self.make_user("taker")
+        with self.assertRaises(ValueError):
+            place_order(taker, "TST", "BUY", "100", 10000)
+        self.assertEqual(self.balances(taker), (Decimal("100000"), Decimal("0")))
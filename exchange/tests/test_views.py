@@ -0,0 +1,69 @@
+import threading
+
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from exchange.models import Order
+
+from .utils import MarketMixin
+
+
+class OrderViewTests(MarketMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = self.make_user("seller", shares=10)
+        self.buyer = self.make_user("buyer")
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def order(self, client, symbol, side, price, quantity):
+        return client.post(
+            "/api/orders/",
+            {"symbol": symbol, "side": side, "price": price, "quantity": quantity},
+            format="json",
+        )
+
+    def test_unknown_symbol_starts_no_thread(self):
+        threads = threading.active_count()
+        for i in range(5):
+            self.assertEqual(self.order(self.client, f"NOPE{i}", "BUY", "1", 1).status_code, 400)
+        self.assertEqual(threading.active_count(), threads)
+
+    def test_place_through_sequencer(self):
+        response = self.order(self.client, "tst", "BUY", "99", 2)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Order.objects.get(id=response.data["id"]).status, "OPEN")
+
+    def test_cancel_errors(self):
+        self.assertEqual(self.client.post("/api/orders/999999/cancel/").status_code, 404)
+        seller = APIClient()
+        seller.force_authenticate(self.seller)
+        order_id = self.order(seller, "TST", "SELL", "100", 1).data["id"]
+        with self.assertLogs("exchange.views", "WARNING"):
+            response = self.client.post(f"/api/orders/{order_id}/cancel/")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(seller.post(f"/api/orders/{order_id}/cancel/").status_code, 200)
+
+
+class OrderBookViewTests(MarketMixin, TransactionTestCase):
+    def get(self, query, etag=None):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return APIClient().get(f"/api/orderbook/?symbol=TST{query}", **headers)
+
+    def test_etag_covers_view_options(self):
+        etag = self.get("")["ETag"]
+        self.assertEqual(self.get("", etag).status_code, 304)
+        self.assertEqual(self.get("&depth=5", etag).status_code, 200)
+        self.assertEqual(self.get("&tick=1", etag).status_code, 200)
+        self.assertEqual(self.get("&depth=5", self.get("&depth=5")["ETag"]).status_code, 304)
+
+    def test_if_none_match_compares_whole_tags(self):
+        etag = self.get("")["ETag"]
+        self.assertEqual(self.get("", f'"x", W/{etag}').status_code, 304)
+        self.assertEqual(self.get("", "*").status_code, 304)
+        self.assertEqual(self.get("", f'"x{etag[1:]}').status_code, 200)
+        self.assertEqual(self.get("", etag[:-2] + '"').status_code, 200)
+
+    def test_out_of_range_tick_is_rejected(self):
+        for tick in ("1e400", "1e-400", "sNaN", "2000000"):
+            self.assertEqual(self.get(f"&tick={tick}").status_code, 400, tick)
@@ -0,0 +1,42 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from exchange.channel_events import BroadcastScheduler
+from exchange.models import Holding, Symbol
+from exchange.services.limit_book import reset_books
+from exchange.services.reference_prices import ReferencePriceService
+
+
+def isolate_background_work(test):
+    """
+    Keep the reference-price refresher (it fetches quotes over the network)
+    from starting and flush broadcasts inline: a background flush reading
+    SQLite while an order commits can fail it with "table is locked".
+    """
+    for patcher in (
+        mock.patch.object(ReferencePriceService, "start"),
+        mock.patch("exchange.channel_events._scheduler", BroadcastScheduler(0)),
+    ):
+        patcher.start()
+        test.addCleanup(patcher.stop)
+
+
+class MarketMixin:
+    """A fresh TST symbol priced at 100 and helpers for funded users."""
+
+    def setUp(self):
+        super().setUp()
+        reset_books()
+        isolate_background_work(self)
+        self.symbol = Symbol.objects.create(
+            name="TST", last_price=Decimal("100.00"), last_price_updated_at=timezone.now()
+        )
+
+    def make_user(self, username, shares=0):
+        user = User.objects.create(username=username)  # portfolio comes from the post_save signal
+        if shares:
+            Holding.objects.create(user=user, symbol=self.symbol, available_quantity=shares)
+        return user
@@ -1,6 +1,7 @@
 from django.urls import path
 from .views import (
     HealthCheckView,
+    MetricsView,
     CandleView,
     OrderListCreateView,
     CancelOrderView,
@@ -15,6 +16,7 @@ from .views import (
 
 urlpatterns = [
     path('health/', HealthCheckView.as_view(), name='health_check'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('register/', RegisterView.as_view(), name='register'),
     path('symbols/', SymbolListView.as_view(), name='symbol_list'),
     path('prices/', PricesView.as_view(), name='prices'),
@@ -2,24 +2,32 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework import status
-from django.db.models import Q
 from django.contrib.auth.models import User
+from django.utils.http import parse_etags
 import logging
 
-from .services.exchange_service import place_order, cancel_order
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from .services.sequencer import submit_order, submit_cancel, sequencer_timeout
 
 logger = logging.getLogger(__name__)
-from .services.orderbook import get_order_book
+from .services.orderbook import (
+    resolve_symbol,
+    order_book_version,
+    versioned_order_book,
+    parse_depth_options,
+)
 from .serializers import (
     OrderSerializer,
+    ArchivedOrderSerializer,
     OrderCreateSerializer,
     PortfolioSerializer,
     HoldingSerializer,
     TradeSerializer,
 )
-from .models import Order, Portfolio, Holding, Trade, Symbol
-from .channel_events import broadcast_orderbook
+from .models import Order, Portfolio, Holding, Trade, Symbol, ArchivedOrder, ArchivedTrade
 from .services.market_data import fetch_candles
+from .pagination import keyset, merge_newest_first, ndjson_response, page_params, paginate
 
 
 class HealthCheckView(APIView):
@@ -33,6 +41,20 @@ class HealthCheckView(APIView):
         )
 
 
+class MetricsView(APIView):
+    """
+    Prometheus text format: order-path stage histograms (with ORDER_METRICS)
+    and WebSocket fan-out counters.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        from django.http import HttpResponse
+        from .services.metrics import render
+
+        return HttpResponse(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 class RegisterView(APIView):
     permission_classes = [AllowAny]
 
@@ -85,20 +107,53 @@ class HoldingsView(APIView):
         return Response(HoldingSerializer(holdings, many=True).data)
 
 
+def include_archived(request):
+    """?include_archived=true also returns rows moved out by archive_history."""
+    return request.query_params.get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+
+def history_response(request, querysets, to_dict):
+    """
+    Rows of querysets newest first, as the full list (no paging parameters),
+    one keyset page with ?limit=&cursor= ({"results", "next_cursor"}) or a
+    streamed NDJSON export with ?export=ndjson.
+    """
+    try:
+        paginated, limit, position = page_params(request.query_params)
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if request.query_params.get('export') == 'ndjson':
+        return ndjson_response(querysets, to_dict, position)
+    if not paginated:
+        rows = merge_newest_first(*(keyset(qs) for qs in querysets))
+        return Response([to_dict(row) for row in rows])
+    rows, next_cursor = paginate(querysets, limit, position)
+    return Response({'results': [to_dict(row) for row in rows], 'next_cursor': next_cursor})
+
+
+def order_data(order):
+    serializer = ArchivedOrderSerializer if isinstance(order, ArchivedOrder) else OrderSerializer
+    return serializer(order).data
+
+
 class OrderListCreateView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        qs = Order.objects.filter(user=request.user).select_related('symbol').order_by('-created_at')
+        querysets = [Order.objects.filter(user=request.user)]
+        if include_archived(request):
+            querysets.append(ArchivedOrder.objects.filter(user=request.user))
         status_param = request.query_params.get('status')
-        if status_param:
-            statuses = [s.strip() for s in status_param.split(',') if s.strip()]
+        statuses = [s.strip() for s in (status_param or '').split(',') if s.strip()]
+        symbol_param = request.query_params.get('symbol')
+        for i, qs in enumerate(querysets):
+            qs = qs.select_related('symbol')
             if statuses:
                 qs = qs.filter(status__in=statuses)
-        symbol_param = request.query_params.get('symbol')
-        if symbol_param:
-            qs = qs.filter(symbol__name=symbol_param)
-        return Response(OrderSerializer(qs, many=True).data)
+            if symbol_param:
+                qs = qs.filter(symbol__name=symbol_param)
+            querysets[i] = qs
+        return history_response(request, querysets, order_data)
 
     def post(self, request):
         serializer = OrderCreateSerializer(data=request.data)
@@ -110,17 +165,30 @@ class OrderListCreateView(APIView):
             )
         
         symbol_name = serializer.validated_data['symbol']
-        
+        # Resolved here, not on the sequencer thread: each symbol gets its own
+        # thread, so an unknown name must be rejected before one is started.
+        symbol = Symbol.get_by_name(symbol_name)
+        if symbol is None:
+            return Response(
+                {"detail": f"Symbol not found: {symbol_name!r}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
         try:
-            order = place_order(
+            order = submit_order(
                 user=request.user,
-                symbol_name=symbol_name,
+                symbol=symbol,
                 side=serializer.validated_data['side'],
                 price=serializer.validated_data['price'],
                 quantity=serializer.validated_data['quantity'],
-            )
-            broadcast_orderbook(symbol_name)
+            ).result(timeout=sequencer_timeout())
             return Response(OrderSerializer(order).data, status=201)
+        except FutureTimeoutError:
+            logger.error(f"Order sequencer for {symbol_name} timed out for user {request.user}")
+            return Response(
+                {"detail": "The order is still being processed. Check your open orders."},
+                status=status.HTTP_504_GATEWAY_TIMEOUT,
+            )
         except ValueError as e:
             logger.warning(f"Order placement failed for user {request.user}: {str(e)}")
             return Response(
@@ -139,31 +207,73 @@ class CancelOrderView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, order_id):
-        order = cancel_order(request.user, order_id)
-        broadcast_orderbook(order.symbol.name)
-        return Response(OrderSerializer(order).data, status=200)
+        try:
+            order = submit_cancel(request.user, order_id).result(timeout=sequencer_timeout())
+            return Response(OrderSerializer(order).data, status=200)
+        except Order.DoesNotExist:
+            return Response(
+                {"detail": "Order not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        except FutureTimeoutError:
+            logger.error(f"Cancel of order {order_id} timed out for user {request.user}")
+            return Response(
+                {"detail": "The cancel is still being processed. Check your open orders."},
+                status=status.HTTP_504_GATEWAY_TIMEOUT,
+            )
+        except ValueError as e:
+            logger.warning(f"Cancel failed for user {request.user}: {str(e)}")
+            return Response(
+                {"detail": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+
+def book_etag(symbol, seq, depth, tick):
+    return f'"{symbol.pk}-{seq}-{depth or ""}-{tick or ""}"'
+
+
+def etag_matches(etag, if_none_match):
+    """Whether an If-None-Match header lists etag (weak comparison) or is *."""
+    tags = parse_etags(if_none_match)
+    return '*' in tags or etag in (tag.removeprefix('W/') for tag in tags)
 
 
 class OrderBookView(APIView):
+    """
+    Aggregated book from the resident order book, optionally limited to the
+    best `depth` levels per side and grouped into `tick`-sized buckets. The
+    ETag is the symbol's book_seq plus depth and tick, so a poll with a
+    matching If-None-Match gets 304.
+    """
     permission_classes = []
 
     def get(self, request):
-        from .models import Symbol
-
         symbol_param = request.query_params.get('symbol')
         if not symbol_param or not str(symbol_param).strip():
             return Response(
                 {'detail': 'Missing or invalid symbol.'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        symbol = Symbol.get_by_name(symbol_param)
-        if symbol is None:
+        try:
+            symbol = resolve_symbol(symbol_param)
+        except Symbol.DoesNotExist:
             return Response(
                 {'detail': 'Symbol not found.'},
                 status=status.HTTP_404_NOT_FOUND,
             )
-        order_book = get_order_book(symbol)
-        return Response(order_book)
+        try:
+            depth, tick = parse_depth_options(
+                request.query_params.get('depth'),
+                request.query_params.get('tick'),
+            )
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        etag = book_etag(symbol, order_book_version(symbol), depth, tick)
+        if etag_matches(etag, request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        seq, order_book = versioned_order_book(symbol, depth, tick)
+        return Response(order_book, headers={'ETag': book_etag(symbol, seq, depth, tick)})
 
 
 class TradeListView(APIView):
@@ -171,29 +281,33 @@ class TradeListView(APIView):
 
     def get(self, request):
         user = request.user
-        qs = Trade.objects.filter(
-            Q(buy_order__user=user) | Q(sell_order__user=user)
-        ).select_related('buy_order', 'sell_order', 'buy_order__symbol', 'sell_order__symbol').order_by('-created_at')
         symbol_param = request.query_params.get('symbol')
+        # One (buyer|seller, created_at, id) index range per side; a
+        # self-trade shows up once, as a BUY.
+        querysets = [
+            Trade.objects.filter(buyer=user),
+            Trade.objects.filter(seller=user),
+        ]
+        if include_archived(request):
+            querysets += [
+                ArchivedTrade.objects.filter(buyer=user),
+                ArchivedTrade.objects.filter(seller=user),
+            ]
+        querysets = [qs.select_related('symbol') for qs in querysets]
         if symbol_param:
-            qs = qs.filter(buy_order__symbol__name=symbol_param)
-        out = []
-        for t in qs:
-            if t.buy_order.user_id == user.id:
-                side = 'BUY'
-                symbol_name = t.buy_order.symbol.name
-            else:
-                side = 'SELL'
-                symbol_name = t.sell_order.symbol.name
-            out.append({
+            querysets = [qs.filter(symbol__name=symbol_param) for qs in querysets]
+
+        def trade_data(t):
+            return {
                 'id': t.id,
-                'symbol': symbol_name,
-                'side': side,
+                'symbol': t.symbol.name,
+                'side': 'BUY' if t.buyer_id == user.id else 'SELL',
                 'price': str(t.price),
                 'quantity': t.quantity,
                 'created_at': t.created_at,
-            })
-        return Response(out)
+            }
+
+        return history_response(request, querysets, trade_data)
 
 
 class SymbolListView(APIView):
@@ -209,12 +323,12 @@ class SymbolListView(APIView):
 
 
 class PricesView(APIView):
-    """Delayed market prices for all symbols. Refreshed at most every 60 minutes."""
+    """Delayed market prices for all symbols, refreshed in the background every PRICE_REFRESH_MINUTES."""
     permission_classes = []
 
     def get(self, request):
-        from .services.price_fetch import update_symbol_prices
-        update_symbol_prices(cache_minutes=60)
+        from .services.reference_prices import get_reference_price_service
+        get_reference_price_service().start()
         qs = Symbol.objects.all().order_by('name')
         out = []
         for s in qs:
@@ -226,13 +340,75 @@ class PricesView(APIView):
         return Response(out)
     
 class CandleView(APIView):
+    """
+    OHLCV bars built from this exchange's trades.
+
+    ?symbol=AAPL&interval=1m&start=...&end=...&limit=50 where interval is one
+    of 1s/1m/5m/1h and start/end are ISO datetimes or unix seconds.
+    indicators=sma,ema,vwap,volatility (with window=N bars, default 20)
+    resamples the trade prints with NumPy and adds those columns.
+    source=provider returns the external price provider's candles instead.
+    """
     permission_classes = []
 
     def get(self, request):
+        from .services.candles import parse_interval, get_candles
+        from .services.analytics import INDICATORS, candles_with_indicators
+
         symbol = request.query_params.get("symbol")
 
         if not symbol:
             return Response({"detail": "Symbol required."}, status=400)
 
-        candles = fetch_candles(symbol)
-        return Response(candles)
\ No newline at end of file
+        if request.query_params.get("source") == "provider":
+            candles = fetch_candles(symbol)
+            return Response(candles)
+
+        try:
+            symbol = resolve_symbol(symbol)
+        except Symbol.DoesNotExist:
+            return Response({"detail": "Symbol not found."}, status=404)
+        try:
+            interval = parse_interval(request.query_params.get("interval", "1m"))
+            start = _parse_time(request.query_params.get("start"))
+            end = _parse_time(request.query_params.get("end"))
+            limit = int(request.query_params.get("limit", 50))
+            window = int(request.query_params.get("window", 20))
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+        if not 0 < limit <= 1000:
+            return Response({"detail": "limit must be between 1 and 1000."}, status=400)
+
+        indicators = [
+            name for name in request.query_params.get("indicators", "").split(",") if name
+        ]
+        if not indicators:
+            return Response(get_candles(symbol, interval, start, end, limit))
+        unknown = set(indicators) - set(INDICATORS)
+        if unknown:
+            return Response(
+                {"detail": f"Unknown indicators: {', '.join(sorted(unknown))}."}, status=400
+            )
+        if not 1 < window <= 500:
+            return Response({"detail": "window must be between 2 and 500."}, status=400)
+        return Response(candles_with_indicators(symbol, interval, indicators, window, start, end, limit))
+
+
+def _parse_time(value):
+    """ISO 8601 datetime or unix seconds -> aware datetime (None if empty)."""
+    from datetime import datetime, timezone as dt_timezone
+    from django.utils import timezone
+    from django.utils.dateparse import parse_datetime
+
+    if not value:
+        return None
+    try:
+        return datetime.fromtimestamp(float(value), tz=dt_timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        pass
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"Invalid time: {value}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed